@@ -1,6 +1,7 @@
-import collections
 import datetime
-import dateutil.parser
+import hashlib
+import io
+import itertools
 import json
 import os
 import pathlib
@@ -8,18 +9,26 @@ import re
 import sys
 import unicodedata
 
+import cachetools
+
 try:
     from parsers import file_to_pdf
-    from utils import memoize
+    from utils import memoize, memoize_by, open_atomically, write_atomically
+    import discovery
+    import isolation
+    import model
 except ImportError:
     from .parsers import file_to_pdf
-    from .utils import memoize
+    from .utils import memoize, memoize_by, open_atomically, write_atomically
+    from . import discovery
+    from . import isolation
+    from . import model
 
-debug = False
+# folder where the extracted texts are cached between runs, no cache if None
+text_cache_path = None
 
 
-@memoize
-def read_confs(conf_file_path):
+def load_confs(conf_file_path):
     """ read a json encoded file that must have the following format:
     {
         "BNP 2014": {
@@ -39,10 +48,15 @@ def read_confs(conf_file_path):
             conf_file_decoded = unicodedata.normalize("NFKD", conf_file.read())
             conf = json.loads(conf_file_decoded)
         except Exception as e:
-            print(read_confs.__name__, e)
+            print(load_confs.__name__, e)
             return None
         return conf
 
+@memoize
+def read_confs(conf_file_path):
+    """ load_confs(), once per file"""
+    return load_confs(conf_file_path)
+
 def get_conf_files(confs_path):
     """
     confs_path: folder that contains all the configuration files.
@@ -55,6 +69,27 @@ def get_conf_files(confs_path):
                 conf_files.append(os.path.join(dir_path, file_name))
     return conf_files
 
+def get_conf_id(confs_path, conf_file_path, conf_name):
+    """ Return "relative/path/to/conf_file.json#conf name" """
+    relative_path = os.path.relpath(conf_file_path, confs_path).replace(os.sep, '/')
+    return relative_path + '#' + conf_name
+
+def get_confs(confs_path, reload=False):
+    """
+    Return the list of (conf id, conf) of all the conf files of confs_path
+    @param reload if True, the conf files read before are read again
+    """
+    confs = []
+    for conf_file_path in get_conf_files(confs_path):
+        file_confs = load_confs(conf_file_path) if reload else read_confs(conf_file_path)
+        for conf_name in file_confs.keys():
+            confs.append((get_conf_id(confs_path, conf_file_path, conf_name), file_confs[conf_name]))
+    return confs
+
+def get_conf_fingerprint(conf):
+    """ Return the sha256 of the conf contents, independent of its formatting"""
+    return hashlib.sha256(json.dumps(conf, sort_keys=True).encode('utf-8')).hexdigest()
+
 mandatory_patterns = ["bank-pattern", "account-pattern", "date-pattern"]
 
 def search(pattern, text):
@@ -79,26 +114,164 @@ def findall(pattern, text):
         if match:
             return match
 
+def find_last(pattern, text):
+    """
+    Like findall(pattern, text)[-1], without building the list of matches.
+    Returns the last match of the first pattern that matches
+    """
+    patterns = pattern if isinstance(pattern, list) else [pattern]
+    for pattern in patterns:
+        last_match = None
+        for last_match in re.finditer(pattern, text):
+            pass
+        if last_match:
+            return last_match
+
+def get_match_value(match):
+    """ Returns the value of the match as re.findall(): the string of the group if single, else the groups"""
+    groups = match.groups()
+    if len(groups) == 0:
+        return match.group(0)
+    return groups[0] if len(groups) == 1 else groups
 
-@memoize
-def parse_pdf_internal(file_path, parser_name): # miner_aggregate, tika
+def parse_amount(amount_string):
+    """
+    Returns the float of an amount such as "1 234,56", "1,234.56", "-12.5"
+    or "12,50-": a separator followed by 1 or 2 digits at the end is decimal.
+    """
+    amount_string = re.sub(r"\s+", '', amount_string)
+    sign = -1 if amount_string.startswith('-') or amount_string.endswith('-') else 1
+    amount_string = amount_string.strip('+-')
+    decimals = re.search(r"[.,](\d{1,2})$", amount_string)
+    integer_string = amount_string[:decimals.start()] if decimals else amount_string
+    return sign * float(re.sub(r"\D", '', integer_string) + '.' + (decimals.group(1) if decimals else '0'))
+
+def iter_transactions(conf, bank_extract, statement_date):
+    """
+    Generator of the (day, label, amount) of the transactions of the bank
+    extract, in a single pass over the matches of the first
+    "transaction-pattern" that matches, one match per transaction line.
+    The pattern has the named groups:
+    - day, month and optionally year. Without year, the year of the
+      statement date is used, or the year before for the days after it.
+    - label, optional
+    - amount (signed), or debit and/or credit
+    """
+    patterns = conf["transaction-pattern"]
+    for pattern in patterns if isinstance(patterns, list) else [patterns]:
+        found = False
+        for match in re.finditer(pattern, bank_extract, re.MULTILINE):
+            found = True
+            groups = match.groupdict()
+            day, month = int(groups['day']), int(groups['month'])
+            if groups.get('year'):
+                year = int(groups['year'])
+                year = year + 2000 if year < 100 else year
+            else:
+                year = statement_date.year
+                if (month, day) > (statement_date.month, statement_date.day):
+                    year -= 1
+            if groups.get('amount'):
+                amount = parse_amount(groups['amount'])
+            else:
+                amount = ((parse_amount(groups['credit']) if groups.get('credit') else 0.)
+                          - (parse_amount(groups['debit']) if groups.get('debit') else 0.))
+            yield datetime.date(year, month, day), ' '.join((groups.get('label') or '').split()), amount
+        if found:
+            return
+
+
+def get_extract_key(file_path, parser_name):
+    """
+    Archive members are cached by contents, other files by path, size and
+    modification time, so that a file replaced at the same path is extracted
+    again.
+    """
+    if isinstance(file_path, discovery.ArchiveMember):
+        return (file_path.digest, parser_name)
+    try:
+        stat = os.stat(file_path)
+    except OSError:
+        return (file_path, None, None, parser_name)
+    return (file_path, stat.st_size, stat.st_mtime_ns, parser_name)
+
+def set_text_cache(folder_path):
+    """
+    Cache the extracted texts in folder_path, by file contents and parser,
+    to not extract them again in the next runs. No cache if None.
+    """
+    global text_cache_path
+    if folder_path is not None:
+        os.makedirs(folder_path, exist_ok=True)
+    text_cache_path = folder_path
+
+def extract_text(file_path, parser_name, cache_folder_path=None):
+    """
+    Return the normalized text of the pdf extracted by the parser, None if
+    it isn't a pdf.
+    @param cache_folder_path folder where the texts are cached, see set_text_cache()
+    """
     [stem, ext] = os.path.splitext(file_path)
-    if ext != '.pdf':
+    if ext.lower() != '.pdf':
         return None
-    pdf = file_to_pdf(file_path, parser_name)
+    cache_file_path = None
+    if cache_folder_path is not None:
+        cache_file_path = os.path.join(cache_folder_path,
+                                       "{}-{}.txt".format(discovery.hash_file(file_path), parser_name))
+        try:
+            with open(cache_file_path, encoding='utf-8') as cache_file:
+                return cache_file.read()
+        except FileNotFoundError:
+            pass
+    if isinstance(file_path, discovery.ArchiveMember):
+        pdf = file_to_pdf(file_path.open(), parser_name)
+    else:
+        pdf = file_to_pdf(file_path, parser_name)
     if pdf is None:
         return None
     pdf_text = unicodedata.normalize("NFKD", pdf)
+    if cache_file_path is not None:
+        write_atomically(cache_file_path, pdf_text)
     return pdf_text
 
+@memoize_by(get_extract_key)
+def parse_pdf_internal(file_path, parser_name): # miner_aggregate, tika
+    return extract_text(file_path, parser_name, text_cache_path)
+
 def parse_pdf(file_path, parser_name=None): # miner_aggregate, tika, pdfplumber
     return parse_pdf_internal(file_path, parser_name if parser_name is not None else 'pdfplumber')
 
-def is_valid_conf(conf, file_path, verbose):
-    """Returns True if conf matches all mandatory patterns for given file"""
+def get_parser_name(conf, fallback=False):
+    """
+    Returns the parser to use with conf.
+    @param fallback if True, the "fallback-parser" of the conf is returned
+    """
+    return conf.get('fallback-parser' if fallback else 'parser')
+
+def get_parser_names(conf, fallback=False):
+    """
+    Returns the parsers to try in order with conf: the "parsers" preference
+    of the conf (see parser_benchmark.py) if any, else its "parser".
+    @param fallback if True, only the "fallback-parser" of the conf is returned
+    """
+    if fallback:
+        return [get_parser_name(conf, fallback)]
+    return conf.get('parsers') or [get_parser_name(conf)]
+
+def is_valid_conf(conf, file_path, verbose, fallback=False, parse=None, parser_name=None):
+    """
+    Returns True if conf matches all mandatory patterns for given file
+    @param parse function(file_path, parser_name) that returns the text of
+     the file, parse_pdf() if None
+    @param parser_name parser of the text, get_parser_name() if None
+    """
     if "bank-name" not in conf is None:
         return False
-    bank_extract = parse_pdf(file_path, conf.get('parser'))
+    if fallback and "fallback-parser" not in conf:
+        return False
+    if parser_name is None:
+        parser_name = get_parser_name(conf, fallback)
+    bank_extract = (parse or parse_pdf)(file_path, parser_name)
     if not bank_extract:
         return False
     searches = [search(conf[pattern], bank_extract)
@@ -111,24 +284,71 @@ def is_valid_conf(conf, file_path, verbose):
             find_confs.__name__, conf, mandatory_patterns, searches))
     return False
 
-def find_confs(file_path, confs_path="./confs", verbose=0):
+def find_parser(conf, file_path, verbose=0, fallback=False, parse=None):
+    """
+    Returns the first parser of get_parser_names() with which conf matches
+    the file, None if conf doesn't match the file.
+    A parser that fails, or whose text is of the bank of conf but doesn't
+    match its other mandatory patterns, is skipped for the next one. The
+    documents of other banks are not parsed again with the next parsers.
+    """
+    parser_names = get_parser_names(conf, fallback)
+    for parser_name in parser_names:
+        try:
+            if is_valid_conf(conf, file_path, verbose, fallback, parse, parser_name):
+                return parser_name
+            # the text is likely cached, see parse_pdf()
+            bank_extract = (parse or parse_pdf)(file_path, parser_name)
+        except Exception as e:
+            if len(parser_names) == 1:
+                raise
+            if verbose > 0:
+                print(parser_name, 'failed:', e)
+            continue
+        if bank_extract and not ("bank-pattern" in conf and search(conf["bank-pattern"], bank_extract)):
+            return None
+    return None
+
+def match_confs(file_path, confs, verbose=0, fallback=False, matched_conf_ids=None, parse=None,
+                matched_parsers=None):
+    """
+    Return the confs of the list of (conf id, conf) that match the file
+    @param matched_conf_ids if not None, a list where the ids of the matching
+     confs are appended
+    @param parse see is_valid_conf()
+    @param matched_parsers if not None, a list where the parsers with which
+     the confs match are appended, see find_parser()
+    """
     matching_confs = []
-    for conf_file_path in get_conf_files(confs_path):
-        confs = read_confs(conf_file_path)
-        for conf_name in confs.keys():
-            conf = confs[conf_name]
-            if is_valid_conf(conf, file_path, verbose):
-                matching_confs.append(conf)
+    for conf_id, conf in confs:
+        parser_name = find_parser(conf, file_path, verbose, fallback, parse)
+        if parser_name is not None:
+            matching_confs.append(conf)
+            if matched_conf_ids is not None:
+                matched_conf_ids.append(conf_id)
+            if matched_parsers is not None:
+                matched_parsers.append(parser_name)
     if len(matching_confs) == 0 and verbose == 2:
-        matching_confs = find_confs(file_path, confs_path, verbose + 1)
+        matching_confs = match_confs(file_path, confs, verbose + 1, fallback, matched_conf_ids, parse,
+                                     matched_parsers)
     return matching_confs
 
+def find_confs(file_path, confs_path="./confs", verbose=0, fallback=False, matched_conf_ids=None,
+               matched_parsers=None):
+    """
+    @param matched_conf_ids if not None, a list where the ids of the matching
+     confs are appended
+    @param matched_parsers see match_confs()
+    """
+    return match_confs(file_path, get_confs(confs_path), verbose, fallback, matched_conf_ids,
+                       matched_parsers=matched_parsers)
+
 def extract_pattern(pattern_name, conf, bank_extract, data):
     res = None
-    extract = findall(conf.get(pattern_name+"-pattern"), bank_extract)
-    if extract:
+    match = find_last(conf.get(pattern_name+"-pattern"), bank_extract)
+    if match:
         #
-        last_extract = extract[-1]
+        last_extract = get_match_value(match)
         captured_strings = last_extract if type(last_extract) else (last_extract)
         # remove space, comma or dot in captured groups
         captured_values = [re.sub(r"[\s,.]+", '', captured_string) for captured_string in captured_strings]
@@ -141,13 +361,17 @@ def extract_pattern(pattern_name, conf, bank_extract, data):
     data.pop(pattern_name + '-value', None)
     return res
 
-def parse_bank_extract_file(file_path, conf, verbose=0):
-    bank_extract = parse_pdf(file_path, conf.get('parser'))
+def parse_bank_extract_file(file_path, conf, verbose=0, fallback=False, parse=None, parser_name=None):
+    if parser_name is None:
+        parser_name = get_parser_name(conf, fallback)
+    bank_extract = (parse or parse_pdf)(file_path, parser_name)
     return parse_bank_extract(bank_extract, conf, verbose, file_path)
 
 def parse_bank_extract(bank_extract, conf, verbose=0, file_path = ""):
     data = conf.copy()
     data.pop('bank-pattern', None)
+    data.pop('parsers', None)
+    data.pop('fallback-parser', None)
     if "account-pattern" in conf:
         account = search(conf["account-pattern"], bank_extract)
         if account:
@@ -210,9 +434,10 @@ def parse_bank_extract(bank_extract, conf, verbose=0, file_path = ""):
         if operation is not None:
             data['operation'] = operation
     if "date-pattern" in conf:
-        date = findall(conf["date-pattern"], bank_extract)
+        date = find_last(conf["date-pattern"], bank_extract)
         if date:
-            date_value = conf.get("date-value", "{2}-{1}-{0}").format(*date[-1])
+            import dateutil.parser
+            date_value = conf.get("date-value", "{2}-{1}-{0}").format(*get_match_value(date))
             data['date'] = dateutil.parser.parse(date_value).date()
         elif verbose > 0:
             print("date not found")
@@ -221,42 +446,77 @@ def parse_bank_extract(bank_extract, conf, verbose=0, file_path = ""):
     elif verbose > 0:
         print('no date-pattern')
         print(conf)
+    if "transaction-pattern" in conf:
+        if 'date' in data:
+            # consumed by build_accounts()
+            data['transactions'] = iter_transactions(conf, bank_extract, data['date'])
+        data.pop('transaction-pattern', None)
     return data
 
-def aggregate_pdf(file_path, confs_path="./confs", verbose=0):
+def aggregate_pdf(file_path, confs_path="./confs", verbose=0, fallback=False, matched_conf_ids=None):
+    """
+    @param fallback if True, only confs with a "fallback-parser" are tried,
+     with that parser.
+    @param matched_conf_ids if not None, a list where the ids of the matching
+     confs are appended
+    """
     if verbose > 0:
         print(os.path.basename(file_path), end='...')
-    accounts = collections.defaultdict(lambda: collections.defaultdict(dict))
-    data = None
-    confs = find_confs(file_path, confs_path, verbose)
-    for conf in confs:
-        data = parse_bank_extract_file(file_path, conf, verbose)
+    parser_names = []
+    confs = find_confs(file_path, confs_path, verbose, fallback, matched_conf_ids, parser_names)
+    return build_accounts(file_path, confs, verbose, fallback, parser_names=parser_names)
+
+def append_transactions(account, transactions, operations=False):
+    """
+    Append the (day, label, amount) transactions of a statement to the
+    ledger of the account, with their rank in their day on the statement.
+    @param operations if True, the sums of the transactions per day are
+     appended to the operations of the account
+    """
+    seqs = {}
+    sums = {}
+    for day, label, amount in transactions:
+        account.transactions.append(day, seqs.get(day, 0), label, amount)
+        seqs[day] = seqs.get(day, 0) + 1
+        sums[day] = sums.get(day, 0) + amount
+    if operations:
+        for day in sorted(sums):
+            account.operations.append(day, sums[day])
+
+def build_accounts(file_path, confs, verbose=0, fallback=False, parse=None, parser_names=None):
+    """
+    Return the accounts of the file parsed with each of the matching confs
+    @param parse see is_valid_conf()
+    @param parser_names parsers of the confs, see match_confs(), the parser
+     of each conf if None
+    """
+    accounts = {}
+    for index, conf in enumerate(confs):
+        data = parse_bank_extract_file(file_path, conf, verbose, fallback, parse,
+                                       parser_names[index] if parser_names is not None else None)
         if data is not None and 'date' in data:
             if verbose > 0:
                 print(data['date'], end=' ')
+            # the transactions are a generator, read to know whether the statement has any
+            transactions = list(data.pop('transactions', []))
+            if 'balance' not in data and 'operation' not in data and not transactions:
+                if verbose > 0:
+                    print('PDF failed to be parsed with conf', conf)
+                continue
+            account_id = "-".join([data['bank-name'], data['account']])
+            account = accounts.setdefault(account_id, model.Account())
             if 'balance' in data:
                 if verbose > 0:
                     print(data['account'], 'balance:', data['balance'])
-                account_id = "-".join([data['bank-name'], data['account']])
-                account = accounts[account_id]['account']
-                accounts[account_id]['balances'].update({
-                    data['date']: data['balance']
-                })
-                del data['balance']
+                account.balances.append(data['date'], data.pop('balance'))
             if 'operation' in data:
                 if verbose > 0:
                     print(data['account'], 'operation:', data['operation'])
-                account_id = "-".join([data['bank-name'], data['account']])
-                account = accounts[account_id]['account']
-                accounts[account_id]['operations'].update({
-                    data['date']: data['operation']
-                })
-                del data['operation']
-            if 'account' in locals():
-                del data['date']
-                account.update(data)
-            elif verbose > 0:
-                print('PDF failed to be parsed with conf', conf)
+                account.operations.append(data['date'], data.pop('operation'))
+            # without operation-pattern, the sums of the transactions per day are the operations
+            append_transactions(account, transactions, operations="operation-pattern" not in conf)
+            del data['date']
+            account.update(data)
         elif verbose >= 3:
             print(data)
     if len(accounts) == 0:
@@ -264,51 +524,184 @@ def aggregate_pdf(file_path, confs_path="./confs", verbose=0):
         print(file_path, "skipped", file=sys.stderr)
     return accounts
 
-#@cprofile
-def aggregate_pdfs(folder_path, confs_path="./confs", verbose=0):
+class Aggregator:
+    """
+    Aggregation session to embed in long-running processes (e.g. a service):
+    the confs are read once and the extracted texts are kept in a bounded
+    cache owned by the session. Unlike aggregate_pdf(), no module-level cache
+    is filled, so that memory doesn't grow with the number of documents.
+    """
+    def __init__(self, confs_path="./confs", verbose=0, text_cache_path=None, max_texts=16):
+        """
+        @param text_cache_path folder where the extracted texts are cached
+         between sessions, no cache if None
+        @param max_texts number of extracted texts kept in memory
+        """
+        self.confs_path = confs_path
+        self.verbose = verbose
+        self.text_cache_path = text_cache_path
+        if text_cache_path is not None:
+            os.makedirs(text_cache_path, exist_ok=True)
+        self.texts = cachetools.LRUCache(maxsize=max_texts)
+        self.reload_confs()
 
-    def update(d, u):
-        """ Recursive dictionary update() """
-        for k, v in u.items():
-            if isinstance(v, dict):
-                d[k] = update(d[k], v)
-            else:
-                d[k] = v
-        return d
+    def reload_confs(self):
+        """ Read the conf files again, e.g. after they changed"""
+        self.confs = get_confs(self.confs_path, reload=True)
+
+    def parse_pdf(self, file_path, parser_name=None):
+        parser_name = parser_name if parser_name is not None else 'pdfplumber'
+        key = get_extract_key(file_path, parser_name)
+        if key not in self.texts:
+            self.texts[key] = extract_text(file_path, parser_name, self.text_cache_path)
+        return self.texts[key]
+
+    def find_confs(self, file_path, fallback=False, matched_conf_ids=None, matched_parsers=None):
+        return match_confs(file_path, self.confs, self.verbose, fallback, matched_conf_ids, self.parse_pdf,
+                           matched_parsers)
 
-    accounts = collections.defaultdict(lambda: collections.defaultdict(dict))
-    for root, dirs, files in os.walk(folder_path):
-        for file in files:
-            path_to_pdf = os.path.join(root, file)
+    def aggregate_file(self, file_path, fallback=False, matched_conf_ids=None):
+        """ See aggregate_pdf()"""
+        if self.verbose > 0:
+            print(os.path.basename(file_path), end='...')
+        parser_names = []
+        confs = self.find_confs(file_path, fallback, matched_conf_ids, parser_names)
+        return build_accounts(file_path, confs, self.verbose, fallback, self.parse_pdf, parser_names)
+
+    def aggregate_bytes(self, contents, file_name='document.pdf', source='bytes', fallback=False,
+                        matched_conf_ids=None):
+        """
+        Aggregate the pdf contents, e.g. received by a service. The document
+        is named source::file_name, like an archive member.
+        """
+        return self.aggregate_file(discovery.ArchiveMember(source, file_name, contents), fallback, matched_conf_ids)
+
+    def iter_results(self, paths, include=[], exclude=[], duplicates=None):
+        """
+        Generator of the results of the files of paths: files, folders and
+        archives. Files with identical contents are aggregated only once.
+        A file that fails doesn't stop the iteration.
+        @param include, exclude, duplicates see aggregate_pdfs()
+        @return a generator of (file_path, accounts, ids of the matching confs,
+         exception), exception is None on success, accounts and conf ids are
+         None on failure.
+        """
+        file_paths = discovery.unique_files(itertools.chain.from_iterable(
+            discovery.iter_files(path, include=include, exclude=exclude)
+            if os.path.isdir(path) or discovery.is_archive(path) else [path]
+            for path in paths), duplicates)
+        for file_path in file_paths:
+            matched_conf_ids = []
             try:
-                pdf_accounts = aggregate_pdf(path_to_pdf, confs_path, verbose)
-                update(accounts, pdf_accounts)
-            except Exception as inst:
-                print(path_to_pdf, inst)
+                accounts = self.aggregate_file(file_path, matched_conf_ids=matched_conf_ids)
+            except Exception as e:
+                yield file_path, None, None, e
+                continue
+            yield file_path, accounts, matched_conf_ids, None
+
+def aggregate_pdf_isolated(file_path, confs_path="./confs", verbose=0, fallback=False):
+    """
+    aggregate_pdf() for worker processes
+    @return (accounts, ids of the matching confs)
+    """
+    matched_conf_ids = []
+    accounts = aggregate_pdf(file_path, confs_path, verbose, fallback, matched_conf_ids)
+    return accounts, matched_conf_ids
+
+def aggregate_pdfs_isolated(file_paths, confs_path="./confs", verbose=0,
+                            timeout=None, max_memory=None, quarantine=None):
+    """
+    Aggregate each file in a recycled worker process with wall-time (seconds)
+    and memory (MB) limits.
+    Files that fail are retried with the "fallback-parser" of the confs.
+    @param quarantine if not None, a list where a report of each failing file
+     is appended.
+    @return a generator of (file_path, accounts, ids of the matching confs)
+    """
+    failures = []
+    for args, result, error in isolation.isolated_map(
+            aggregate_pdf_isolated,
+            ((file_path, confs_path, verbose) for file_path in file_paths),
+            timeout=timeout, max_memory=max_memory):
+        if error is None:
+            yield (args[0], *result)
+        else:
+            print(args[0], "quarantined:", repr(error), file=sys.stderr)
+            failures.append({'file': args[0], 'error': repr(error)})
+
+    retries = isolation.isolated_map(
+        aggregate_pdf_isolated,
+        [(failure['file'], confs_path, verbose, True) for failure in failures],
+        timeout=timeout, max_memory=max_memory)
+    for failure, (args, result, error) in zip(failures, retries):
+        if error is not None:
+            failure['fallback-error'] = repr(error)
+        elif result[0]:
+            failure['fallback'] = 'recovered'
+            yield (args[0], *result)
+        else:
+            failure['fallback'] = 'no match'
+        if quarantine is not None:
+            quarantine.append(failure)
+
+#@cprofile
+def aggregate_pdfs(folder_path, confs_path="./confs", verbose=0,
+                   isolate=False, timeout=None, max_memory=None, quarantine=None,
+                   duplicates=None, include=[], exclude=[], journal=None):
+    """
+    Files with identical contents are aggregated only once.
+    @param include, exclude glob patterns of files to aggregate or skip, see
+     discovery.iter_files()
+    @param isolate if True, files are parsed in worker processes, see
+     aggregate_pdfs_isolated()
+    @param duplicates if not None, a dict where the duplicated files are
+     added: {aggregated file: [identical files]}
+    @param journal if not None, a journal.Journal where the result of each
+     file is recorded. Files already in the journal are skipped, unless the
+     confs they were aggregated with changed. A file that fails is recorded
+     instead of stopping the aggregation.
+    """
+
+    accounts = {}
+    file_paths = discovery.unique_files(
+        discovery.iter_files(folder_path, include=include, exclude=exclude), duplicates)
+    if journal is not None:
+        journal.track_confs(confs_path)
+        file_paths = journal.unfinished(file_paths)
+    if isolate:
+        for path_to_pdf, pdf_accounts, matched_conf_ids in aggregate_pdfs_isolated(
+                file_paths, confs_path, verbose, timeout, max_memory, quarantine):
+            if journal is not None:
+                journal.record(path_to_pdf, pdf_accounts, matched_conf_ids=matched_conf_ids)
+            model.update_accounts(accounts, pdf_accounts)
+        return journal.accounts() if journal is not None else accounts
+
+    for path_to_pdf in file_paths:
+        matched_conf_ids = []
+        try:
+            pdf_accounts = aggregate_pdf(path_to_pdf, confs_path, verbose, matched_conf_ids=matched_conf_ids)
+        except Exception as inst:
+            print(path_to_pdf, inst)
+            if journal is None:
                 raise inst
+            journal.record(path_to_pdf, error=inst)
+            continue
+        if journal is not None:
+            journal.record(path_to_pdf, pdf_accounts, matched_conf_ids=matched_conf_ids)
+        model.update_accounts(accounts, pdf_accounts)
 
-    return accounts
+    return journal.accounts() if journal is not None else accounts
 
 def toJSON(accounts):
-    def replace_keys(accounts):
-        new_accounts = { }
-        for key in accounts.keys():
-            if isinstance(key, (datetime.date, datetime.datetime)):
-                new_accounts[key.isoformat()] = accounts[key]
-            elif isinstance(accounts[key], dict):
-                new_accounts[key] = replace_keys(accounts[key])
-            else:
-                new_accounts[key] = accounts[key]
-        return new_accounts 
-
-    iso_accounts = replace_keys(accounts)
-    return json.dumps(iso_accounts, indent = 2)
+    output = io.StringIO()
+    model.write_json(accounts, output)
+    return output.getvalue()
 
 def main():
     import argparse
     parser = argparse.ArgumentParser()
     parser.add_argument("file_or_folder",
-                        help="a pdf file or a folder containing pdf files")
+                        help="a pdf file, a folder or a zip/tar archive containing pdf files")
     parser.add_argument("-c", "--confs", help="folder to find conf files",
                         default=os.path.join(os.path.dirname(os.path.realpath(__file__)), "..", "confs"))
     parser.add_argument("-o", "--output", help="output json file to store aggregated file",
@@ -317,11 +710,69 @@ def main():
                         help="increase output verbosity (0: none, 1: light...)")
     parser.add_argument("--test", const='', nargs='?', help="test regular expression on pdf (do not double backslash '\\' here)."
                         " Parsed document when no regular expression is given. ")
+    parser.add_argument("--isolate", action="store_true",
+                        help="parse each pdf in a worker process, quarantine the ones that fail")
+    parser.add_argument("--timeout", type=float,
+                        help="with --isolate, maximum time in seconds to parse a pdf")
+    parser.add_argument("--max-memory", type=float,
+                        help="with --isolate, maximum memory in MB of a worker process")
+    parser.add_argument("--quarantine", default="quarantine.json",
+                        help="with --isolate or --cluster, json file to report the pdf files that failed")
+    parser.add_argument("--include", action='append', default=[],
+                        help="only aggregate the files matching the glob pattern (e.g. --include '*/2021/*')")
+    parser.add_argument("--exclude", action='append', default=[],
+                        help="skip the files and folders matching the glob pattern (e.g. --exclude 'scans')."
+                        " Patterns can also be listed in " + discovery.ignore_file_name + " files")
+    parser.add_argument("--pipeline", action="store_true",
+                        help="discover files in a thread while pdfs are parsed in worker processes")
+    parser.add_argument("--cluster",
+                        help="coordinate the workers (`cluster.py WORK_FOLDER`) that share this work folder, e.g. on"
+                        " several machines, and merge their results. The journal is not used")
+    parser.add_argument("--workers", type=int, default=0,
+                        help="with --cluster, number of workers to start on this machine")
+    parser.add_argument("--unit-size", type=int, default=20,
+                        help="with --cluster, number of files per work unit")
+    parser.add_argument("--lease-timeout", type=float, default=300,
+                        help="with --cluster, seconds without progress of a worker (longer than the slowest pdf)"
+                        " before its work unit is reassigned")
+    parser.add_argument("--watch", action="store_true",
+                        help="keep running and aggregate the new or modified pdf files of the folder into the output file")
+    parser.add_argument("--interval", type=float, default=2,
+                        help="with --watch, seconds between 2 checks of the folder")
+    parser.add_argument("--journal",
+                        help="json lines file where the result of each pdf is recorded as soon as it is parsed."
+                        " Defaults to the output file with a .journal extension, removed once the output is written")
+    parser.add_argument("--resume", action="store_true",
+                        help="skip the pdf files recorded in the journal of an interrupted run")
+    parser.add_argument("--incremental", action="store_true",
+                        help="keep the journal and the extracted texts to only aggregate, in the next runs, the new pdf"
+                        " files and the ones affected by conf changes")
+    parser.add_argument("--text-cache",
+                        help="folder where the extracted texts are cached."
+                        " Defaults to the output file with a .texts extension with --incremental")
+    parser.add_argument("--compact", action="store_true",
+                        help="write the output file without indentation")
+    parser.add_argument("--sort-keys", action="store_true",
+                        help="sort the accounts, properties and days of the output file, for deterministic diffs")
+    parser.add_argument("--duplicates",
+                        help="json file to report the files with identical contents (aggregated once)")
+    parser.add_argument("--rollups", action="store_true",
+                        help="update the monthly, quarterly and yearly rollups stored next to the output file")
 
     args = parser.parse_args()
 
-    if args.test is not None:
-        bank_extract = parse_pdf(args.file_or_folder)
+    if args.watch:
+        try:
+            import watch
+        except ImportError:
+            from . import watch
+        try:
+            watch.watch(args.file_or_folder, args.output, confs_path=args.confs, verbose=args.verbose,
+                        interval=args.interval, include=args.include, exclude=args.exclude)
+        except KeyboardInterrupt:
+            pass
+    elif args.test is not None:
+        bank_extract = Aggregator(args.confs).parse_pdf(args.file_or_folder)
         if args.test:
             test = unicodedata.normalize("NFKD", args.test)
             res = findall(test, bank_extract)
@@ -329,17 +780,73 @@ def main():
         else:
             print("Contents: {}".format(bank_extract))
     else:
-        if pathlib.Path(args.file_or_folder).is_file():
-            accounts = aggregate_pdf(args.file_or_folder, confs_path=args.confs, verbose=args.verbose)
+        journal_path = None
+        if pathlib.Path(args.file_or_folder).is_file() and not discovery.is_archive(args.file_or_folder):
+            accounts = Aggregator(args.confs, args.verbose).aggregate_file(args.file_or_folder)
         else:
-            accounts = aggregate_pdfs(args.file_or_folder, confs_path=args.confs, verbose=args.verbose)
+            quarantine = []
+            duplicates = {}
+            if args.text_cache or args.incremental:
+                set_text_cache(args.text_cache or os.path.splitext(args.output)[0] + '.texts')
+            if args.cluster:
+                # the results are kept in the work folder, the journal isn't used
+                try:
+                    import cluster
+                except ImportError:
+                    from . import cluster
+                accounts = cluster.aggregate_pdfs_cluster(
+                    args.file_or_folder, args.cluster, confs_path=args.confs, verbose=args.verbose,
+                    duplicates=duplicates, include=args.include, exclude=args.exclude,
+                    unit_size=args.unit_size, lease_timeout=args.lease_timeout, workers=args.workers,
+                    failures=quarantine)
+            else:
+                try:
+                    import journal
+                except ImportError:
+                    from . import journal
+                journal_path = args.journal or os.path.splitext(args.output)[0] + '.journal'
+                with journal.Journal(journal_path, resume=args.resume or args.incremental) as aggregation_journal:
+                    if args.pipeline:
+                        import asyncio
+                        try:
+                            import pipeline
+                        except ImportError:
+                            from . import pipeline
+                        accounts = asyncio.run(pipeline.aggregate_pdfs_pipeline(
+                            args.file_or_folder, confs_path=args.confs, verbose=args.verbose,
+                            duplicates=duplicates, include=args.include, exclude=args.exclude,
+                            journal=aggregation_journal))
+                    else:
+                        accounts = aggregate_pdfs(args.file_or_folder, confs_path=args.confs, verbose=args.verbose,
+                                                  isolate=args.isolate, timeout=args.timeout,
+                                                  max_memory=args.max_memory, quarantine=quarantine,
+                                                  duplicates=duplicates, include=args.include, exclude=args.exclude,
+                                                  journal=aggregation_journal)
+            if quarantine:
+                with open(args.quarantine, 'w') as quarantine_file:
+                    json.dump(quarantine, quarantine_file, indent=2)
+            if args.duplicates:
+                with open(args.duplicates, 'w') as duplicates_file:
+                    json.dump(duplicates, duplicates_file, indent=2)
 
-        accounts_json = toJSON(accounts)
+        indent = None if args.compact else 2
         if args.verbose > 0:
-            print(accounts_json)
+            model.write_json(accounts, sys.stdout, indent, args.sort_keys)
+            print()
 
-        with open(args.output, 'w') as accounts_json_file:
-            accounts_json_file.write(accounts_json)
+        with open_atomically(args.output) as accounts_json_file:
+            model.write_json(accounts, accounts_json_file, indent, args.sort_keys)
+        if journal_path is not None and not args.incremental:
+            # the journal is compacted into the output
+            os.remove(journal_path)
+        if args.rollups:
+            try:
+                import compute
+                import rollup
+            except ImportError:
+                from . import compute
+                from . import rollup
+            rollup.update_rollups(compute.readAccounts(args.output), rollup.get_rollups_path(args.output))
 
 if __name__ == "__main__":
     sys.exit(main())
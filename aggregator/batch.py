@@ -0,0 +1,161 @@
+import collections
+import itertools
+import json
+import os
+import sys
+
+try:
+    import aggregate
+    import discovery
+    import isolation
+    import model
+    from utils import open_atomically
+except ImportError:
+    from . import aggregate
+    from . import discovery
+    from . import isolation
+    from . import model
+    from .utils import open_atomically
+
+
+def read_manifest(manifest_path, confs_path="./confs"):
+    """
+    Read a json manifest of the folders (or archives) to aggregate, each into
+    its own output file:
+        [{"input": "path/to/folder", "output": "path/to/accounts.json", "confs": "path/to/confs"}, ...]
+    "confs" is optional, confs_path is used if missing. Relative paths are
+    relative to the manifest folder.
+    @return the list of households {'input', 'output', 'confs'}
+    """
+    folder_path = os.path.dirname(os.path.abspath(manifest_path))
+    with open(manifest_path, encoding='utf-8') as manifest_file:
+        entries = json.load(manifest_file)
+    return [{'input': os.path.join(folder_path, entry['input']),
+             'output': os.path.join(folder_path, entry['output']),
+             'confs': os.path.join(folder_path, entry['confs']) if 'confs' in entry else confs_path}
+            for entry in entries]
+
+def interleave(iterators):
+    """ Round-robin generator of (index of the iterator, item) until all the iterators are exhausted"""
+    iterators = dict(enumerate(iterators))
+    while iterators:
+        for index, iterator in list(iterators.items()):
+            try:
+                yield index, next(iterator)
+            except StopIteration:
+                del iterators[index]
+
+def aggregate_file(file_path, confs_path, verbose=0, text_cache_path=None):
+    """ aggregate.aggregate_pdf_isolated() with the text cache of the batch, for the worker processes"""
+    if aggregate.text_cache_path != text_cache_path:
+        aggregate.set_text_cache(text_cache_path)
+    return aggregate.aggregate_pdf_isolated(file_path, confs_path, verbose)
+
+def aggregate_households(households, verbose=0, processes=None, include=[], exclude=[], text_cache_path=None,
+                         timeout=None, max_memory=None):
+    """
+    Aggregate the households of a manifest (see read_manifest()) in a single
+    pool of recycled worker processes with wall-time and memory limits (see
+    isolation.isolated_map()), that keep their confs and parsers warm from
+    one household to the next. The files of the households are interleaved
+    so that all the households progress together and the pool is kept busy
+    until the last file, instead of waiting for each household to complete.
+    A file that hangs or crashes its worker only fails itself.
+    @param text_cache_path if not None, folder where the extracted texts are
+     cached for all the households, see aggregate.set_text_cache()
+    @param timeout wall-time limit in seconds of each file
+    @param max_memory memory limit in MB of each worker
+    @return a generator of (household, accounts, failures) as the households
+     complete. Accounts are merged in file order. failures is the list of
+     {'file': path, 'error': message} of the files that failed.
+    """
+    # None ends the files of a household
+    file_paths = interleave(itertools.chain(discovery.unique_files(
+        discovery.iter_files(household['input'], include=include, exclude=exclude)), [None])
+        for household in households)
+    discovered = [False] * len(households)  # True once all the files of the household are submitted
+    results = [[] for household in households]  # (file index, file path, accounts or None, error or None)
+    pending = [0] * len(households)
+    submitted = collections.deque()  # (household index, file index) of the submitted files, in order
+
+    def iter_args():
+        for file_index, (index, file_path) in enumerate(file_paths):
+            if file_path is None:
+                discovered[index] = True
+                continue
+            submitted.append((index, file_index))
+            pending[index] += 1
+            yield file_path, households[index]['confs'], verbose, text_cache_path
+
+    def iter_completed():
+        for index, household in enumerate(households):
+            if discovered[index] and pending[index] == 0 and results[index] is not None:
+                yield (household, *merge_results(results[index]))
+                results[index] = None
+
+    for args, result, error in isolation.isolated_map(aggregate_file, iter_args(), timeout=timeout,
+                                                      max_memory=max_memory, processes=processes):
+        index, file_index = submitted.popleft()
+        pending[index] -= 1
+        if error is not None:
+            print(args[0], error, file=sys.stderr)
+        results[index].append((file_index, args[0], result[0] if error is None else None, error))
+        yield from iter_completed()
+    # the households without files, or discovered after the last result
+    yield from iter_completed()
+
+def merge_results(results):
+    """ Return the accounts merged in file order and the failures of the results of a household"""
+    accounts = {}
+    failures = []
+    for file_index, file_path, pdf_accounts, error in sorted(results, key=lambda result: result[0]):
+        if error is not None:
+            failures.append({'file': file_path, 'error': repr(error)})
+        else:
+            model.update_accounts(accounts, pdf_accounts)
+    return accounts, failures
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Aggregate the folders of a manifest, each into its own output file,"
+                                     " in a single run")
+    parser.add_argument("manifest",
+                        help='json file: [{"input": "folder", "output": "accounts.json", "confs": "optional confs"}]')
+    parser.add_argument("-c", "--confs", help="folder to find conf files, for the households without confs",
+                        default=os.path.join(os.path.dirname(os.path.realpath(__file__)), "..", "confs"))
+    parser.add_argument("-v", "--verbose", action="count", default=0)
+    parser.add_argument("--processes", type=int, help="number of worker processes, one per core by default")
+    parser.add_argument("--include", action='append', default=[],
+                        help="only aggregate the files matching the glob pattern")
+    parser.add_argument("--exclude", action='append', default=[],
+                        help="skip the files and folders matching the glob pattern")
+    parser.add_argument("--text-cache", help="folder where the extracted texts of all the households are cached")
+    parser.add_argument("--timeout", type=float,
+                        help="maximum time in seconds to parse a pdf")
+    parser.add_argument("--max-memory", type=float,
+                        help="maximum memory in MB of a worker process")
+    parser.add_argument("--quarantine", default="quarantine.json",
+                        help="json file to report the pdf files that failed, per output file")
+    parser.add_argument("--compact", action="store_true",
+                        help="write the output files without indentation")
+    parser.add_argument("--sort-keys", action="store_true",
+                        help="sort the accounts, properties and days of the output files")
+    args = parser.parse_args()
+
+    quarantine = {}
+    households = read_manifest(args.manifest, args.confs)
+    for household, accounts, failures in aggregate_households(
+            households, args.verbose, args.processes, args.include, args.exclude, args.text_cache,
+            args.timeout, args.max_memory):
+        with open_atomically(household['output']) as accounts_json_file:
+            model.write_json(accounts, accounts_json_file, None if args.compact else 2, args.sort_keys)
+        if failures:
+            quarantine[household['output']] = failures
+        print(household['output'], len(accounts), 'accounts', len(failures), 'failures')
+    if quarantine:
+        with open(args.quarantine, 'w') as quarantine_file:
+            json.dump(quarantine, quarantine_file, indent=2)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,141 @@
+import collections
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+
+try:
+    import compute
+    import synthetic
+except ImportError:
+    from . import compute
+    from . import synthetic
+
+# name -> (plot function name, keyword arguments)
+plot_modes = collections.OrderedDict([
+    ('plot_accounts', ('plot_accounts', {})),
+    ('plot_accounts-total', ('plot_accounts', {'total': True, 'subtotals': True})),
+    ('plot_accounts-log', ('plot_accounts', {'log_scale': True})),
+    ('plot_accounts-stacked', ('plot_accounts', {'stacked': True})),
+    ('plot_accounts_yearly-absolute', ('plot_accounts_yearly', {'yearly': 'absolute', 'total': True})),
+    ('plot_accounts_yearly-relative', ('plot_accounts_yearly', {'yearly': 'relative', 'subtotals': True})),
+])
+
+def timed(timings, name, function, *args, **kwargs):
+    """ Call function, append its duration to timings[name] and return its result"""
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    timings[name].append(time.perf_counter() - start)
+    return result
+
+def render(plot_function, accounts, **kwargs):
+    """ Plot and draw the figure without showing it"""
+    import matplotlib.pyplot as plt
+    plot_function(accounts, **kwargs)
+    plt.gcf().canvas.draw()
+    plt.close('all')
+
+def run_benchmarks(accounts_path, repeat=3, plots=True):
+    """
+    Time the balance engine and the plots on the accounts of accounts_path.
+    Accounts are read again before each benchmark so that the cached
+    balances of a benchmark don't speed up the next ones.
+    @return {benchmark name: [duration of each run in seconds]}
+    A benchmark that fails is reported as {'error': error message}.
+    """
+    timings = collections.defaultdict(list)
+    errors = {}
+    if plots:
+        import matplotlib
+        matplotlib.use('Agg')
+        try:
+            import plot
+        except ImportError:
+            from . import plot
+    account_filters = compute.parse_account_filters(['f-currency=$'])
+    for run in range(repeat):
+        accounts = timed(timings, 'readAccounts', compute.readAccounts, accounts_path)
+        account_ids = list(accounts.keys())
+        timed(timings, 'get_account_balances',
+              lambda: [compute.get_account_balances(accounts, account_id) for account_id in account_ids])
+        timed(timings, 'get_account_balances-yearly',
+              lambda: [compute.get_account_balances(accounts, account_id, yearly=True) for account_id in account_ids])
+        accounts = compute.readAccounts(accounts_path)
+        timed(timings, 'get_accounts_balances', compute.get_accounts_balances, accounts, account_ids)
+        accounts = compute.readAccounts(accounts_path)
+        timed(timings, 'filter-group',
+              lambda: compute.group_accounts(compute.filter_accounts(accounts, account_filters)))
+        for name, (function_name, kwargs) in plot_modes.items() if plots else []:
+            if name in errors:
+                continue
+            accounts = compute.readAccounts(accounts_path)
+            try:
+                with contextlib.redirect_stdout(io.StringIO()):
+                    timed(timings, name, render, getattr(plot, function_name), accounts, **kwargs)
+            except Exception as e:
+                errors[name] = repr(e)
+    results = {name: {'min': min(durations), 'mean': statistics.mean(durations), 'runs': durations}
+               for name, durations in timings.items()}
+    results.update({name: {'error': error} for name, error in errors.items()})
+    return results
+
+def get_environment():
+    import matplotlib
+    import numpy
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'processor': platform.processor(),
+        'numpy': numpy.__version__,
+        'matplotlib': matplotlib.__version__,
+    }
+
+def compare(results, previous_results, output=sys.stdout):
+    """ Print the ratio of the best durations of results over previous_results"""
+    for name, result in results['timings'].items():
+        previous_result = previous_results['timings'].get(name, {})
+        if 'min' not in result or 'min' not in previous_result:
+            continue
+        print('{:32} {:10.4f}s {:10.4f}s {:7.2f}x'.format(
+            name, previous_result['min'], result['min'], previous_result['min'] / result['min']), file=output)
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark the balance engine and the plots on synthetic accounts")
+    synthetic.add_generator_arguments(parser)
+    parser.add_argument("--input", help="benchmark an existing accounts json file instead of synthetic accounts")
+    parser.add_argument("--repeat", type=int, default=3,
+                        help="number of runs of each benchmark")
+    parser.add_argument("--no-plots", action="store_true",
+                        help="do not benchmark the plots")
+    parser.add_argument("--compare", help="results json file of a previous benchmark to compare with")
+    parser.add_argument("-o", "--output", default="benchmark.json",
+                        help="results json file")
+    args = parser.parse_args()
+
+    parameters = {'input': args.input} if args.input else synthetic.get_generator_parameters(args)
+    with tempfile.TemporaryDirectory() as folder_path:
+        accounts_path = args.input
+        if not accounts_path:
+            accounts_path = os.path.join(folder_path, 'accounts.json')
+            synthetic.write_accounts(synthetic.generate_accounts(**parameters), accounts_path)
+        timings = run_benchmarks(accounts_path, args.repeat, not args.no_plots)
+    results = {'parameters': parameters, 'environment': get_environment(), 'timings': timings}
+    with open(args.output, 'w', encoding='utf-8') as results_file:
+        json.dump(results, results_file, indent=2)
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as previous_results_file:
+            compare(results, json.load(previous_results_file))
+    else:
+        for name, result in timings.items():
+            print('{:32} {}'.format(name, '{:10.4f}s'.format(result['min']) if 'min' in result else result['error']))
+
+if __name__ == "__main__":
+    sys.exit(main())
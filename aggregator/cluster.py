@@ -0,0 +1,273 @@
+import json
+import multiprocessing
+import os
+import shutil
+import sys
+import time
+
+try:
+    import aggregate
+    import discovery
+    import model
+    from utils import write_atomically
+except ImportError:
+    from . import aggregate
+    from . import discovery
+    from . import model
+    from .utils import write_atomically
+
+# Aggregation of a large document set by workers running on several machines.
+# The coordinator splits the files into work units that the workers claim and
+# process through a folder shared by all the machines (e.g. a network file
+# system, the file paths must be the same on all of them):
+#     work_folder/job.json             confs and units of the job
+#     work_folder/units/00000.json     files of the unit: file paths, or [archive path, member name]
+#     work_folder/leases/00000         claimed by a worker, touched after each file
+#     work_folder/results/00000.json   result of each file of the unit
+#     work_folder/done                 all the results are merged
+# A lease that isn't touched for lease_timeout seconds is removed by the
+# coordinator: its worker is considered dead and the unit is claimed again.
+
+job_file_name = 'job.json'
+done_file_name = 'done'
+
+
+def get_unit_name(index):
+    return '{:05d}'.format(index)
+
+def get_unit_path(work_folder, unit_name):
+    return os.path.join(work_folder, 'units', unit_name + '.json')
+
+def get_lease_path(work_folder, unit_name):
+    return os.path.join(work_folder, 'leases', unit_name)
+
+def get_result_path(work_folder, unit_name):
+    return os.path.join(work_folder, 'results', unit_name + '.json')
+
+def get_unit_entry(file_path):
+    """ Return the file as stored in a unit: its path, [archive path, member name] for an archive member"""
+    if isinstance(file_path, discovery.ArchiveMember):
+        return [file_path.archive_path, file_path.member_name]
+    return file_path
+
+def read_unit_files(unit_entries):
+    """
+    Return the files of the entries of a unit (see get_unit_entry()), the
+    archive members are read again from their archive, once per archive.
+    """
+    member_names = {}  # archive path -> member names
+    for entry in unit_entries:
+        if isinstance(entry, list):
+            member_names.setdefault(entry[0], []).append(entry[1])
+    members = {archive_path: discovery.read_archive_members(archive_path, names)
+               for archive_path, names in member_names.items()}
+    return [members[entry[0]].get(entry[1], discovery.archive_separator.join(entry)) if isinstance(entry, list)
+            else entry for entry in unit_entries]
+
+def create_job(work_folder, file_paths, confs_path, unit_size=20):
+    """
+    Split file_paths in units of unit_size files, the previous job of
+    work_folder is removed.
+    @return the unit names, in file order
+    """
+    for folder_name in ['units', 'leases', 'results']:
+        shutil.rmtree(os.path.join(work_folder, folder_name), ignore_errors=True)
+        os.makedirs(os.path.join(work_folder, folder_name))
+    for file_name in [done_file_name, job_file_name]:
+        if os.path.exists(os.path.join(work_folder, file_name)):
+            os.remove(os.path.join(work_folder, file_name))
+    # the contents of the archive members are not kept, the workers read them again
+    unit_entries = [get_unit_entry(file_path) for file_path in file_paths]
+    unit_names = []
+    for index, start in enumerate(range(0, len(unit_entries), unit_size)):
+        unit_names.append(get_unit_name(index))
+        write_atomically(get_unit_path(work_folder, unit_names[-1]),
+                         json.dumps(unit_entries[start:start + unit_size]))
+    # written last: workers start once the units exist
+    write_atomically(os.path.join(work_folder, job_file_name),
+                     json.dumps({'confs': os.path.abspath(confs_path), 'units': unit_names}))
+    return unit_names
+
+def read_job(work_folder):
+    """ Return the job of work_folder, None if there is none yet"""
+    try:
+        with open(os.path.join(work_folder, job_file_name), encoding='utf-8') as job_file:
+            return json.load(job_file)
+    except FileNotFoundError:
+        return None
+
+def claim_unit(work_folder, unit_names):
+    """
+    Create the lease of the first unit without result nor lease.
+    @return the name of the claimed unit, None if there is none to claim
+    """
+    for unit_name in unit_names:
+        if os.path.exists(get_result_path(work_folder, unit_name)):
+            continue
+        try:
+            os.close(os.open(get_lease_path(work_folder, unit_name), os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+        except FileExistsError:
+            continue
+        return unit_name
+    return None
+
+def process_unit(work_folder, unit_name, confs_path, verbose=0):
+    """
+    Aggregate the files of the unit in this process (parsers stay warm from
+    one file to the next) and write their results.
+    """
+    lease_path = get_lease_path(work_folder, unit_name)
+    with open(get_unit_path(work_folder, unit_name), encoding='utf-8') as unit_file:
+        file_paths = read_unit_files(json.load(unit_file))
+    results = []
+    for file_path in file_paths:
+        matched_conf_ids = []
+        try:
+            pdf_accounts = aggregate.aggregate_pdf(file_path, confs_path, verbose, matched_conf_ids=matched_conf_ids)
+            results.append({'file': str(file_path), 'accounts': model.accounts_to_json(pdf_accounts),
+                            'matched': matched_conf_ids})
+        except Exception as e:
+            print(file_path, e, file=sys.stderr)
+            results.append({'file': str(file_path), 'error': repr(e)})
+        try:
+            os.utime(lease_path)
+        except FileNotFoundError:
+            # the lease expired, the unit may be processed by another worker
+            pass
+    write_atomically(get_result_path(work_folder, unit_name), json.dumps(results))
+    try:
+        os.remove(lease_path)
+    except FileNotFoundError:
+        pass
+
+def work(work_folder, confs_path=None, verbose=0, poll_interval=1):
+    """
+    Worker loop: claim and process units until all of them have a result.
+    @param confs_path if None, the confs of the job are used
+    """
+    job = read_job(work_folder)
+    while job is None:
+        time.sleep(poll_interval)
+        job = read_job(work_folder)
+    unit_names = job['units']
+    while not os.path.exists(os.path.join(work_folder, done_file_name)):
+        unit_name = claim_unit(work_folder, unit_names)
+        if unit_name is not None:
+            process_unit(work_folder, unit_name, confs_path or job['confs'], verbose)
+        elif all(os.path.exists(get_result_path(work_folder, unit_name)) for unit_name in unit_names):
+            break
+        else:
+            # wait for the units leased by other workers, in case they die
+            time.sleep(poll_interval)
+
+def expire_leases(work_folder, unit_names, lease_stamps, lease_timeout):
+    """
+    Remove the leases that didn't change for lease_timeout seconds.
+    Modification times are compared with the ones seen by the previous calls
+    rather than with the clock, which may differ from the one of the shared
+    folder.
+    @param lease_stamps {unit name: (lease modification time, time it was first seen)}, updated
+    @return the names of the expired units
+    """
+    now = time.monotonic()
+    expired = []
+    for unit_name in unit_names:
+        lease_path = get_lease_path(work_folder, unit_name)
+        try:
+            mtime = os.stat(lease_path).st_mtime_ns
+        except FileNotFoundError:
+            lease_stamps.pop(unit_name, None)
+            continue
+        if unit_name not in lease_stamps or lease_stamps[unit_name][0] != mtime:
+            lease_stamps[unit_name] = (mtime, now)
+        elif now - lease_stamps[unit_name][1] > lease_timeout:
+            try:
+                os.remove(lease_path)
+            except FileNotFoundError:
+                pass
+            del lease_stamps[unit_name]
+            expired.append(unit_name)
+    return expired
+
+def merge_results(work_folder, unit_names, failures=None):
+    """
+    Merge the results of the units in unit and file order, whatever the
+    order they were processed in.
+    @param failures if not None, a list where {'file': path, 'error': message}
+     of the files that failed are appended
+    """
+    accounts = {}
+    for unit_name in unit_names:
+        with open(get_result_path(work_folder, unit_name), encoding='utf-8') as result_file:
+            for result in json.load(result_file):
+                if 'error' in result:
+                    if failures is not None:
+                        failures.append(result)
+                    continue
+                model.update_accounts(accounts, model.accounts_from_json(result['accounts']))
+    return accounts
+
+def coordinate(work_folder, file_paths, confs_path="./confs", verbose=0, unit_size=20,
+               lease_timeout=300, workers=0, poll_interval=1, failures=None):
+    """
+    Split file_paths in work units, wait for the workers to process them and
+    merge their results.
+    @param lease_timeout seconds without progress of a worker (i.e. longer
+     than the slowest file) before its unit is given to another worker
+    @param workers number of worker processes started on this machine, in
+     addition to the ones started with `cluster.py work_folder` on other
+     machines. The local workers that die are restarted.
+    @param failures see merge_results()
+    """
+    unit_names = create_job(work_folder, file_paths, confs_path, unit_size)
+    def start_worker():
+        process = multiprocessing.Process(target=work, args=(work_folder, None, verbose, poll_interval))
+        process.start()
+        return process
+    local_workers = [start_worker() for _ in range(workers)]
+    lease_stamps = {}
+    try:
+        while not all(os.path.exists(get_result_path(work_folder, unit_name)) for unit_name in unit_names):
+            for unit_name in expire_leases(work_folder, unit_names, lease_stamps, lease_timeout):
+                print('lease of unit {} expired, reassigning it'.format(unit_name), file=sys.stderr)
+            local_workers = [process if process.is_alive() or process.exitcode == 0 else start_worker()
+                             for process in local_workers]
+            time.sleep(poll_interval)
+        accounts = merge_results(work_folder, unit_names, failures)
+        write_atomically(os.path.join(work_folder, done_file_name), '')
+    finally:
+        for process in local_workers:
+            process.join(poll_interval * 2)
+            if process.is_alive():
+                process.terminate()
+    return accounts
+
+def aggregate_pdfs_cluster(folder_path, work_folder, confs_path="./confs", verbose=0,
+                           duplicates=None, include=[], exclude=[], **kwargs):
+    """
+    aggregate_pdfs() with coordinate(): files with identical contents are
+    aggregated only once and the accounts are merged in discovery order.
+    @param kwargs see coordinate()
+    """
+    file_paths = discovery.unique_files(
+        discovery.iter_files(folder_path, include=include, exclude=exclude), duplicates)
+    return coordinate(work_folder, file_paths, confs_path, verbose, **kwargs)
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Worker of an aggregation coordinated with aggregate.py --cluster")
+    parser.add_argument("work_folder", help="folder shared with the coordinator")
+    parser.add_argument("-c", "--confs", help="folder to find conf files. Defaults to the confs of the coordinator")
+    parser.add_argument("-v", "--verbose", action="count", default=0)
+    parser.add_argument("--text-cache", help="folder where the extracted texts are cached")
+    parser.add_argument("--poll-interval", type=float, default=1,
+                        help="seconds between 2 checks of the work folder")
+    args = parser.parse_args()
+
+    if args.text_cache:
+        aggregate.set_text_cache(args.text_cache)
+    work(args.work_folder, args.confs, args.verbose, args.poll_interval)
+
+if __name__ == "__main__":
+    sys.exit(main())
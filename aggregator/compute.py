@@ -0,0 +1,553 @@
+import cachetools
+import calendar
+import collections
+import datetime
+import json
+import os
+import pathlib
+# Use SortedDict (instead of OrderedDict) to bisect
+from sortedcontainers import SortedDict
+
+try:
+    import currency as currencies
+    from utils import memoize_with_id, memoize_2
+except ImportError:
+    from . import currency as currencies
+    from .utils import memoize_with_id, memoize_2
+
+def fromJSON(accounts_file):
+    import dateutil.parser
+
+    def replace_keys(accounts):
+        new_accounts = { }
+        for key in accounts.keys():
+            date = None
+            try:
+                date = dateutil.parser.parse(key)
+            except Exception:
+                pass
+            if isinstance(date, datetime.date):
+                new_accounts[date] = accounts[key]
+            elif isinstance(accounts[key], dict):
+                new_accounts[key] = replace_keys(accounts[key])
+            else:
+                new_accounts[key] = accounts[key]
+        return new_accounts
+
+    try:
+        accountsJSON = json.load(accounts_file)
+    except Exception as e:
+        print('while loading', accounts_file)
+        raise e
+    accounts = replace_keys(accountsJSON)
+    return accounts
+
+
+# extension of the rollups files (see rollup.py) stored next to the accounts files
+rollups_extension = '.rollups.json'
+
+def readAccounts(accounts_path):
+    """
+    @return a dictionary where keys are account names
+    """
+    with open(accounts_path, encoding='utf-8') as accounts_file:
+        accounts = fromJSON(accounts_file)
+    return accounts
+
+all_account_types={
+    'checking': {
+        'account': {
+            'color': 'royalblue'
+        }
+    }, 'saving': {
+        'account': {
+            'color': 'tomato'
+        }
+    }, 'life-insurance': {
+        'account': {
+            'color': 'olivedrab'
+        }
+    }, 'loan': {
+        'account': {
+            'color': 'gold'
+        }
+    }, 'real-estate': {
+        'account': {
+            'color': 'sandybrown'
+        }
+    }, 'crowd-funding': {
+         'account': {
+            'color': 'green',
+            'input': 'operations'
+        }
+    }, 'other': {
+        'account': {
+            'color': 'silver'
+        }
+    }
+}
+
+# incremented each time all_account_types is modified
+account_types_version = 0
+
+# currency the balances are converted into (see set_currency()), no conversion if None
+target_currency = None
+# currency.Rates used for the conversions
+currency_rates = None
+
+def resolve_account_properties(accounts, account_id):
+    """ Return the account-type property of an account referenced by its id
+    Supports account redirection.
+    """
+    account = accounts.get(account_id, {}).get('account', None)
+    if not isinstance(account, dict):
+        account = accounts.get(account, {})
+    if account:
+        default_account = all_account_types.get(account.get('account-type'),{}).get('account', {})
+        account = {**default_account, **account}
+    return account
+
+class AccountIndex:
+    """
+    Resolved properties, redirections, filters and groups of accounts,
+    computed once.
+    The index is outdated when all_account_types is modified (see
+    set_account_input_types()) or accounts are added or removed.
+    Accounts and returned dictionaries must not be modified.
+    """
+    def __init__(self, accounts):
+        self.accounts = accounts
+        self.size = len(accounts)
+        self.version = account_types_version
+        self.properties = {account_id: resolve_account_properties(accounts, account_id)
+                           for account_id in accounts}
+        self.redirections = {account_id: account['account'] for account_id, account in accounts.items()
+                             if isinstance(account.get('account'), str)}
+        self.types = {account_id: properties.get('account-type')
+                      for account_id, properties in self.properties.items()}
+        self.filtered_accounts = {}
+        self.grouped_accounts = {}
+
+    def is_outdated(self):
+        return self.version != account_types_version or self.size != len(self.accounts)
+
+    def get_properties(self, account_id):
+        properties = self.properties.get(account_id)
+        if properties is None:
+            return resolve_account_properties(self.accounts, account_id)
+        return properties
+
+    def filter(self, account_filters=[]):
+        """ See filter_accounts() """
+        key = tuple((f['condition'], f['key'], f['value']) for f in account_filters)
+        if key not in self.filtered_accounts:
+            self.filtered_accounts[key] = {
+                account_id: account for (account_id, account) in self.accounts.items()
+                if filter_account(self.properties[account_id], account_filters)}
+        return self.filtered_accounts[key]
+
+    def group(self, account_types):
+        """ See group_accounts() """
+        key = tuple(account_types)
+        if key not in self.grouped_accounts:
+            grouped_accounts = collections.OrderedDict()
+            for account_type in [*account_types, 'other']:
+                for account_id, act in self.types.items():
+                    if act == account_type or (account_type == 'other' and
+                       act not in account_types):
+                        grouped_accounts.setdefault(account_type, {})[account_id] = self.accounts[account_id]
+            self.grouped_accounts[key] = grouped_accounts
+        return self.grouped_accounts[key]
+
+account_indexes = cachetools.LRUCache(maxsize=32)
+
+def get_account_index(accounts):
+    """ Return the (up to date) index of accounts"""
+    index = account_indexes.get(id(accounts))
+    if index is None or index.accounts is not accounts or index.is_outdated():
+        index = AccountIndex(accounts)
+        account_indexes[id(accounts)] = index
+    return index
+
+def get_account_properties(accounts, account_id):
+    """ Return the account-type property of an account referenced by its id
+    Supports account redirection.
+    The returned dictionary must not be modified.
+    """
+    return get_account_index(accounts).get_properties(account_id)
+
+def toTimestamp(day):
+    return calendar.timegm(day.timetuple())
+
+@memoize_with_id
+def toTimestamps(days):
+    return [toTimestamp(d) for d in days]
+
+
+def get_balance_exact(sorted_balances, day):
+    if sorted_balances.keys()[0] > day:
+        return 0
+    index = sorted_balances.bisect(day)
+    # last value if day is after last account entry
+    index -= 1
+    key = sorted_balances.iloc[index]
+    return sorted_balances[key]
+
+@memoize_2
+def get_balance(sorted_balances, day):
+    """
+    Return the balance for a given day. Existing or not.
+    Balance is Hermite interpolated.
+    :return The balance. 0 if there is no sorted balances
+    :rtype float
+    """
+    import numpy
+    #print('get_balance', sorted_balances, day)
+    days = toTimestamps(sorted_balances.keys())
+    if len(days) == 0:
+        return 0
+
+    # 1: Hermite interpolation:
+    if len(days) > 3 and toTimestamp(day) >= days[0] and toTimestamp(day) <= days[-1]:
+        from scipy import interpolate
+        f = interpolate.PchipInterpolator(days, sorted_balances.values())
+        return f(toTimestamp(day))
+
+    if len(days) != len(sorted_balances.values()):
+        days = toTimestamps(sorted_balances.keys())
+    # 2: linear interpolation:
+    return numpy.interp(toTimestamp(day), days, sorted_balances.values(), 0)
+
+    # if sorted_balances.keys()[0] > day:
+    #     return 0
+    # index = sorted_balances.bisect(day)
+    # # last value if day is after last account entry
+    # index -= 1
+    # key = sorted_balances.iloc[index]
+    # return sorted_balances[key]
+
+def get_balances(sorted_balances, days):
+    """
+    Vectorized get_balance(): return the balances for multiple days at once.
+    :rtype numpy.ndarray
+    """
+    import numpy
+    timestamps = numpy.array([toTimestamp(day) for day in days], dtype=float)
+    if len(sorted_balances) == 0:
+        return numpy.zeros(len(timestamps))
+    balance_days = numpy.array(toTimestamps(sorted_balances.keys()), dtype=float)
+    values = numpy.array(sorted_balances.values(), dtype=float)
+    # 2: linear interpolation:
+    balances = numpy.interp(timestamps, balance_days, values, 0)
+    # 1: Hermite interpolation:
+    if len(balance_days) > 3:
+        inside = (timestamps >= balance_days[0]) & (timestamps <= balance_days[-1])
+        if inside.any():
+            from scipy import interpolate
+            f = interpolate.PchipInterpolator(balance_days, values)
+            balances[inside] = f(timestamps[inside])
+    return balances
+
+def get_yearly_balance(sorted_balances, day):
+    first_day_of_the_year = day.replace(month=1, day=1)
+    balance_first_day_of_the_year = get_balance(sorted_balances, first_day_of_the_year)
+    return get_balance(sorted_balances, day) - balance_first_day_of_the_year
+
+def get_account_balance(accounts, account_id, day, *args, **kwargs):
+    """ Return the balance of an account for a given day."""
+    #print('get_account_balance', account_id)
+    sorted_balances = get_account_balances(accounts, account_id, *args, **kwargs)
+    balance_at_day = get_balance(sorted_balances, day)
+    return balance_at_day
+
+def crop_balances(sorted_balances, start=None, end=None, margin=3):
+    """
+    Returns the balances within [start, end] and `margin` balances before
+    start and after end.
+    Hermite interpolation (PCHIP) within [start, end] depends on the 2
+    balances around each side of an interval. margin=3 guarantees that
+    interpolating the cropped balances within [start, end] or at the 2
+    closest balances outside [start, end] is the same as interpolating all
+    the balances.
+    """
+    first = 0 if start is None else max(sorted_balances.bisect_left(start) - margin, 0)
+    last = len(sorted_balances) if end is None else sorted_balances.bisect_right(end) + margin
+    if first == 0 and last >= len(sorted_balances):
+        return sorted_balances
+    return SortedDict((day, sorted_balances[day]) for day in sorted_balances.islice(first, last))
+
+# converted series are cached per account and currency
+@memoize_2(maxsize=2048)
+def get_account_balances(accounts, account_id, yearly=False, currency=None, start=None, end=None):
+    """
+    Returns all the balances of the account.
+    Takes into account the `share` account property.
+
+    @param yearly if True, balance is reset on January firsts
+    @param currency if not None, balances are converted from the account
+     currency with the rates of set_currency(). Defaults to the currency of
+     set_currency()
+    @param start, end if not None, only the balances within [start, end]
+     (and the few around, see crop_balances()) are returned.
+    @return a SortedDict of balances, None if no balance exist
+    """
+    if start is not None or end is not None:
+        return crop_balances(get_account_balances(accounts, account_id, yearly, currency), start, end)
+    if currency is None and target_currency is not None:
+        return get_account_balances(accounts, account_id, yearly, target_currency)
+    balances = accounts[account_id].get('balances', None)
+    share = get_account_properties(accounts, account_id).get('share', 1)
+    if not balances:
+        sorted_balance = SortedDict()
+    else:
+        sorted_balance = SortedDict((date, value * share) for date, value in balances.items())
+    #no_change = get_account_properties(accounts, account_id).get('no_change', False)
+    input = get_account_properties(accounts, account_id).get('input', 'balances')
+    if input == 'operations' or not balances:
+        operations = accounts[account_id].get('operations', None)
+        if operations:
+            sorted_operations = SortedDict((date, value * share) for date, value in operations.items())
+            operation_first_day = sorted_operations.keys()[0]
+        else:
+            sorted_operations = SortedDict()
+            operation_first_day = datetime.datetime.max
+        # operation first day is optional, use balance in that case
+        if sorted_balance:
+            balance_first_day = sorted_balance.keys()[0]
+            if balance_first_day < operation_first_day:
+                sorted_operations[balance_first_day] = sorted_balance[balance_first_day]
+            sorted_balance.clear()
+        dates = sorted_operations.keys()
+        for i, date in enumerate(dates):
+            sorted_balance[date] = sorted_operations[date] + sorted_balance.get(dates[i - 1], 0)
+        #for day, balance in sorted_balance.items():
+        #    sorted_balance[day] = first_balance
+    account_currency = get_account_properties(accounts, account_id).get('currency')
+    if currency is not None and account_currency is not None:
+        if currency_rates is None:
+            if currencies.get_currency_code(account_currency) != currencies.get_currency_code(currency):
+                raise ValueError('No exchange rates to convert the account into currency, see set_currency()',
+                                 account_id, account_currency, currency)
+        else:
+            # converted with the rate of each day, before yearly balances are computed
+            sorted_balance = currency_rates.convert(sorted_balance, account_currency, currency)
+    if yearly:
+        sorted_yearly_balances = SortedDict()
+        for day in sorted_balance.keys():
+            first_day_of_the_year = day.replace(month=1, day=1)
+            last_day_of_previous_year = first_day_of_the_year - datetime.timedelta(days = 1 )
+            yearly_balance_last_day_of_the_year = get_yearly_balance(sorted_balance, last_day_of_previous_year)
+            if yearly_balance_last_day_of_the_year != 0:
+                sorted_yearly_balances[last_day_of_previous_year] = yearly_balance_last_day_of_the_year
+                sorted_yearly_balances[first_day_of_the_year] = 0
+            sorted_yearly_balances[day] = get_yearly_balance(sorted_balance, day)
+        sorted_balance = sorted_yearly_balances
+    #print(account_id, input, sorted_balance)
+
+    return sorted_balance
+
+def get_accounts_balances(accounts, account_ids, *args, **kwargs):
+    """
+    Get balances of multiple accounts at once.
+    Returned values are not "sum" of all accounts but lists of each account balance
+    """
+    sorted_dates = SortedDict()
+    # First get only the dates
+    for account_id in account_ids:
+        sorted_balances = get_account_balances(accounts, account_id, *args, **kwargs)
+        if sorted_balances is None:
+            continue
+        sorted_dates.update(dict.fromkeys(sorted_balances.keys(), 0))
+    # Each account keeps 3 balances around the date range, only 2 dates can be
+    # interpolated as if the balances were not cropped.
+    sorted_dates = crop_balances(sorted_dates, kwargs.get('start'), kwargs.get('end'), margin=2)
+
+    # For each date, compute the balance for each accounts
+    for day in sorted_dates:
+        balances = []
+        for account_id in account_ids:
+            balance = get_account_balance(accounts, account_id, day, *args, **kwargs)
+            balances.append(balance)
+        sorted_dates[day] = balances
+    return sorted_dates
+
+def filter_account(account, account_filters = []):
+    """
+    :param account_filters: a list of dictionaries, each containing the filter to apply.
+     Each dictionary should have the following structure:
+        {
+            'condition': bool,
+            'key': str,
+            'value': any
+        }
+    :type account_filters: list of dict
+    :return True if account matches at least one filter
+    :rtype bool
+    :example
+        # Returns True only if the account is a checking account not in USD:
+        filter_account(account, [{'condition': True, 'key': 'account-type', 'value': 'checking'}, {'condition': False, 'key': 'currency', 'value': '$'}, ])
+        # Returns True if account is not in USD or if a checking account:
+        filter_account(account, [{'condition': False, 'key': 'currency', 'value': '$'}, {'condition': True, 'key': 'account-type', 'value': 'checking'}])
+        # Returns False if account is not in USD or if it is a checking account, True otherwise:
+        filter_account(account, [{'condition': False, 'key': 'currency', 'value': '$'}, {'condition': False, 'key': 'account-type', 'value': 'checking'}])
+    """
+    reject = False
+    for account_filter in account_filters:
+        if account_filter['condition']:
+            if account.get(account_filter['key']) != account_filter['value']:
+                return False
+            else:
+                reject = False
+        else:
+            if account.get(account_filter['key']) == account_filter['value']:
+                reject = True
+    return not reject
+
+def filter_accounts(accounts, account_filters = []):
+    """
+    :return a dictionary with accounts matching account_filters. It must not be modified.
+    :rtype dict
+    """
+    return get_account_index(accounts).filter(account_filters)
+
+def group_accounts(accounts, account_types=all_account_types.keys()):
+    """
+    Group accounts per category type.
+    TODO: key=account_type, value=list of account ids
+    {
+      'checking': {
+        'BNP-foo': {},
+        'BPLC-bar': {},
+      },
+      'saving': {
+        'LivretA': {},
+        'PEL': {},
+      },
+    }
+    @return an ordered dict of input accounts grouped by account type. It must not be modified.
+    """
+    return get_account_index(accounts).group(account_types)
+
+def set_currency(currency, rates=None):
+    """
+    Convert the balances of all the accounts into currency (e.g. for totals
+    of accounts in different currencies).
+    :param currency: currency symbol or code, None for no conversion
+    :param rates: currency.Rates of the currencies of the accounts
+    """
+    global target_currency, currency_rates
+    target_currency = currency
+    currency_rates = rates
+    get_account_balances.cache_clear()
+
+def get_currency_fingerprint():
+    """ Return what converted balances depend on, None if there is no conversion"""
+    if target_currency is None:
+        return None
+    return [currencies.get_currency_code(target_currency),
+            currency_rates.get_digest() if currency_rates is not None else None]
+
+def set_account_input_types(account_input_types):
+    """
+    Override the 'input' ('balances' or 'operations') of account types.
+    :param account_input_types: dict of account type -> input, None to keep the default
+    """
+    global account_types_version
+    for account_type, input in account_input_types.items():
+        if input and all_account_types[account_type]['account'].get('input') != input:
+            all_account_types[account_type]['account']['input'] = input
+            account_types_version += 1
+            # the balances of the accounts of that type are computed from another input
+            get_account_balances.cache_clear()
+
+def get_accounts_files(files_or_folders):
+    """
+    Generator of the json files and the json files of the folders, in the
+    order their accounts are read
+    """
+    for file_or_folder in files_or_folders:
+        if pathlib.Path(file_or_folder).is_file():
+            yield file_or_folder
+        else:
+            for root, dirs, files in os.walk(file_or_folder):
+                for file in files:
+                    accounts_file_path = os.path.join(root, file)
+                    [stem, ext] = os.path.splitext(accounts_file_path)
+                    if ext == '.json' and not accounts_file_path.endswith(rollups_extension):
+                        yield accounts_file_path
+
+def read_accounts_files(files_or_folders):
+    """
+    @return the accounts of json files and folders containing json files
+    """
+    accounts = {}
+    for accounts_file_path in get_accounts_files(files_or_folders):
+        accounts.update(readAccounts(accounts_file_path))
+    return accounts
+
+def parse_account_filters(filters):
+    """
+    Convert command line filters in the format f±key=value into account filters.
+    See filter_account()
+    """
+    account_filters = []
+    for item in filters:
+        condition = item[:2]
+        item = item[2:]
+        if condition not in ['f+', 'f-']:
+            raise ValueError('Filter must start with f+ or f-', condition)
+        else:
+            condition = condition == 'f+' # True if f+, False if f-
+        key, value = item.split('=')
+        account_filters.append(
+            {
+                'condition': condition,
+                'key': key,
+                'value': value
+            })
+    return account_filters
+
+def add_accounts_arguments(parser):
+    """ Add the command line arguments to load, filter and configure accounts"""
+    parser.add_argument("file_or_folder", nargs='+',
+                        help="one or multiple json files or folders containing json files")
+    for account_type in all_account_types.keys():
+        parser.add_argument("--" + account_type, choices=['balances', 'operations'],
+                            help="Consider true balance or I/O operations. For a closing 'operations'"
+                             "(e.g. selling a real estate), please create a fake operation that adds"
+                             "capital gain the day before the day of the closing operation (that brings balance to 0)"
+                             "For example, if you buy a house 100K, and sell it 150K, you would then have 3"
+                             "operations: +100K, +50K, -150K")
+    parser.add_argument("--filter", action='append',
+                        help='Consider or reject specific accounts in the format ±key=value. E.g. --filter f+account-type=loan --filter f-currency=$ to consider only loans not in USD',
+                        default=[])
+    parser.add_argument("--currency",
+                        help="Convert the balances into the currency (e.g. € or EUR) with the rates of --rates")
+    parser.add_argument("--rates", action='append', default=[],
+                        help="csv (date,USD,GBP...) or json file of daily exchange rates against --rates-base")
+    parser.add_argument("--rates-base", default='EUR',
+                        help="Base currency of the csv exchange rates")
+
+def read_accounts_options(args):
+    """
+    @return the account filters and account input types of the arguments
+    added by add_accounts_arguments(), without reading the accounts files
+    The currency conversion is set (see set_currency()).
+    """
+    if getattr(args, 'currency', None):
+        set_currency(args.currency, currencies.read_rates(args.rates, args.rates_base))
+    account_filters = parse_account_filters(args.filter)
+    account_input_types = {}
+    args_dict = vars(args)
+    for account_type in all_account_types.keys():
+        account_input_types[account_type] = args_dict.get(account_type.replace('-', '_'))
+    return account_filters, account_input_types
+
+def read_accounts_arguments(args):
+    """
+    @return the accounts, account filters and account input types of the
+    arguments added by add_accounts_arguments()
+    The currency conversion is set (see set_currency()).
+    """
+    account_filters, account_input_types = read_accounts_options(args)
+    return read_accounts_files(args.file_or_folder), account_filters, account_input_types
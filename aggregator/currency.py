@@ -0,0 +1,129 @@
+import csv
+import datetime
+import hashlib
+import json
+import os
+
+from sortedcontainers import SortedDict
+
+# ISO code of the currency symbols used in the confs
+currency_codes = {
+    '€': 'EUR',
+    '$': 'USD',
+    '£': 'GBP',
+    '¥': 'JPY',
+}
+
+def get_currency_code(currency):
+    """ Return the ISO code of a currency symbol or code, e.g. '$' -> 'USD'"""
+    return currency_codes.get(currency, currency.upper())
+
+def to_ordinals(days):
+    import numpy
+    return numpy.fromiter((day.toordinal() for day in days), dtype=numpy.int64, count=len(days))
+
+class Rates:
+    """
+    Daily exchange rates of currencies against a base currency: the amount
+    of each currency for 1 unit of the base currency (e.g. 1 EUR = 1.08 USD),
+    the layout of the ECB reference rates.
+    The rate of a day without rate is the last rate before that day, or the
+    first rate for the days before it.
+    """
+    def __init__(self, base='EUR'):
+        self.base = get_currency_code(base)
+        self.tables = {}  # currency code -> (day ordinals, rates), sorted by day
+        self.digest = None  # see get_digest()
+
+    def update(self, currency, day_rates):
+        """ Add the rates {day: rate} of a currency"""
+        import numpy
+        code = get_currency_code(currency)
+        if code == self.base:
+            return
+        day_rates = {**self.to_dict(code), **day_rates}
+        days = sorted(day_rates)
+        self.tables[code] = (to_ordinals(days), numpy.array([day_rates[day] for day in days], dtype=float))
+        self.digest = None
+
+    def get_digest(self):
+        """ Return the sha256 of the rates, computed once after the updates"""
+        if self.digest is None:
+            digest = hashlib.sha256(self.base.encode('utf-8'))
+            for code, (days, rates) in sorted(self.tables.items()):
+                digest.update(code.encode('utf-8'))
+                digest.update(days.tobytes())
+                digest.update(rates.tobytes())
+            self.digest = digest.hexdigest()
+        return self.digest
+
+    def to_dict(self, currency):
+        if currency not in self.tables:
+            return {}
+        days, rates = self.tables[currency]
+        return {datetime.date.fromordinal(int(day)): rate for day, rate in zip(days, rates)}
+
+    def get_rates(self, currency, days):
+        """
+        Vectorized as-of lookup of the rates of a currency.
+        @param days numpy array of day ordinals
+        @return numpy array of the rates of the days
+        """
+        import numpy
+        code = get_currency_code(currency)
+        if code == self.base:
+            return numpy.ones(len(days))
+        if code not in self.tables:
+            raise ValueError('No exchange rate for currency', currency)
+        rate_days, rates = self.tables[code]
+        return rates[numpy.maximum(numpy.searchsorted(rate_days, days, side='right') - 1, 0)]
+
+    def convert(self, sorted_balances, from_currency, to_currency):
+        """ Return the balances converted with the rates of each day"""
+        import numpy
+        if get_currency_code(from_currency) == get_currency_code(to_currency) or len(sorted_balances) == 0:
+            return sorted_balances
+        days = to_ordinals(sorted_balances.keys())
+        factors = self.get_rates(to_currency, days) / self.get_rates(from_currency, days)
+        values = numpy.fromiter(sorted_balances.values(), dtype=float, count=len(sorted_balances)) * factors
+        return SortedDict(zip(sorted_balances.keys(), values.tolist()))
+
+def read_rates_file(rates_path, rates):
+    """
+    Add the rates of a file into rates:
+    - csv: "date,USD,GBP,..." header then a line per day (e.g. ECB reference
+      rates), empty or non-numeric rates are ignored
+    - json: {"base": "EUR", "rates": {"USD": {"2024-01-02": 1.09, ...}, ...}}
+    """
+    if os.path.splitext(rates_path)[1].lower() == '.json':
+        with open(rates_path, encoding='utf-8') as rates_file:
+            rates_json = json.load(rates_file)
+        if get_currency_code(rates_json.get('base', rates.base)) != rates.base:
+            raise ValueError('Rates with a different base currency', rates_path, rates_json['base'])
+        for currency, day_rates in rates_json['rates'].items():
+            rates.update(currency, {datetime.date.fromisoformat(day): rate for day, rate in day_rates.items()})
+        return rates
+    with open(rates_path, encoding='utf-8', newline='') as rates_file:
+        reader = csv.reader(rates_file)
+        currencies = [currency.strip() for currency in next(reader)[1:]]
+        table = {currency: {} for currency in currencies}
+        for row in reader:
+            if not row:
+                continue
+            day = datetime.date.fromisoformat(row[0].strip())
+            for currency, rate in zip(currencies, row[1:]):
+                try:
+                    table[currency][day] = float(rate)
+                except ValueError:
+                    pass
+    for currency, day_rates in table.items():
+        if currency:
+            rates.update(currency, day_rates)
+    return rates
+
+def read_rates(rates_paths, base='EUR'):
+    """ Return the Rates of the csv and json files, see read_rates_file()"""
+    rates = Rates(base)
+    for rates_path in rates_paths:
+        read_rates_file(rates_path, rates)
+    return rates
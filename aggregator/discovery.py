@@ -0,0 +1,189 @@
+import collections
+import fnmatch
+import hashlib
+import io
+import mmap
+import os
+import tarfile
+import zipfile
+
+# file listing glob patterns of files and folders to ignore (one per line)
+ignore_file_name = ".aggregatorignore"
+
+archive_extensions = ('.zip', '.tar', '.tgz', '.tar.gz', '.tar.bz2', '.tar.xz')
+# separates the archive path from the member name in archive member paths
+archive_separator = '::'
+
+class ArchiveMember(str):
+    """
+    Path of a file in an archive (e.g. "path/to/archive.zip::folder/file.pdf")
+    that holds the file contents read from the archive.
+    """
+    def __new__(cls, archive_path, member_name, contents):
+        member = super().__new__(cls, archive_path + archive_separator + member_name)
+        member.archive_path = archive_path
+        member.member_name = member_name
+        member.contents = contents
+        member.digest = hashlib.sha256(contents).hexdigest()
+        return member
+
+    def __reduce__(self):
+        return (ArchiveMember, (self.archive_path, self.member_name, self.contents))
+
+    def open(self):
+        """ Return an in-memory file object of the contents"""
+        return io.BytesIO(self.contents)
+
+def is_archive(file_path):
+    return file_path.lower().endswith(archive_extensions)
+
+def iter_archive_members(archive_path, accept=lambda member_name: True):
+    """
+    Generator of the ArchiveMember of the files in a zip or tar archive
+    (compressed or not), in one sequential pass.
+    @param accept function that returns True if the member must be read
+    """
+    if zipfile.is_zipfile(archive_path):
+        with zipfile.ZipFile(archive_path) as archive:
+            for info in archive.infolist():
+                if not info.is_dir() and accept(info.filename):
+                    yield ArchiveMember(archive_path, info.filename, archive.read(info))
+    else:
+        # stream mode: members are read in order, without seeking back
+        with tarfile.open(archive_path, 'r|*') as archive:
+            for info in archive:
+                if info.isfile() and accept(info.name):
+                    yield ArchiveMember(archive_path, info.name, archive.extractfile(info).read())
+
+def read_archive_members(archive_path, member_names):
+    """ Return {member name: ArchiveMember} of the member_names of an archive, read in one pass"""
+    member_names = set(member_names)
+    return {member.member_name: member
+            for member in iter_archive_members(archive_path, lambda member_name: member_name in member_names)}
+
+def get_size(file_path):
+    if isinstance(file_path, ArchiveMember):
+        return len(file_path.contents)
+    return os.path.getsize(file_path)
+
+def hash_file(file_path):
+    """
+    Return the sha256 hex digest of the file contents.
+    The file is memory-mapped instead of being read into memory.
+    """
+    if isinstance(file_path, ArchiveMember):
+        return file_path.digest
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as file:
+        if os.fstat(file.fileno()).st_size > 0: # empty files can't be mapped
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as contents:
+                digest.update(contents)
+    return digest.hexdigest()
+
+def unique_files(file_paths, duplicates=None):
+    """
+    Generator of the files of file_paths, except the ones identical to a
+    previous file.
+    A file is hashed only if a previous file has the same size.
+    @param duplicates if not None, a dict where the skipped files are added:
+     {first file: [identical files]}
+    """
+    # only the paths and the digests of the archive members are kept, not
+    # their contents, so that memory doesn't grow with the archives
+    first_paths_per_size = {}  # size -> (first file of that size, its digest if known), not hashed yet
+    first_paths_per_hash = {}
+    for file_path in file_paths:
+        size = get_size(file_path)
+        is_member = isinstance(file_path, ArchiveMember)
+        path = str(file_path) if is_member else file_path
+        if size not in first_paths_per_size:
+            first_paths_per_size[size] = (path, file_path.digest if is_member else None)
+            yield file_path
+            continue
+        if first_paths_per_size[size] is not None:
+            first_path, first_digest = first_paths_per_size[size]
+            first_paths_per_hash.setdefault(first_digest or hash_file(first_path), first_path)
+            first_paths_per_size[size] = None
+        digest = hash_file(file_path)
+        if digest not in first_paths_per_hash:
+            first_paths_per_hash[digest] = path
+            yield file_path
+        elif duplicates is not None:
+            duplicates.setdefault(first_paths_per_hash[digest], []).append(path)
+
+def group_duplicates(file_paths):
+    """
+    Group files with identical contents.
+    :return an ordered dict where keys are the first file of each group (in
+     file_paths order) and values the list of its duplicates.
+    """
+    duplicates = {}
+    groups = collections.OrderedDict(
+        (file_path, []) for file_path in unique_files(file_paths, duplicates))
+    groups.update(duplicates)
+    return groups
+
+def read_ignore_file(folder_path):
+    """ Return the glob patterns of the ignore file of the folder, if any"""
+    try:
+        with open(os.path.join(folder_path, ignore_file_name), encoding='utf-8') as ignore_file:
+            lines = [line.strip() for line in ignore_file]
+    except FileNotFoundError:
+        return []
+    return [line for line in lines if line and not line.startswith('#')]
+
+def matches(relative_path, name, patterns):
+    """ Return True if the path relative to the root folder or the name matches a pattern"""
+    return any(fnmatch.fnmatch(relative_path, pattern) or fnmatch.fnmatch(name, pattern)
+               for pattern in patterns)
+
+def iter_files(folder_path, extensions=('.pdf',), include=[], exclude=[], archives=True):
+    """
+    Generator of the files in folder_path and its sub-folders.
+    Files are yielded while folders are scanned.
+    @param archives if True, the files in zip and tar archives are yielded as
+     ArchiveMember. Glob patterns are matched against "archive/member" paths.
+     folder_path can be an archive.
+    @param extensions only files with these (case insensitive) extensions are yielded,
+     all files if None
+    @param include if not empty, only files matching one of the glob patterns are yielded
+    @param exclude files and folders matching one of the glob patterns are skipped.
+     Glob patterns are matched against the file or folder name and its path
+     relative to folder_path (with '/' separators).
+     Patterns listed in a .aggregatorignore file of a folder are excluded in
+     that folder and its sub-folders.
+    """
+    def accept(relative_path, name, exclude):
+        return ((extensions is None or os.path.splitext(name)[1].lower() in extensions)
+                and (not include or matches(relative_path, name, include))
+                and not matches(relative_path, name, exclude))
+
+    def iter_archive(archive_path, relative_archive_path, exclude):
+        return iter_archive_members(archive_path, lambda member_name: accept(
+            relative_archive_path + member_name, os.path.basename(member_name), exclude))
+
+    if archives and os.path.isfile(folder_path) and is_archive(folder_path):
+        # the archive is the root folder
+        yield from iter_archive(folder_path, '', exclude)
+        return
+
+    folders = [(folder_path, '', list(exclude))]
+    while folders:
+        folder, relative_folder, folder_exclude = folders.pop()
+        folder_exclude = folder_exclude + read_ignore_file(folder)
+        sub_folders = []
+        with os.scandir(folder) as entries:
+            for entry in sorted(entries, key=lambda entry: entry.name):
+                relative_path = relative_folder + entry.name
+                if matches(relative_path, entry.name, folder_exclude):
+                    continue
+                if entry.is_dir():
+                    sub_folders.append((entry.path, relative_path + '/', folder_exclude))
+                elif not entry.is_file():
+                    continue
+                elif archives and is_archive(entry.name):
+                    yield from iter_archive(entry.path, relative_path + '/', folder_exclude)
+                elif accept(relative_path, entry.name, folder_exclude):
+                    yield entry.path
+        # depth-first, in name order
+        folders += reversed(sub_folders)
@@ -0,0 +1,264 @@
+import matplotlib as mpl
+import matplotlib.container
+import matplotlib.lines
+import numpy
+
+# Properties of the plots and their legend for each picking level:
+# normal, highlighted and hidden.
+artist_properties = {
+    mpl.lines.Line2D: [{
+        'plot': {
+            'linewidth': 1,  # line_width ?
+            'visible': True,
+            'zorder': 2
+        },
+        'legend': {
+            'linewidth': 1,  # line_width ?
+            'alpha': None
+        }
+    },
+    {
+        'plot': {
+            'linewidth': 4,  # line_width ?
+            'visible': True,
+            'zorder': 200
+        },
+        'legend': {
+            'linewidth': 4,  # line_width ?
+            'alpha': None
+        }
+    },
+    {
+        'plot': {
+            'linewidth': 1,  # line_width ?
+            'visible': False,
+            'zorder': 2
+        },
+        'legend': {
+            'linewidth': 1,  # line_width ?
+            'alpha': 0.2
+        }
+    }],
+    mpl.container.BarContainer: [{
+        'plot': {
+            'alpha': 1,
+            'visible': True
+        },
+        'legend': {
+            'alpha': None
+        }
+    },
+    {
+        'plot': {
+            'alpha': 0.4,
+            'visible': True
+        },
+        'legend': {
+            'alpha': 0.3
+        }
+    },
+    {
+        'plot': {
+            'alpha': 1,
+            'visible': False,
+        },
+        'legend': {
+            'alpha': 0.15
+        }
+    }]
+}
+
+def get_artists(plot):
+    return plot.get_children() if isinstance(plot, mpl.container.BarContainer) else [plot]
+
+class InteractiveFigure:
+    """
+    Legend picking and cursor of a figure.
+    Clicking a legend element cycles its plot between normal, highlighted
+    and hidden. Clicking near a plot shows its label.
+
+    Instead of redrawing the whole figure (the legend texts and the many
+    plots are expensive to draw), the figure is drawn once without the
+    picked plots, their legend handles and the cursor annotation, and that
+    background is cached. On interaction, the background is restored and
+    only the picked plots, the legend box, their legend handles and the
+    annotation are drawn on top of it (blitting).
+    The background is recomputed when a plot is picked for the first time,
+    and after the figure is redrawn (e.g. zoom).
+    """
+    def __init__(self, fig, legend, plots, tolerance=5):
+        """
+        @param tolerance picking and cursor tolerance in points
+        """
+        self.fig = fig
+        self.ax = legend.axes
+        self.legend = legend
+        self.tolerance = tolerance
+        self.plots = {}  # legend element -> plot
+        self.levels = {}  # legend element -> picking level
+        for legend_element, plot in [*zip(legend.get_lines(), plots), *zip(legend.get_patches(), plots)]:
+            legend_element.set_picker(tolerance)
+            self.plots[legend_element] = plot
+            self.levels[legend_element] = 0
+        self.artists = [artist for plot in plots for artist in get_artists(plot)]
+        # legend elements of the picked plots, drawn over the background
+        self.active = set()
+        self.indexes = {}  # line -> (x, y) sorted by x
+        self.annotation = self.ax.annotate(
+            '', xy=(0, 0), xytext=(10, 10), textcoords='offset points',
+            bbox={'boxstyle': 'round', 'fc': 'lightyellow', 'alpha': 0.9},
+            zorder=1000, visible=False)
+        self.background = None
+        self.legend_background = None
+        self.caching = False
+        # bound methods are weakly referenced by the canvas, lambdas keep self alive
+        fig.canvas.mpl_connect('pick_event', lambda event: self.on_pick(event))
+        fig.canvas.mpl_connect('draw_event', lambda event: self.on_draw(event))
+        fig.canvas.mpl_connect('button_press_event', lambda event: self.on_click(event))
+
+    def on_draw(self, event):
+        if not self.caching:
+            self.background = None
+
+    def cache_background(self):
+        """ Draw the figure without the interactive artists and cache it"""
+        canvas = self.fig.canvas
+        interactive_artists = [artist for artist in [*self.get_active_artists(), *self.active, self.annotation]
+                               if artist.get_visible()]
+        for artist in interactive_artists:
+            artist.set_visible(False)
+        self.caching = True
+        try:
+            canvas.draw()
+        finally:
+            self.caching = False
+            for artist in interactive_artists:
+                artist.set_visible(True)
+        self.background = canvas.copy_from_bbox(self.fig.bbox)
+        self.legend_background = canvas.copy_from_bbox(self.legend.get_window_extent())
+
+    def get_active_artists(self):
+        return [artist for legend_element in self.active for artist in get_artists(self.plots[legend_element])]
+
+    def update(self):
+        canvas = self.fig.canvas
+        if not canvas.supports_blit:
+            canvas.draw_idle()
+            return
+        if self.background is None:
+            self.cache_background()
+        canvas.restore_region(self.background)
+        visible_artists = [artist for artist in self.get_active_artists() if artist.get_visible()]
+        for artist in sorted(visible_artists, key=lambda artist: artist.get_zorder()):
+            self.ax.draw_artist(artist)
+        # the legend box is above the plots
+        canvas.restore_region(self.legend_background)
+        for legend_handle in self.active:
+            self.ax.draw_artist(legend_handle)
+        if self.annotation.get_visible():
+            self.ax.draw_artist(self.annotation)
+        canvas.blit(self.fig.bbox)
+
+    def on_pick(self, event):
+        # on the pick event, find the orig line corresponding to the
+        # legend proxy line, and toggle the visibility
+        legend_element = event.artist
+        if legend_element not in self.plots:
+            return
+        if legend_element not in self.active:
+            # the background is drawn again without the picked plot, the
+            # plots back to normal are part of it again
+            self.active = {element for element in self.active if self.levels[element]} | {legend_element}
+            self.background = None
+        picked_plot = self.plots[legend_element]
+        artist_property = artist_properties[type(picked_plot)]
+        level = (self.levels[legend_element] + 1) % len(artist_property)
+        self.levels[legend_element] = level
+        for prop, value in artist_property[level]['plot'].items():
+            for p in get_artists(picked_plot):
+                getattr(p, 'set_' + prop)(value)
+        # Change the alpha on the line in the legend so we can see what lines
+        # have been toggled
+        for prop, value in artist_property[level]['legend'].items():
+            getattr(legend_element, 'set_' + prop)(value)
+        self.update()
+
+    def get_index(self, line):
+        """ Return the line points sorted by x to bisect them"""
+        if line not in self.indexes:
+            xy = numpy.asarray(line.get_xydata(), dtype=float)
+            order = numpy.argsort(xy[:, 0], kind='stable')
+            self.indexes[line] = (xy[order, 0], xy[order, 1])
+        return self.indexes[line]
+
+    def get_line_distance(self, line, x, y):
+        """
+        Return the distance in pixels between the display point (x, y) and
+        the closest point of the line within the tolerance, None if none.
+        """
+        line_x, line_y = self.get_index(line)
+        if len(line_x) == 0:
+            return None
+        tolerance = self.tolerance * self.fig.dpi / 72
+        to_data = self.ax.transData.inverted()
+        x_min = to_data.transform((x - tolerance, y))[0]
+        x_max = to_data.transform((x + tolerance, y))[0]
+        first = numpy.searchsorted(line_x, x_min, 'left')
+        last = numpy.searchsorted(line_x, x_max, 'right')
+        points = numpy.column_stack((line_x[first:last], line_y[first:last]))
+        if line.get_linestyle() not in ['None', '']:
+            # the line may cross the tolerance area between 2 points
+            x_data = to_data.transform((x, y))[0]
+            if line_x[0] <= x_data <= line_x[-1]:
+                points = numpy.vstack((points, [x_data, numpy.interp(x_data, line_x, line_y)]))
+        if len(points) == 0:
+            return None
+        distances = numpy.hypot(*(self.ax.transData.transform(points) - (x, y)).T)
+        distance = distances.min()
+        return distance if distance <= tolerance else None
+
+    def pick_artist(self, x, y):
+        """
+        Return the closest visible artist at display point (x, y).
+        There is no index over all the lines: each visible line is bisected
+        in turn (see get_line_distance()), a click costs O(lines * log(points)).
+        """
+        closest_artist, closest_distance = None, None
+        for artist in self.artists:
+            if not artist.get_visible():
+                continue
+            if isinstance(artist, mpl.lines.Line2D):
+                distance = self.get_line_distance(artist, x, y)
+            else:
+                distance = 0 if artist.contains_point((x, y)) else None
+            if distance is not None and (closest_distance is None or distance < closest_distance):
+                closest_artist, closest_distance = artist, distance
+        return closest_artist
+
+    def on_click(self, event):
+        if event.inaxes is not self.ax or self.legend.contains(event)[0]:
+            return
+        toolbar = getattr(self.fig.canvas, 'toolbar', None)
+        if toolbar is not None and getattr(toolbar, 'mode', ''):
+            return  # zooming or panning
+        artist = self.pick_artist(event.x, event.y)
+        if artist is None and not self.annotation.get_visible():
+            return
+        if artist is not None:
+            label = artist.get_label()
+            if label.startswith('_') and artist.axes is not None:
+                # bars are labelled by their container
+                label = next((container.get_label() for container in self.ax.containers
+                              if artist in container), label)
+            self.annotation.xy = (event.xdata, event.ydata)
+            self.annotation.set_text(label)
+        self.annotation.set_visible(artist is not None)
+        self.update()
+
+def setup_picking(fig, legend, plots):
+    """
+    Make the legend elements pickable to toggle their plot visibility and
+    show the plot labels on click.
+    @return the InteractiveFigure of the figure.
+    """
+    return InteractiveFigure(fig, legend, plots)
@@ -0,0 +1,139 @@
+import collections
+import itertools
+import multiprocessing
+import os
+import signal
+import time
+
+try:
+    import resource
+except ImportError: # not available on Windows
+    resource = None
+
+# SIGALRM and setitimer() are not available on Windows, the parent then
+# terminates the workers that exceed the wall-time limit
+has_alarm = hasattr(signal, 'SIGALRM')
+# extra seconds given to a worker before considering it lost (e.g. stuck in native code)
+lost_worker_grace = 10
+# seconds between two checks of the running tasks by the parent
+poll_interval = 0.5
+
+# pid and start time of each task, shared with the workers, see start_task()
+task_pids = None
+task_starts = None
+
+
+class DocumentTimeout(Exception):
+    pass
+
+
+def init_worker(max_memory=None, pids=None, starts=None):
+    """
+    Worker initializer.
+    :param max_memory: see limit_resources()
+    :param pids, starts: shared arrays where the workers write the pid and the
+     start time of each task they run
+    """
+    global task_pids, task_starts
+    task_pids = pids
+    task_starts = starts
+    limit_resources(max_memory)
+
+def limit_resources(max_memory=None):
+    """
+    :param max_memory: maximum address space of the worker in MB.
+     RLIMIT_RSS is not enforced by Linux, RLIMIT_AS is used instead so that
+     allocations beyond the limit raise MemoryError in the worker.
+    """
+    if resource is None or not max_memory:
+        return
+    limit = int(max_memory * 1024 * 1024)
+    resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+def on_alarm(signum, frame):
+    raise DocumentTimeout("wall-time limit exceeded")
+
+def start_task(index):
+    """ Let the parent know that the worker runs the task, see isolated_map()"""
+    if task_pids is not None:
+        task_starts[index] = time.monotonic()
+        task_pids[index] = os.getpid()
+
+def run_limited(function, timeout, args, index=None):
+    """ Run function(*args) in the worker, interrupted after timeout seconds"""
+    if index is not None:
+        start_task(index)
+    if timeout and has_alarm:
+        signal.signal(signal.SIGALRM, on_alarm)
+        signal.setitimer(signal.ITIMER_REAL, timeout)
+    try:
+        return function(*args)
+    finally:
+        if timeout and has_alarm:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+
+def isolated_map(function, args_list, timeout=None, max_memory=None,
+                 processes=None, tasks_per_child=50):
+    """
+    Run function(*args) for each args of args_list in a pool of worker processes.
+    Workers are recycled every tasks_per_child tasks to release leaked memory.
+    args_list is read as the results are consumed: at most 2 tasks per
+    worker are submitted ahead, so that a generator of files (see
+    discovery.iter_files()) yields its first results before being exhausted.
+    The parent watches the running tasks: the worker of a task that exceeds
+    the wall-time limit without being interrupted (on Windows, or in native
+    code) is terminated, and the task of a worker that died (e.g. killed when
+    out of memory) fails instead of being waited forever.
+    :param timeout: wall-time limit in seconds for each call
+    :param max_memory: memory limit in MB of each worker
+    :return a generator of (args, result, exception) in args_list order.
+     exception is None on success, result is None on failure.
+    """
+    processes = processes or os.cpu_count()
+    # the tasks in flight use the slots of the shared arrays in turn
+    window = 2 * processes
+    pids = multiprocessing.Array('l', window, lock=False)
+    starts = multiprocessing.Array('d', window, lock=False)
+    # the worker is terminated by the parent after kill_delay seconds
+    kill_delay = None
+    if timeout:
+        kill_delay = timeout + lost_worker_grace if has_alarm else timeout
+    with multiprocessing.Pool(processes,
+                              initializer=init_worker,
+                              initargs=(max_memory, pids, starts),
+                              maxtasksperchild=tasks_per_child) as pool:
+        tasks = enumerate(args_list)
+        pending = collections.deque()
+
+        def submit(count):
+            for index, args in itertools.islice(tasks, count):
+                slot = index % window
+                pids[slot] = 0
+                pending.append((slot, args, pool.apply_async(run_limited, (function, timeout, args, slot))))
+        submit(window)
+        while pending:
+            slot, args, async_result = pending.popleft()
+            while True:
+                try:
+                    yield args, async_result.get(poll_interval), None
+                except multiprocessing.TimeoutError:
+                    if not pids[slot]:
+                        continue  # not started yet
+                    workers = {worker.pid: worker for worker in multiprocessing.active_children()}
+                    worker = workers.get(pids[slot])
+                    if worker is None:
+                        # the result of a worker recycled after the task may still be in transit
+                        async_result.wait(poll_interval)
+                        if async_result.ready():
+                            continue
+                        yield args, None, DocumentTimeout("worker lost")
+                    elif kill_delay is not None and time.monotonic() - starts[slot] > kill_delay:
+                        worker.terminate()
+                        yield args, None, DocumentTimeout("wall-time limit exceeded" if not has_alarm
+                                                          else "worker lost")
+                    else:
+                        continue
+                except Exception as e:
+                    yield args, None, e
+                break
+            submit(1)
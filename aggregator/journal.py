@@ -0,0 +1,206 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+try:
+    import aggregate
+    import discovery
+    import model
+except ImportError:
+    from . import aggregate
+    from . import discovery
+    from . import model
+
+
+def iter_journal(journal_path):
+    """
+    Generator of the entries of a journal, none if it doesn't exist.
+    An incomplete last line (e.g. interrupted write) is ignored.
+    """
+    try:
+        journal_file = open(journal_path, encoding='utf-8')
+    except FileNotFoundError:
+        return
+    with journal_file:
+        for line in journal_file:
+            try:
+                yield json.loads(line)
+            except ValueError:
+                return
+
+def read_journal(journal_path):
+    """
+    Replay a journal.
+    @return {file path: accounts} of the documents aggregated successfully,
+     in journal order
+    """
+    return {entry['file']: model.accounts_from_json(entry['accounts'])
+            for entry in iter_journal(journal_path) if 'accounts' in entry}
+
+def get_file_stamp(file_path):
+    """
+    Return what changes when the contents of the file change: the digest of
+    an archive member, [size, modification time in ns] of a file
+    """
+    if isinstance(file_path, discovery.ArchiveMember):
+        return file_path.digest
+    stat = os.stat(file_path)
+    return [stat.st_size, stat.st_mtime_ns]
+
+def get_confs_digest(fingerprints):
+    return hashlib.sha256(json.dumps(fingerprints, sort_keys=True).encode('utf-8')).hexdigest()
+
+class Journal:
+    """
+    JSON Lines file where the result of each document is appended as soon as
+    it is aggregated, so that an interrupted run can be resumed:
+        {"confs-digest": "...", "confs": {conf id: fingerprint}}
+        {"file": "path/to/file.pdf", "accounts": {...}, "matched": [conf ids], "confs-digest": "...",
+         "stamp": [size, mtime]}
+        {"file": "path/to/other.pdf", "error": "..."}
+    Each document refers to the fingerprints of the confs it was tested
+    with, so that only the documents affected by a conf change are
+    aggregated again, and to the stamp of the file (see get_file_stamp()),
+    so that a file replaced at the same path is aggregated again.
+    Writes are buffered and synced to disk every sync_interval seconds.
+    Documents can be recorded from several threads.
+    """
+    def __init__(self, journal_path, resume=False, sync_interval=5):
+        """
+        @param resume if True, the documents of the existing journal are
+         replayed and new ones appended, otherwise the journal is emptied.
+        """
+        self.journal_path = journal_path
+        self.sync_interval = sync_interval
+        self.documents = {}  # file path -> accounts
+        self.tracking = {}  # file path -> (matched conf ids, confs digest)
+        self.stamps = {}  # file path -> stamp of the file when it was aggregated
+        # file path -> stamp, of the files found by unfinished(), None before
+        self.found = None
+        self.lock = threading.Lock()
+        self.conf_fingerprints = {}  # confs digest -> {conf id: fingerprint}
+        self.written_digests = set()
+        self.confs_path = None
+        self.confs = {}  # conf id -> conf, of confs_path
+        self.confs_digest = None
+        for entry in iter_journal(journal_path) if resume else []:
+            if 'confs' in entry:
+                self.conf_fingerprints[entry['confs-digest']] = entry['confs']
+            elif 'accounts' in entry:
+                self.documents[entry['file']] = model.accounts_from_json(entry['accounts'])
+                self.tracking[entry['file']] = (entry.get('matched', []), entry.get('confs-digest'))
+                self.stamps[entry['file']] = entry.get('stamp')
+        # the replayed documents are written back in a new journal, without
+        # the errors and the incomplete last line, that replaces the old one
+        self.journal_file = open(journal_path + '.tmp', 'w', encoding='utf-8')
+        for file_path, pdf_accounts in self.documents.items():
+            matched_conf_ids, confs_digest = self.tracking[file_path]
+            self.write_entry(file_path, pdf_accounts, matched_conf_ids, confs_digest, self.stamps[file_path])
+        self.close()
+        os.replace(journal_path + '.tmp', journal_path)
+        self.journal_file = open(journal_path, 'a', encoding='utf-8')
+        self.last_sync = time.monotonic()
+
+    def write_entry(self, file_path, pdf_accounts, matched_conf_ids, confs_digest, stamp):
+        if confs_digest in self.conf_fingerprints and confs_digest not in self.written_digests:
+            self.journal_file.write(json.dumps({'confs-digest': confs_digest,
+                                                'confs': self.conf_fingerprints[confs_digest]}) + '\n')
+            self.written_digests.add(confs_digest)
+        entry = {'file': file_path, 'accounts': model.accounts_to_json(pdf_accounts),
+                 'matched': matched_conf_ids, 'confs-digest': confs_digest, 'stamp': stamp}
+        self.journal_file.write(json.dumps(entry) + '\n')
+
+    def track_confs(self, confs_path):
+        """ Record that the next documents are aggregated with the confs of confs_path"""
+        self.confs_path = confs_path
+        self.confs = dict(aggregate.get_confs(confs_path))
+        fingerprints = {conf_id: aggregate.get_conf_fingerprint(conf) for conf_id, conf in self.confs.items()}
+        self.confs_digest = get_confs_digest(fingerprints)
+        self.conf_fingerprints[self.confs_digest] = fingerprints
+
+    def is_affected(self, file_path):
+        """
+        Return True if the document must be aggregated again because a conf
+        it matched changed, or a conf that changed now matches it.
+        An unaffected document is recorded as aggregated with the current confs.
+        """
+        matched_conf_ids, confs_digest = self.tracking[file_path]
+        if self.confs_digest is None or confs_digest == self.confs_digest:
+            return False
+        if confs_digest not in self.conf_fingerprints:
+            return True
+        old_fingerprints = self.conf_fingerprints[confs_digest]
+        fingerprints = self.conf_fingerprints[self.confs_digest]
+        changed_conf_ids = [conf_id for conf_id in fingerprints.keys() | old_fingerprints.keys()
+                            if fingerprints.get(conf_id) != old_fingerprints.get(conf_id)]
+        if any(conf_id in matched_conf_ids for conf_id in changed_conf_ids):
+            return True
+        # the extracted text is likely cached, see aggregate.set_text_cache()
+        if any(aggregate.find_parser(self.confs[conf_id], file_path) is not None
+               for conf_id in changed_conf_ids if conf_id in self.confs):
+            return True
+        self.record(file_path, self.documents[file_path], matched_conf_ids=matched_conf_ids)
+        return False
+
+    def unfinished(self, file_paths):
+        """
+        Generator of the files of file_paths not aggregated yet, modified, or
+        affected by a conf change since they were aggregated.
+        Only the files of file_paths are merged by accounts().
+        """
+        self.found = {}
+        for file_path in file_paths:
+            stamp = get_file_stamp(file_path)
+            # keyed by the string path, not to retain the contents of the archive members
+            self.found[str(file_path)] = stamp
+            if (file_path not in self.documents or self.stamps.get(file_path) != stamp
+                    or self.is_affected(file_path)):
+                yield file_path
+
+    def record(self, file_path, pdf_accounts=None, error=None, matched_conf_ids=[]):
+        """
+        Append the accounts of the document and the ids of the confs that
+        matched it, or the error that prevented it.
+        """
+        with self.lock:
+            if error is not None:
+                self.journal_file.write(json.dumps({'file': str(file_path), 'error': repr(error)}) + '\n')
+            else:
+                if self.found is not None and file_path in self.found:
+                    stamp = self.found[file_path]
+                else:
+                    stamp = get_file_stamp(file_path)
+                file_path = str(file_path)
+                self.write_entry(file_path, pdf_accounts, matched_conf_ids, self.confs_digest, stamp)
+                self.documents[file_path] = pdf_accounts
+                self.tracking[file_path] = (matched_conf_ids, self.confs_digest)
+                self.stamps[file_path] = stamp
+            if time.monotonic() - self.last_sync >= self.sync_interval:
+                self.sync()
+
+    def sync(self):
+        self.journal_file.flush()
+        os.fsync(self.journal_file.fileno())
+        self.last_sync = time.monotonic()
+
+    def accounts(self):
+        """
+        Compaction: merge the accounts of the documents of the journal found
+        by unfinished(), all of them if it wasn't called. The documents that
+        were removed, or are now excluded, are left out.
+        """
+        return model.merge_accounts(pdf_accounts for file_path, pdf_accounts in self.documents.items()
+                                    if self.found is None or file_path in self.found)
+
+    def close(self):
+        if not self.journal_file.closed:
+            self.sync()
+            self.journal_file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
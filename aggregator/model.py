@@ -0,0 +1,187 @@
+import array
+import datetime
+import json
+import sys
+
+
+def intern_properties(properties):
+    """ Intern the keys and string values: they repeat across statements"""
+    return {sys.intern(key): sys.intern(value) if isinstance(value, str) else value
+            for key, value in properties.items()}
+
+class DatedValues:
+    """
+    Append-only series of (day, value).
+    When a day is appended several times, the last value is kept.
+    """
+    __slots__ = ('days', 'values')
+
+    def __init__(self):
+        self.days = array.array('l')  # date ordinals
+        self.values = array.array('d')
+
+    def append(self, day, value):
+        self.days.append(day.toordinal())
+        self.values.append(value)
+
+    def extend(self, other):
+        self.days.extend(other.days)
+        self.values.extend(other.values)
+
+    def to_dict(self):
+        """ Return {day: value}, in first appended order"""
+        return {datetime.date.fromordinal(day): value for day, value in zip(self.days, self.values)}
+
+    def to_json(self):
+        return {datetime.date.fromordinal(day).isoformat(): value
+                for day, value in zip(self.days, self.values)}
+
+    @classmethod
+    def from_json(cls, json_values):
+        dated_values = cls()
+        for day, value in json_values.items():
+            dated_values.append(datetime.date.fromisoformat(day), value)
+        return dated_values
+
+class Ledger:
+    """
+    Append-only table of transactions (day, seq, label, amount), seq being
+    the rank of the transaction in its day on the statement.
+    When a (day, seq) is appended several times, the last one is kept.
+    """
+    __slots__ = ('days', 'seqs', 'labels', 'amounts')
+
+    def __init__(self):
+        self.days = array.array('l')  # date ordinals
+        self.seqs = array.array('l')
+        self.labels = []  # interned, labels repeat across months
+        self.amounts = array.array('d')
+
+    def __len__(self):
+        return len(self.days)
+
+    def append(self, day, seq, label, amount):
+        self.days.append(day.toordinal())
+        self.seqs.append(seq)
+        self.labels.append(sys.intern(label))
+        self.amounts.append(amount)
+
+    def extend(self, other):
+        self.days.extend(other.days)
+        self.seqs.extend(other.seqs)
+        self.labels.extend(other.labels)
+        self.amounts.extend(other.amounts)
+
+    def rows(self):
+        """ Return the {(day ordinal, seq): (label, amount)} of the transactions, sorted"""
+        rows = {(day, seq): (label, amount) for day, seq, label, amount
+                in zip(self.days, self.seqs, self.labels, self.amounts)}
+        return {key: rows[key] for key in sorted(rows)}
+
+    def to_json(self):
+        """ Return the [day, seq, label, amount] rows, sorted by (day, seq)"""
+        return [[datetime.date.fromordinal(day).isoformat(), seq, label, amount]
+                for (day, seq), (label, amount) in self.rows().items()]
+
+    @classmethod
+    def from_json(cls, json_rows):
+        ledger = cls()
+        for day, seq, label, amount in json_rows:
+            ledger.append(datetime.date.fromisoformat(day), seq, label, amount)
+        return ledger
+
+class Account:
+    """
+    Aggregated account: its properties (bank-name, account-type, currency...),
+    its balances and operations per day and its transactions.
+    """
+    __slots__ = ('properties', 'balances', 'operations', 'transactions')
+
+    def __init__(self, properties={}):
+        self.properties = intern_properties(properties)
+        self.balances = DatedValues()
+        self.operations = DatedValues()
+        self.transactions = Ledger()
+
+    def update(self, properties):
+        self.properties.update(intern_properties(properties))
+
+    def merge(self, other):
+        """ Add the properties, balances, operations and transactions of other, in O(len(other))"""
+        self.properties.update(other.properties)
+        self.balances.extend(other.balances)
+        self.operations.extend(other.operations)
+        self.transactions.extend(other.transactions)
+
+    def to_json(self):
+        """ Return the account in the accounts.json layout"""
+        account_json = {'account': self.properties}
+        if self.balances.days:
+            account_json['balances'] = self.balances.to_json()
+        if self.operations.days:
+            account_json['operations'] = self.operations.to_json()
+        if self.transactions.days:
+            account_json['transactions'] = self.transactions.to_json()
+        return account_json
+
+    @classmethod
+    def from_json(cls, account_json):
+        account = cls(account_json.get('account', {}))
+        account.balances = DatedValues.from_json(account_json.get('balances', {}))
+        account.operations = DatedValues.from_json(account_json.get('operations', {}))
+        account.transactions = Ledger.from_json(account_json.get('transactions', []))
+        return account
+
+    def __eq__(self, other):
+        return isinstance(other, Account) and self.to_json() == other.to_json()
+
+    def __repr__(self):
+        return "Account({})".format(self.to_json())
+
+def update_accounts(accounts, new_accounts):
+    """
+    Merge the accounts of new_accounts ({account id: Account}) into accounts.
+    The accounts of new_accounts are left untouched.
+    """
+    for account_id, account in new_accounts.items():
+        if account_id not in accounts:
+            accounts[account_id] = Account()
+        accounts[account_id].merge(account)
+    return accounts
+
+def merge_accounts(accounts_list):
+    """ Merge accounts dictionaries, the last ones take precedence"""
+    accounts = {}
+    for new_accounts in accounts_list:
+        update_accounts(accounts, new_accounts)
+    return accounts
+
+def accounts_to_json(accounts):
+    return {account_id: account.to_json() for account_id, account in accounts.items()}
+
+def accounts_from_json(json_accounts):
+    return {account_id: Account.from_json(account_json) for account_id, account_json in json_accounts.items()}
+
+def write_json(accounts, output, indent=2, sort_keys=False):
+    """
+    Write accounts in the accounts.json layout into the text file output, one
+    account at a time, without building the whole document in memory.
+    @param indent as json.dump(), None for a compact output
+    @param sort_keys if True, the accounts, their properties and their days
+     are sorted, for deterministic diffs.
+    """
+    separators = (',', ': ') if indent is not None else (',', ':')
+    new_line = '\n' + ' ' * indent if indent is not None else ''
+    account_ids = sorted(accounts) if sort_keys else accounts
+    output.write('{')
+    for index, account_id in enumerate(account_ids):
+        if index > 0:
+            output.write(separators[0])
+        output.write(new_line)
+        output.write(json.dumps(account_id) + separators[1])
+        account_json = json.dumps(accounts[account_id].to_json(), indent=indent,
+                                  separators=separators, sort_keys=sort_keys)
+        output.write(account_json.replace('\n', new_line) if indent is not None else account_json)
+    if accounts and indent is not None:
+        output.write('\n')
+    output.write('}')
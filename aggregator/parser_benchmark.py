@@ -0,0 +1,183 @@
+import collections
+import json
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+
+try:
+    import aggregate
+    import discovery
+    import parsers
+    from utils import write_atomically
+except ImportError:
+    from . import aggregate
+    from . import discovery
+    from . import parsers
+    from .utils import write_atomically
+
+# values of the bank extracts that must be identical with all the parsers
+extract_keys = ['account', 'balance', 'operation', 'date', 'transactions']
+
+def get_parser_names():
+    """ Return the names of the parsers of parsers.py, e.g. ['miner_aggregate', 'pdfplumber', ...]"""
+    prefix = 'file_to_pdf_'
+    return sorted(name[len(prefix):] for name in dir(parsers) if name.startswith(prefix))
+
+def sample_files(file_paths, confs, sample=5, verbose=0):
+    """
+    Return {conf id: [file paths]}, at most sample files per conf, of the
+    files matched by the confs with their current parser.
+    @param confs list of (conf id, conf), see aggregate.get_confs()
+    """
+    samples = collections.defaultdict(list)
+    for file_path in file_paths:
+        remaining_confs = [(conf_id, conf) for conf_id, conf in confs if len(samples[conf_id]) < sample]
+        if not remaining_confs:
+            break
+        matched_conf_ids = []
+        try:
+            aggregate.match_confs(file_path, remaining_confs, verbose, matched_conf_ids=matched_conf_ids)
+        except Exception as e:
+            print(file_path, e, file=sys.stderr)
+        for conf_id in matched_conf_ids:
+            samples[conf_id].append(file_path)
+    return {conf_id: file_paths for conf_id, file_paths in samples.items() if file_paths}
+
+def get_extract_values(bank_extract, conf):
+    """ Return the extract_keys values of the bank extract parsed with conf"""
+    data = aggregate.parse_bank_extract(bank_extract, conf)
+    if 'transactions' in data:
+        data['transactions'] = list(data['transactions'])
+    return {key: data[key] for key in extract_keys if key in data}
+
+def extract(file_path, parser_name):
+    """
+    Return the text of the file extracted by the parser, the duration in
+    seconds and the peak of memory allocated by python in bytes.
+    The text cache is not used, to time the parser.
+    """
+    tracemalloc.start()
+    try:
+        start = time.perf_counter()
+        text = aggregate.extract_text(file_path, parser_name)
+        duration = time.perf_counter() - start
+        memory = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return text, duration, memory
+
+def benchmark_conf(conf, file_paths, parser_names, verbose=0):
+    """
+    Extract the files with each parser and compare the values parsed with
+    conf to the ones of the current parser of conf.
+    @return {parser name: {'documents', 'identical', 'errors', 'time', 'memory'}}
+    with the mean time and the max memory per document
+    """
+    results = {parser_name: {'documents': 0, 'identical': 0, 'errors': 0, 'times': [], 'memory': 0}
+               for parser_name in parser_names}
+    for file_path in file_paths:
+        reference = get_extract_values(aggregate.parse_pdf(file_path, aggregate.get_parser_name(conf)), conf)
+        for parser_name in parser_names:
+            result = results[parser_name]
+            result['documents'] += 1
+            try:
+                text, duration, memory = extract(file_path, parser_name)
+                result['times'].append(duration)
+                result['memory'] = max(result['memory'], memory)
+                if (aggregate.is_valid_conf(conf, file_path, verbose, parse=lambda *args: text)
+                        and get_extract_values(text, conf) == reference):
+                    result['identical'] += 1
+            except Exception as e:
+                if verbose > 0:
+                    print(file_path, parser_name, e, file=sys.stderr)
+                result['errors'] += 1
+    for result in results.values():
+        times = result.pop('times')
+        result['time'] = statistics.mean(times) if times else None
+    return results
+
+def get_preference(results):
+    """
+    Return the parsers that yield identical values for all the documents,
+    the fastest first.
+    """
+    return sorted((parser_name for parser_name, result in results.items()
+                   if result['documents'] and result['identical'] == result['documents']),
+                  key=lambda parser_name: results[parser_name]['time'])
+
+def benchmark_parsers(file_paths, confs_path="./confs", parser_names=None, sample=5, verbose=0):
+    """
+    Benchmark the parsers on a sample of the documents of each conf.
+    @return {conf id: {'documents': [file paths], 'parsers': preference,
+     'results': see benchmark_conf()}}
+    """
+    confs = aggregate.get_confs(confs_path)
+    parser_names = parser_names or get_parser_names()
+    report = {}
+    for conf_id, conf_file_paths in sample_files(file_paths, confs, sample, verbose).items():
+        results = benchmark_conf(dict(confs)[conf_id], conf_file_paths, parser_names, verbose)
+        report[conf_id] = {'documents': [str(file_path) for file_path in conf_file_paths],
+                           'parsers': get_preference(results),
+                           'results': results}
+        if verbose > 0:
+            print(conf_id, report[conf_id]['parsers'])
+    return report
+
+def update_confs(confs_path, report):
+    """
+    Write the parser preference of each conf of the report into its conf file
+    as "parsers", used by aggregate.find_parser(). Confs without parser
+    yielding identical values are left unchanged.
+    """
+    conf_ids = collections.defaultdict(dict)
+    for conf_id, conf_report in report.items():
+        if conf_report['parsers']:
+            file_name, conf_name = conf_id.split('#', 1)
+            conf_ids[os.path.join(confs_path, file_name)][conf_name] = conf_report['parsers']
+    for conf_file_path, preferences in conf_ids.items():
+        with open(conf_file_path, encoding='utf-8') as conf_file:
+            file_confs = json.load(conf_file, object_pairs_hook=collections.OrderedDict)
+        for conf_name, parser_names in preferences.items():
+            file_confs[conf_name]['parsers'] = parser_names
+        write_atomically(conf_file_path, json.dumps(file_confs, indent=2, ensure_ascii=False) + '\n')
+    return sorted(conf_ids)
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark the pdf parsers on a sample of the documents of each conf"
+                                     " and choose the parsers to use with each conf")
+    parser.add_argument("input", help="folder (or archive) of sample documents")
+    parser.add_argument("-c", "--confs", help="folder to find conf files",
+                        default=os.path.join(os.path.dirname(os.path.realpath(__file__)), "..", "confs"))
+    parser.add_argument("-v", "--verbose", action="count", default=0)
+    parser.add_argument("--parser", action='append', dest='parsers', choices=get_parser_names(),
+                        help="parser to benchmark, all the parsers by default")
+    parser.add_argument("--sample", type=int, default=5,
+                        help="maximum number of documents per conf")
+    parser.add_argument("--update-confs", action="store_true",
+                        help='write the parsers to use with each conf into the conf files as "parsers"')
+    parser.add_argument("-o", "--output", default="parser_benchmark.json",
+                        help="results json file")
+    args = parser.parse_args()
+
+    file_paths = discovery.unique_files(discovery.iter_files(args.input))
+    report = benchmark_parsers(file_paths, args.confs, args.parsers, args.sample, args.verbose)
+    with open(args.output, 'w', encoding='utf-8') as results_file:
+        json.dump(report, results_file, indent=2)
+    for conf_id, conf_report in report.items():
+        print(conf_id, len(conf_report['documents']), 'documents')
+        for parser_name, result in conf_report['results'].items():
+            print('  {:16} {:3}/{:<3} identical {:3} errors {} {:10.1f}KB'.format(
+                parser_name, result['identical'], result['documents'], result['errors'],
+                '{:8.4f}s'.format(result['time']) if result['time'] is not None else '       -',
+                result['memory'] / 1024))
+        print('  parsers:', conf_report['parsers'] or '-')
+    if args.update_confs:
+        for conf_file_path in update_confs(args.confs, report):
+            print('updated', conf_file_path)
+
+if __name__ == "__main__":
+    sys.exit(main())
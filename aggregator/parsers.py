@@ -3,11 +3,21 @@ import itertools
 import sys
 
 def file_to_pdf(file_path, parser_name):
+    """
+    @param file_path path or binary file object of the pdf
+    """
     return getattr(sys.modules[__name__], "file_to_pdf_%s" % parser_name)(file_path)
 
+def open_pdf(file_path):
+    """ Return a binary file object, file_path if it is already a file object"""
+    return file_path if hasattr(file_path, 'read') else open(file_path, 'rb')
+
 def file_to_pdf_tika(file_path):
     import tika.parser
-    pdf = tika.parser.from_file(file_path)
+    if hasattr(file_path, 'read'):
+        pdf = tika.parser.from_buffer(file_path.read())
+    else:
+        pdf = tika.parser.from_file(file_path)
     pdf_contents = pdf['content']
     return pdf_contents
 
@@ -21,7 +31,7 @@ def file_to_pdf_miner_text(file_path):
     from pdfminer.converter import PDFPageAggregator
     from pdfminer.layout import LTPage, LTChar, LTAnno, LAParams, LTTextBox, LTTextLine
 
-    fp = open(file_path, 'rb')
+    fp = open_pdf(file_path)
     rsrcmgr = PDFResourceManager()
     retstr = io.StringIO()
     codec = 'utf-8'
@@ -81,7 +91,7 @@ def file_to_pdf_miner_aggregate(file_path, merge = True):
             self.result = ltpage
 
 
-    fp = open(file_path, 'rb')
+    fp = open_pdf(file_path)
     rsrcmgr = PDFResourceManager()
     laparams = LAParams()
     device = PDFPageDetailedAggregator(rsrcmgr,
@@ -0,0 +1,119 @@
+import asyncio
+import concurrent.futures
+import os
+import sys
+
+try:
+    import aggregate
+    import discovery
+    import model
+except ImportError:
+    from . import aggregate
+    from . import discovery
+    from . import model
+
+# put in a queue to tell its consumers that no more items will come
+end_of_queue = None
+
+
+async def discover(file_paths, paths_queue, consumers):
+    """
+    Discovery stage: iterate file_paths (listing folders, reading archives,
+    hashing files) in a thread and queue the file paths.
+    """
+    loop = asyncio.get_running_loop()
+    iterator = iter(file_paths)
+    try:
+        while True:
+            file_path = await loop.run_in_executor(None, next, iterator, end_of_queue)
+            if file_path is end_of_queue:
+                break
+            await paths_queue.put(file_path)
+    finally:
+        for _ in range(consumers):
+            await paths_queue.put(end_of_queue)
+
+async def extract(executor, paths_queue, results_queue, confs_path, verbose):
+    """
+    Extraction stage: text extraction, conf matching and parsing of the
+    queued files in the process pool, one file at a time.
+    """
+    loop = asyncio.get_running_loop()
+    while True:
+        file_path = await paths_queue.get()
+        if file_path is end_of_queue:
+            await results_queue.put(end_of_queue)
+            return
+        try:
+            pdf_accounts, matched_conf_ids = await loop.run_in_executor(
+                executor, aggregate.aggregate_pdf_isolated, file_path, confs_path, verbose)
+            result = (file_path, pdf_accounts, matched_conf_ids, None)
+        except Exception as e:
+            result = (file_path, None, None, e)
+        await results_queue.put(result)
+
+async def aggregate_stream(file_paths, confs_path="./confs", verbose=0,
+                           processes=None, queue_size=None):
+    """
+    Aggregate the files of file_paths in a staged pipeline: discovery runs in
+    a thread while the files are extracted and parsed in a pool of
+    processes. Stages are connected by bounded queues: discovery waits when
+    the workers are late, so that it never runs far ahead.
+    @param processes number of worker processes, os.cpu_count() if None
+    @param queue_size maximum number of pending files and results,
+     2 * processes if None
+    @return an async iterator of (file_path, accounts, ids of the matching
+     confs, exception) in completion order. exception is None on success,
+     accounts and conf ids are None on failure.
+    """
+    processes = processes or os.cpu_count()
+    queue_size = queue_size or 2 * processes
+    paths_queue = asyncio.Queue(queue_size)
+    results_queue = asyncio.Queue(queue_size)
+    with concurrent.futures.ProcessPoolExecutor(processes) as executor:
+        tasks = [asyncio.create_task(discover(file_paths, paths_queue, processes))]
+        tasks += [asyncio.create_task(extract(executor, paths_queue, results_queue, confs_path, verbose))
+                  for _ in range(processes)]
+        try:
+            running = processes
+            while running:
+                result = await results_queue.get()
+                if result is end_of_queue:
+                    running -= 1
+                else:
+                    yield result
+            # raise the discovery errors, if any
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+
+async def aggregate_pdfs_pipeline(folder_path, confs_path="./confs", verbose=0,
+                                  duplicates=None, include=[], exclude=[], processes=None,
+                                  journal=None):
+    """
+    aggregate_pdfs() with the staged pipeline of aggregate_stream().
+    The results are merged as they come by this single task.
+    @param journal see aggregate_pdfs()
+    """
+    accounts = {}
+    file_paths = discovery.unique_files(
+        discovery.iter_files(folder_path, include=include, exclude=exclude), duplicates)
+    if journal is not None:
+        journal.track_confs(confs_path)
+        # iterated in the discovery thread, that records the unaffected
+        # documents while this task records the aggregated ones: Journal.record()
+        # is thread-safe
+        file_paths = journal.unfinished(file_paths)
+    async for file_path, pdf_accounts, matched_conf_ids, error in aggregate_stream(
+            file_paths, confs_path, verbose, processes):
+        if error is not None:
+            print(file_path, error, file=sys.stderr)
+            if journal is None:
+                raise error
+            journal.record(file_path, error=error)
+            continue
+        if journal is not None:
+            journal.record(file_path, pdf_accounts, matched_conf_ids=matched_conf_ids)
+        model.update_accounts(accounts, pdf_accounts)
+    return journal.accounts() if journal is not None else accounts
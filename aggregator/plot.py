@@ -1,329 +1,93 @@
-import calendar
-import collections
 import datetime
-import dateutil.parser
-import json
-import functools
 import matplotlib as mpl
 import matplotlib.cm as cm
 import matplotlib.dates as mdates
 import matplotlib.pyplot as plt
 import matplotlib.ticker as ticker
-import mplcursors
 import numpy
-import pathlib
-# Use SortedDict (instead of OrderedDict) to bisect
-from sortedcontainers import SortedDict
-from scipy import interpolate
 
 try:
-    from utils import memoize_with_id, memoize_with_ids, cprofile, memoize_2
-except:
-    from .utils import memoize_with_id, memoize_with_ids, cprofile, memoize_2
-
-def fromJSON(accounts_file):
-    def replace_keys(accounts):
-        new_accounts = { }
-        for key in accounts.keys():
-            date = None
-            try:
-                date = dateutil.parser.parse(key)
-            except Exception:
-                pass
-            if isinstance(date, datetime.date):
-                new_accounts[date] = accounts[key]
-            elif isinstance(accounts[key], dict):
-                new_accounts[key] = replace_keys(accounts[key])
-            else:
-                new_accounts[key] = accounts[key]
-        return new_accounts
-
-    try:
-        accountsJSON = json.load(accounts_file)
-    except Exception as e:
-        print('while loading', accounts_file)
-        raise e
-    accounts = replace_keys(accountsJSON)
-    return accounts
-
-
-def readAccounts(accounts_path):
-    """
-    @return a dictionary where keys are account names
-    """
-    with open(accounts_path, encoding='utf-8') as accounts_file:
-        accounts = fromJSON(accounts_file)
-    return accounts
-
-all_account_types={
-    'checking': {
-        'account': {
-            'color': 'royalblue'
-        }
-    }, 'saving': {
-        'account': {
-            'color': 'tomato'
-        }
-    }, 'life-insurance': {
-        'account': {
-            'color': 'olivedrab'
-        }
-    }, 'loan': {
-        'account': {
-            'color': 'gold'
-        }
-    }, 'real-estate': {
-        'account': {
-            'color': 'sandybrown'
-        }
-    }, 'crowd-funding': {
-         'account': {
-            'color': 'green',
-            'input': 'operations'
-        }
-    }, 'other': {
-        'account': {
-            'color': 'silver'
-        }
-    }
-}
-
-def get_account_properties(accounts, account_id):
-    """ Return the account-type property of an account referenced by its id
-    Supports account redirection.
-    """
-    account = accounts.get(account_id, {}).get('account', None)
-    if not isinstance(account, dict):
-        account = accounts.get(account, {})
-    if account:
-        default_account = all_account_types.get(account.get('account-type'),{}).get('account', {})
-        account = {**default_account, **account}
-    return account
-
-def toTimestamp(day):
-    return calendar.timegm(day.timetuple())
-
-@memoize_with_id
-def toTimestamps(days):
-    return [toTimestamp(d) for d in days]
-
-
-def get_balance_exact(sorted_balances, day):
-    if sorted_balances.keys()[0] > day:
-        return 0
-    index = sorted_balances.bisect(day)
-    # last value if day is after last account entry
-    index -= 1
-    key = sorted_balances.iloc[index]
-    return sorted_balances[key]
-
-@memoize_2
-def get_balance(sorted_balances, day):
-    """
-    Return the balance for a given day. Existing or not.
-    Balance is Hermite interpolated.
-    :return The balance. 0 if there is no sorted balances
-    :rtype float
-    """
-    #print('get_balance', sorted_balances, day)
-    days = toTimestamps(sorted_balances.keys())
-    if len(days) == 0:
-        return 0
-
-    # 1: Hermite interpolation:
-    if len(days) > 3 and toTimestamp(day) >= days[0] and toTimestamp(day) <= days[-1]:
-        f = interpolate.PchipInterpolator(days, sorted_balances.values())
-        return f(toTimestamp(day))
-
-    if len(days) != len(sorted_balances.values()):
-        days = toTimestamps(sorted_balances.keys())
-    # 2: linear interpolation:
-    return numpy.interp(toTimestamp(day), days, sorted_balances.values(), 0)
-
-    # if sorted_balances.keys()[0] > day:
-    #     return 0
-    # index = sorted_balances.bisect(day)
-    # # last value if day is after last account entry
-    # index -= 1
-    # key = sorted_balances.iloc[index]
-    # return sorted_balances[key]
-
-def get_yearly_balance(sorted_balances, day):
-    first_day_of_the_year = day.replace(month=1, day=1)
-    balance_first_day_of_the_year = get_balance(sorted_balances, first_day_of_the_year)
-    return get_balance(sorted_balances, day) - balance_first_day_of_the_year
-
-def get_account_balance(accounts, account_id, day, *args, **kwargs):
-    """ Return the balance of an account for a given day."""
-    #print('get_account_balance', account_id)
-    sorted_balances = get_account_balances(accounts, account_id, *args, **kwargs)
-    balance_at_day = get_balance(sorted_balances, day)
-    return balance_at_day
-
-@memoize_2
-def get_account_balances(accounts, account_id, yearly=False, currency=None):
-    """
-    Returns all the balances of the account.
-    Takes into account the `share` account property.
-
-    @param yearly if True, balance is reset on January firsts
-    @param currency if not None, conversion is applied
-    @return a SortedDict of balances, None if no balance exist
-    """
-    balances = accounts[account_id].get('balances', None)
-    share = get_account_properties(accounts, account_id).get('share', 1)
-    if not balances:
-        sorted_balance = SortedDict()
-    else:
-        sorted_balance = SortedDict((date, value * share) for date, value in balances.items())
-    #no_change = get_account_properties(accounts, account_id).get('no_change', False)
-    input = get_account_properties(accounts, account_id).get('input', 'balances')
-    if input == 'operations' or not balances:
-        operations = accounts[account_id].get('operations', None)
-        if operations:
-            sorted_operations = SortedDict((date, value * share) for date, value in operations.items())
-            operation_first_day = sorted_operations.keys()[0]
-        else:
-            sorted_operations = SortedDict()
-            operation_first_day = datetime.datetime.max
-        # operation first day is optional, use balance in that case
-        if sorted_balance:
-            balance_first_day = sorted_balance.keys()[0]
-            if balance_first_day < operation_first_day:
-                sorted_operations[balance_first_day] = sorted_balance[balance_first_day]
-            sorted_balance.clear()
-        dates = sorted_operations.keys()
-        for i, date in enumerate(dates):
-            sorted_balance[date] = sorted_operations[date] + sorted_balance.get(dates[i - 1], 0)
-        #for day, balance in sorted_balance.items():
-        #    sorted_balance[day] = first_balance
-    if yearly:
-        sorted_yearly_balances = SortedDict()
-        for day in sorted_balance.keys():
-            first_day_of_the_year = day.replace(month=1, day=1)
-            last_day_of_previous_year = first_day_of_the_year - datetime.timedelta(days = 1 )
-            yearly_balance_last_day_of_the_year = get_yearly_balance(sorted_balance, last_day_of_previous_year)
-            if yearly_balance_last_day_of_the_year != 0:
-                sorted_yearly_balances[last_day_of_previous_year] = yearly_balance_last_day_of_the_year
-                sorted_yearly_balances[first_day_of_the_year] = 0
-            sorted_yearly_balances[day] = get_yearly_balance(sorted_balance, day)
-        sorted_balance = sorted_yearly_balances
-    #print(account_id, input, sorted_balance)
-
-    return sorted_balance
-
-def get_accounts_balances(accounts, account_ids, *args, **kwargs):
+    import compute
+    import plot_cache
+    import rollup
+    from interactive import setup_picking
+    from compute import (fromJSON, readAccounts, all_account_types,
+                         get_account_properties, toTimestamp, toTimestamps,
+                         get_balance_exact, get_balance, get_yearly_balance,
+                         get_account_balance, get_account_balances,
+                         get_accounts_balances, filter_account, filter_accounts,
+                         group_accounts, add_accounts_arguments,
+                         read_accounts_files, read_accounts_options,
+                         set_account_input_types)
+except ImportError:
+    from . import compute
+    from . import plot_cache
+    from . import rollup
+    from .interactive import setup_picking
+    from .compute import (fromJSON, readAccounts, all_account_types,
+                          get_account_properties, toTimestamp, toTimestamps,
+                          get_balance_exact, get_balance, get_yearly_balance,
+                          get_account_balance, get_account_balances,
+                          get_accounts_balances, filter_account, filter_accounts,
+                          group_accounts, add_accounts_arguments,
+                          read_accounts_files, read_accounts_options,
+                          set_account_input_types)
+
+def make_curve(kind, days, values, style=None, legend=None):
     """
-    Get balances of multiple accounts at once.
-    Returned values are not "sum" of all accounts but lists of each account balance
+    Return a curve to draw with draw_curve(): the name of the pyplot function
+    (plot, step, bar, stackplot, scatter, axvline or text), the days as
+    matplotlib date numbers, the values and the keyword arguments of the
+    function.
+    @param legend if not None, label of the curve in the legend of the figure
     """
-    sorted_dates = SortedDict()
-    # First get only the dates
-    for account_id in account_ids:
-        sorted_balances = get_account_balances(accounts, account_id, *args, **kwargs)
-        if sorted_balances is None:
-            continue
-        sorted_dates.update(dict.fromkeys(sorted_balances.keys(), 0))
-
-    # For each date, compute the balance for each accounts
-    for day in sorted_dates:
-        balances = []
-        for account_id in account_ids:
-            balance = get_account_balance(accounts, account_id, day, *args, **kwargs)
-            balances.append(balance)
-        sorted_dates[day] = balances
-    return sorted_dates
-
-def filter_account(account, account_filters = []):
-    """
-    :param account_filters: a list of dictionaries, each containing the filter to apply.
-     Each dictionary should have the following structure:
-        {
-            'condition': bool,
-            'key': str,
-            'value': any
-        }
-    :type account_filters: list of dict
-    :return True if account matches at least one filter
-    :rtype bool
-    :example
-        # Returns True only if the account is a checking account not in USD:
-        filter_account(account, [{'condition': True, 'key': 'account-type', 'value': 'checking'}, {'condition': False, 'key': 'currency', 'value': '$'}, ])
-        # Returns True if account is not in USD or if a checking account:
-        filter_account(account, [{'condition': False, 'key': 'currency', 'value': '$'}, {'condition': True, 'key': 'account-type', 'value': 'checking'}])
-        # Returns False if account is not in USD or if it is a checking account, True otherwise:
-        filter_account(account, [{'condition': False, 'key': 'currency', 'value': '$'}, {'condition': False, 'key': 'account-type', 'value': 'checking'}])
-    """
-    reject = False
-    for account_filter in account_filters:
-        if account_filter['condition']:
-            if account.get(account_filter['key']) != account_filter['value']:
-                return False
-            else:
-                reject = False
-        else:
-            if account.get(account_filter['key']) == account_filter['value']:
-                reject = True
-    return not reject
-
-def filter_accounts(accounts, account_filters = []):
-    """
-    :return a new dictionary with accounts belonging to account_types
-    :rtype dict
-    """
-    return {account_id:account for (account_id,account) in accounts.items()
-            if filter_account(get_account_properties(accounts, account_id), account_filters)}
+    return {'kind': kind,
+            'x': numpy.asarray(mdates.date2num(list(days)), dtype=float),
+            'y': numpy.asarray(values, dtype=float),
+            'style': style or {},
+            'legend': legend}
+
+def draw_curve(curve, *args, **kwargs):
+    """ Draw the curve (see make_curve()) in the current axes and return the result of the pyplot function"""
+    plt.gca().xaxis_date()
+    style = {**curve['style'], **kwargs}
+    if curve['kind'] == 'axvline':
+        return plt.axvline(curve['x'][0], *args, **style)
+    if curve['kind'] == 'text':
+        return plt.text(curve['x'][0], curve['y'][0], *args, **style)
+    return getattr(plt, curve['kind'])(curve['x'], curve['y'], *args, **style)
+
+def draw_curves(curves, *args, **kwargs):
+    """ Draw the curves and return the result of the last one"""
+    plot = None
+    for curve in curves:
+        plot = draw_curve(curve, *args, **kwargs)
+    return plot
 
-def group_accounts(accounts, account_types=all_account_types.keys()):
-    """
-    Group accounts per category type.
-    TODO: key=account_type, value=list of account ids
-    {
-      'checking': {
-        'BNP-foo': {},
-        'BPLC-bar': {},
-      },
-      'saving': {
-        'LivretA': {},
-        'PEL': {},
-      },
-    }
-    @return an ordered dict of input accounts grouped by account type.
+def get_balances_curves(days, balances, end_day=None, interpolation='hermite', smooth=False):
     """
-    grouped_accounts = collections.OrderedDict()
-    for account_type in [*account_types, 'other']:
-        for account_id in accounts.keys():
-            act = get_account_properties(accounts, account_id).get('account-type')
-            if act == account_type or (account_type == 'other' and
-               act not in account_types):
-                grouped_accounts.setdefault(account_type, {})[account_id] = accounts[account_id]
-    return grouped_accounts
-
-def plot_balances(days, balances, end_day=None, interpolation='hermite', smooth=False, *args, **kwargs):
+    Return the curves plot_balances() draws: markers for sparse balances and
+    the interpolated balances.
     """
-    @param end_day if not None, a day is added at the end with the same balance of the last day
-    @param interpolation Specify how to draw between points: 'post', 'pre', 'mid', 'hermite' or 'linear'
-    @param smooth if True, apply 365 day smoothing window on balances. w
-    """
-    plotter = plt.plot
-
+    curves = []
     first_day = days[0]
     last_day = days[-1]
     day_range = (last_day-first_day).days
     # draw markers
     if (len(days) < 4 or len(days) < 3 * day_range / 365):  # no more than semestrial balances
-        markersArgs = {'linestyle':'None', 'marker': 'o', 'alpha': 0.5} | kwargs
-        plotter(days, balances, *args, **markersArgs)
+        curves.append(make_curve('plot', days, balances, {'linestyle':'None', 'marker': 'o', 'alpha': 0.5}))
 
-    if end_day is not None and last_day != end_day:
+    if end_day is not None and last_day < end_day:
         days = days + tuple([end_day])
         balances = balances + tuple([balances[-1]])
         last_day = days[-1]
 
+    kind = 'plot'
+    style = {}
     if interpolation in ['post', 'pre', 'mid']:
         # Could also use interpolate.interp1d
-        plotter = plt.step
-        kwargs['where'] = interpolation
+        kind = 'step'
+        style['where'] = interpolation
     elif interpolation == 'hermite' and len(days) > 3:
         plot_range = [first_day + datetime.timedelta(days=d) for d in range(0, (last_day-first_day).days)]
         # 1: linear:
@@ -335,6 +99,7 @@ def plot_balances(days, balances, end_day=None, interpolation='hermite', smooth=
         # x = plot_range
         # y = interpolate.splev(toTimestamps(plot_range), spl)
         # 3: Hermite interpolation
+        from scipy import interpolate
         balances = interpolate.pchip_interpolate(toTimestamps(days), balances, toTimestamps(plot_range))
         days = plot_range
 
@@ -346,24 +111,43 @@ def plot_balances(days, balances, end_day=None, interpolation='hermite', smooth=
             # w=numpy.blackman(window_len)
             balances = numpy.convolve(balances, w/w.sum(), mode='same')
 
-    return plotter(days, balances, *args, **kwargs)
+    curves.append(make_curve(kind, days, balances, style))
+    return curves
+
+def plot_balances(days, balances, end_day=None, interpolation='hermite', smooth=False, *args, **kwargs):
+    """
+    @param end_day if not None, a day is added at the end with the same balance of the last day
+    @param interpolation Specify how to draw between points: 'post', 'pre', 'mid', 'hermite' or 'linear'
+    @param smooth if True, apply 365 day smoothing window on balances. w
+    """
+    return draw_curves(get_balances_curves(days, balances, end_day, interpolation, smooth), *args, **kwargs)
 
 def offset_day(day, index, count):
     number_of_days_per_year = day.replace(month=12, day=1) - day.replace(month=1, day=1)
     width = number_of_days_per_year / count
     return day + width * (index + 0.5)
 
-def plot_balances_yearly(days, balances, index, count, *args, **kwargs):
+def get_balances_yearly_curve(days, balances, index, count):
     width = 366 / count
-    return plt.bar([offset_day(d, index, count) for d in days], balances, round(width), *args, **kwargs)
+    return make_curve('bar', [offset_day(d, index, count) for d in days], balances, {'width': round(width)})
+
+def plot_balances_yearly(days, balances, index, count, *args, **kwargs):
+    return draw_curve(get_balances_yearly_curve(days, balances, index, count), *args, **kwargs)
 
-def plot_account(accounts, account_id, *args, **kwargs):
-    sorted_balances = get_account_balances(accounts, account_id)
+def plot_account(accounts, account_id, *args, start=None, end=None, **kwargs):
+    """
+    @param start, end if not None, only the balances within [start, end] are plotted
+    """
+    sorted_balances = get_account_balances(accounts, account_id, start=start, end=end)
     return plot_sorted_balances(sorted_balances, *args, **kwargs)
 
-def plot_sorted_balances(sorted_balances, yearly=False, balance_operator=None, *args, **kwargs):
+def get_sorted_balances_curves(sorted_balances, yearly=False, balance_operator=None, index=0, count=1, **kwargs):
+    """
+    Return the curves plot_sorted_balances() draws, none if there is no balance
+    @param kwargs see get_balances_curves()
+    """
     if sorted_balances is None or len(sorted_balances) == 0:
-        return None
+        return []
     if balance_operator:
         for day in sorted_balances.keys():
             sorted_balances[day] = balance_operator(sorted_balances[day])
@@ -378,134 +162,71 @@ def plot_sorted_balances(sorted_balances, yearly=False, balance_operator=None, *
         balances = [get_balance_exact(sorted_balances, year_last_day) for year_last_day in periods_last_days]
         if yearly == "relative":
             balances = [balance - (balances[i - 1] if i else 0) for i, balance in enumerate(balances)]
-        plot = plot_balances_yearly(periods_first_days, balances, *args, **kwargs)
-    else:
-        days, balances = zip(*sorted_balances.items())
-        plot = plot_balances(days, balances, *args, **kwargs)
+        return [get_balances_yearly_curve(periods_first_days, balances, index, count)]
+    days, balances = zip(*sorted_balances.items())
+    return get_balances_curves(days, balances, **kwargs)
 
-    return plot
+# arguments of plot_sorted_balances() used to compute the curves, the others are drawing arguments
+curve_arguments = ['index', 'count', 'end_day', 'interpolation', 'smooth']
 
-legend_elements = dict()
-def setup_picking(fig, legend, plots):
-    for legend_line, original_line in zip(legend.get_lines(), plots):
-        legend_line.set_picker(5)  # 5 pts tolerance
-        legend_elements[legend_line] = original_line
-    for legend_patch, plot in zip(legend.get_patches(), plots):
-        legend_patch.set_picker(5)  # 5 pts tolerance
-        legend_elements[legend_patch] = plot
-
-    def onpick(event):
-        # on the pick event, find the orig line corresponding to the
-        # legend proxy line, and toggle the visibility
-        legend_element = event.artist
-        picked_plot = legend_elements[legend_element]
-        picked_plots = picked_plot.get_children() if type(picked_plot) == mpl.container.BarContainer else [picked_plot]
-        artist_properties = {
-            mpl.lines.Line2D: [{
-                'plot': {
-                    'linewidth': 1,  # line_width ?
-                    'visible': True,
-                    'zorder': 2
-                },
-                'legend': {
-                    'linewidth': 1,  # line_width ?
-                    'alpha': None
-                }
-            },
-            {
-                'plot': {
-                    'linewidth': 4,  # line_width ?
-                    'visible': True,
-                    'zorder': 200
-                },
-                'legend': {
-                    'linewidth': 4,  # line_width ?
-                    'alpha': None
-                }
-            },
-            {
-                'plot': {
-                    'linewidth': 1,  # line_width ?
-                    'visible': False,
-                    'zorder': 2
-                },
-                'legend': {
-                    'linewidth': 1,  # line_width ?
-                    'alpha': 0.2
-                }
-            }],
-            mpl.container.BarContainer: [{
-                'plot': {
-                    'alpha': 1,
-                    'visible': True
-                },
-                'legend': {
-                    'alpha': None
-                }
-            },
-            {
-                'plot': {
-                    'alpha': 0.4,
-                    'visible': True
-                },
-                'legend': {
-                    'alpha': 0.3
-                }
-            },
-            {
-                'plot': {
-                    'alpha': 1,
-                    'visible': False,
-                },
-                'legend': {
-                    'alpha': 0.15
-                }
-            }]
-        }
-        artist_property = artist_properties[type(picked_plot)]
-        level = 0
-        for l in artist_property:
-            is_level = True
-            for prop, value in l['legend'].items():
-                is_level = is_level and getattr(legend_element, 'get_' + prop)() == value
-            if is_level:
-                break
-            level += 1
-        next_level = (level + 1) % 3
-        for prop, value in artist_property[next_level]['plot'].items():
-            for p in picked_plots:
-                getattr(p, 'set_' + prop)(value)
-        for prop, value in artist_property[next_level]['legend'].items():
-            getattr(legend_element, 'set_' + prop)(value)
-
-        # Change the alpha on the line in the legend so we can see what lines
-        # have been toggled
-        fig.canvas.draw()
-
-    fig.canvas.mpl_connect('pick_event', onpick)
+def plot_sorted_balances(sorted_balances, yearly=False, balance_operator=None, *args, **kwargs):
+    curve_kwargs = {key: kwargs.pop(key) for key in curve_arguments if key in kwargs}
+    curves = get_sorted_balances_curves(sorted_balances, yearly, balance_operator, **curve_kwargs)
+    if not curves:
+        return None
+    return draw_curves(curves, *args, **kwargs)
 
-def plot_accounts_yearly(accounts,
-                         account_filters=[],
-                         log_scale=False,
-                         yearly="absolute",
-                         total=False,
-                         subtotals=False,
-                         account_input_types={}, #no_real_estate_appreciation=False,
-                         start=None, end=None):
+def get_rollups_curve(rollups, yearly, index, count, start=None, end=None):
+    """ Return the curve plot_rollups() draws, None if there is no balance"""
+    days, balances = rollup.get_rollup_series(rollups, 'yearly', 'delta' if yearly == 'relative' else 'balance',
+                                              start, end)
+    if not days:
+        return None
+    return get_balances_yearly_curve(days, balances, index, count)
+
+def plot_rollups(rollups, yearly, index, count, *args, start=None, end=None, **kwargs):
     """
-    :param account_filters: a list of dictionaries, each containing the filter to apply. See filter_account for more details.
-    :type account_filters: list of dict
+    Plot the yearly balances (or balance deltas if yearly is "relative") of
+    precomputed rollups (see rollup.rollup_account()).
+    """
+    curve = get_rollups_curve(rollups, yearly, index, count, start, end)
+    if curve is None:
+        return None
+    return draw_curve(curve, *args, **kwargs)
+
+def get_total_message(total, day):
+    """ Return the message of the total on day, in the currency the balances are converted into"""
+    currency = compute.target_currency if compute.target_currency is not None else '€'
+    return 'Total of {:.2f}{} on {}'.format(total, currency, day)
+
+def with_style(curves, legend=None, **style):
+    """ Add style to the curves, and the legend to the last one"""
+    for curve in curves:
+        curve['style'].update(style)
+    if curves and legend is not None:
+        curves[-1]['legend'] = legend
+    return curves
+
+def get_accounts_yearly_figure(accounts,
+                               account_filters=[],
+                               yearly="absolute",
+                               total=False,
+                               subtotals=False,
+                               account_input_types={},
+                               start=None, end=None, rollups=None):
+    """
+    Return the figure plot_accounts_yearly() renders, see render_figure()
     """
     not_ignored_accounts = filter_accounts(accounts, account_filters)
     not_ignored_accounts_count = len(not_ignored_accounts)
     grouped_accounts = group_accounts(not_ignored_accounts)
 
-    for account_type, input in account_input_types.items():
-        if input:
-            all_account_types[account_type]['account']['input'] = input
-    plots = []
-    labels = []
-    fig = plt.figure()
+    set_account_input_types(account_input_types)
+    # Yearly balances are read at the end of each year and of the previous year
+    compute_start = start.replace(year=start.year - 1, month=1, day=1) if start is not None else None
+    compute_end = end.replace(month=12, day=31) if end is not None else None
+    curves = []
+    messages = []
     type_index = 0
     account_index = 0
 
@@ -515,73 +236,88 @@ def plot_accounts_yearly(accounts,
 
     for account_type in grouped_accounts.keys():
         if subtotals:
-            group_balances = get_accounts_balances(accounts, grouped_accounts[account_type])
-            #days, balances = zip(*group_balances.items())
             c = get_account_properties(all_account_types, account_type).get('color', 'lightgrey')
             #input = get_account_properties(all_account_types, account_type).get('input')
-            plot = plot_sorted_balances(group_balances,
-                                    yearly=yearly,
-                                    balance_operator=sum,
-                                    index=account_index,
-                                    count=plot_count,
-                                    color=c,
-                                    label=account_type)
-            if plot:
-                plots += plot
-                labels += [account_type]
+            if rollups is not None:
+                group_rollups = rollup.get_group_rollups(accounts, rollups, grouped_accounts[account_type])
+                curve = get_rollups_curve(group_rollups, yearly, account_index, plot_count,
+                                          start=compute_start, end=compute_end)
+                plot_curves = [curve] if curve is not None else []
+            else:
+                group_balances = get_accounts_balances(accounts, grouped_accounts[account_type],
+                                                       start=compute_start, end=compute_end)
+                #days, balances = zip(*group_balances.items())
+                plot_curves = get_sorted_balances_curves(group_balances,
+                                                         yearly=yearly,
+                                                         balance_operator=sum,
+                                                         index=account_index,
+                                                         count=plot_count)
+            if plot_curves:
+                curves += with_style(plot_curves, account_type, color=c, label=account_type)
                 account_index += 1
         else:
             for account_id in grouped_accounts[account_type]:
                 c = get_account_properties(accounts, account_id).get('color', 'lightgrey')
                 #input = get_account_properties(accounts, account_id).get('input')
-                plot = plot_account(accounts, account_id, yearly=yearly, index=account_index, count=plot_count, color=c, label=account_id)
-                if plot:
-                    plots.append(plot)
-                    labels += [account_id]
+                if rollups is not None:
+                    curve = get_rollups_curve(rollups['accounts'][account_id], yearly, account_index, plot_count,
+                                              start=compute_start, end=compute_end)
+                    plot_curves = [curve] if curve is not None else []
+                else:
+                    plot_curves = get_sorted_balances_curves(
+                        get_account_balances(accounts, account_id, start=compute_start, end=compute_end),
+                        yearly=yearly, index=account_index, count=plot_count)
+                if plot_curves:
+                    curves += with_style(plot_curves, account_id, color=c, label=account_id)
                     account_index += 1
             type_index += 1
 
-    if total:
-        total_balances = get_accounts_balances(accounts, not_ignored_accounts.keys())
+    if total and rollups is not None:
+        total_rollups = rollup.get_group_rollups(accounts, rollups, not_ignored_accounts.keys())
+        curve = get_rollups_curve(total_rollups, yearly, plot_count-1, plot_count,
+                                  start=compute_start, end=compute_end)
+        if curve is not None:
+            curves += with_style([curve], 'Total', color='dimgrey', label='Total')
+    elif total:
+        total_balances = get_accounts_balances(accounts, not_ignored_accounts.keys(),
+                                               start=compute_start, end=compute_end)
         last_day = total_balances.keys()[-1]
-        print('Total of {:.2f}€ on {}'.format(sum(total_balances[last_day]), last_day))
-
-        total_plot = plot_sorted_balances(total_balances,
-                                      yearly=yearly,
-                                      balance_operator=sum,
-                                      index=plot_count-1,
-                                      count=plot_count,
-                                      color='dimgrey', label='Total')
-        plots.append(total_plot)
-        labels += ['Total']
-
-    # Plot legend
-    #plt.legend(plots, labels)
-    legend = plt.legend()
-
-    setup_picking(fig, legend, plots)
-
-    # Scale plot
-    if log_scale:
-        plt.yscale('symlog')
-        plt.gca().yaxis.set_major_formatter(ticker.ScalarFormatter())
-        plt.gca().yaxis.get_major_formatter().set_scientific(False)
-
-    mplcursors.cursor().connect(
-        "add", lambda sel: sel.annotation.set_text(sel.artist.get_label()))
+        messages.append(get_total_message(sum(total_balances[last_day]), last_day))
 
-    # format the coords message box
-    plt.gca().format_xdata = mdates.DateFormatter('%Y-%m-%d')
-    plt.gca().format_ydata = lambda x: '%1.2f' % x  # format the price.
+        total_curves = get_sorted_balances_curves(total_balances,
+                                                  yearly=yearly,
+                                                  balance_operator=sum,
+                                                  index=plot_count-1,
+                                                  count=plot_count)
+        curves += with_style(total_curves, 'Total', color='dimgrey', label='Total')
 
-    #plt.gca().grid(True)
-    plt.xlim(start, end)
-    plt.show()
+    return {'yearly': True, 'stacked': False, 'curves': curves, 'messages': messages}
 
-def plot_accounts(accounts, account_filters=[],
-                  log_scale=False, stacked=False, total=False, subtotals=False,
-                  account_input_types={}, #no_real_estate_appreciation=False,
-                  start=None, end=None):
+def plot_accounts_yearly(accounts,
+                         account_filters=[],
+                         log_scale=False,
+                         yearly="absolute",
+                         total=False,
+                         subtotals=False,
+                         account_input_types={}, #no_real_estate_appreciation=False,
+                         start=None, end=None, rollups=None):
+    """
+    :param account_filters: a list of dictionaries, each containing the filter to apply. See filter_account for more details.
+    :type account_filters: list of dict
+    :param rollups: if not None, precomputed rollups (see rollup.compute_rollups()) of the accounts
+     are plotted instead of recomputing the balances of each year
+    """
+    figure = get_accounts_yearly_figure(accounts, account_filters, yearly, total, subtotals, account_input_types,
+                                        start, end, rollups)
+    render_figure(figure, log_scale, start, end)
+
+def get_accounts_figure(accounts, account_filters=[],
+                        stacked=False, total=False, subtotals=False,
+                        account_input_types={}, #no_real_estate_appreciation=False,
+                        start=None, end=None):
+    """
+    Return the figure plot_accounts() renders, see render_figure()
+    """
     # Stack do not work with negative balances
     if stacked:
         ignored_categories.append('loan')
@@ -589,24 +325,20 @@ def plot_accounts(accounts, account_filters=[],
 
     grouped_accounts = group_accounts(not_ignored_accounts)
 
-    for account_type, input in account_input_types.items():
-        if input:
-            all_account_types[account_type]['account']['input'] = input
+    set_account_input_types(account_input_types)
     #if no_real_estate_appreciation:
     #    all_account_types['real-estate']['account']['no_change'] = True
 
-    plots = []
+    curves = []
     labels = []
+    messages = []
 
     # Compute total
-    total_balances = get_accounts_balances(accounts, not_ignored_accounts.keys())
+    total_balances = get_accounts_balances(accounts, not_ignored_accounts.keys(),
+                                           start=start, end=end)
     last_day = total_balances.keys()[-1]
-    print('Total of {:.2f}€ on {}'.format(sum(total_balances[last_day]), last_day))
-
-    if stacked:
-        fig, ax = plt.subplots()
-    else:
-        fig = plt.figure()
+    total_day = last_day if end is None else total_balances.keys()[max(total_balances.bisect_right(end) - 1, 0)]
+    messages.append(get_total_message(sum(total_balances[total_day]), total_day))
 
     # Plot accounts
     if not stacked and not subtotals:
@@ -630,28 +362,28 @@ def plot_accounts(accounts, account_filters=[],
                 c = get_account_properties(accounts, account_id).get('color', 'lightgrey')
                 print('>>>', account_id)
                 input = get_account_properties(accounts, account_id).get('input')
-                interpolation = 'post' if input == 'operations' else 'hermite' 
-                plot = plot_account(accounts, account_id,
-                    end_day=last_day, interpolation=interpolation, color=c, label=account_id)
-                if plot:
-                    plots += plot
+                interpolation = 'post' if input == 'operations' else 'hermite'
+                plot_curves = get_sorted_balances_curves(
+                    get_account_balances(accounts, account_id, start=start, end=end),
+                    end_day=last_day, interpolation=interpolation)
+                if plot_curves:
+                    curves += with_style(plot_curves, account_id, color=c, label=account_id)
                     labels.append(account_id)
                     account_index += 1
             type_index += 1
 
     if subtotals:
         for account_type in grouped_accounts.keys():
-            group_balances = get_accounts_balances(accounts, grouped_accounts[account_type])
+            group_balances = get_accounts_balances(accounts, grouped_accounts[account_type],
+                                                   start=start, end=end)
             days, balances = zip(*group_balances.items())
             c = get_account_properties(all_account_types, account_type).get('color', 'lightgrey')
             input = get_account_properties(all_account_types, account_type).get('input')
-            interpolation = 'post' if input == 'operations' else 'hermite' 
-            plot = plot_balances(days, tuple(sum(b) for b in balances),
-                                   end_day=last_day,
-                                   interpolation=interpolation,
-                                   color=c,
-                                   label=account_type)
-            plots += plot
+            interpolation = 'post' if input == 'operations' else 'hermite'
+            plot_curves = get_balances_curves(days, tuple(sum(b) for b in balances),
+                                              end_day=last_day,
+                                              interpolation=interpolation)
+            curves += with_style(plot_curves, account_type, color=c, label=account_type)
             labels.append(account_type)
 
     # Plot total
@@ -659,22 +391,70 @@ def plot_accounts(accounts, account_filters=[],
         if stacked:
             number_of_accounts = len(next(iter(total_balances.values())))
             colors = cm.rainbow(numpy.linspace(0, 1, number_of_accounts))
-            values = list(map(list, zip(*total_balances.values())))
-            ax.stackplot(total_balances.keys(),
-                        list(map(list, zip(*total_balances.values()))),
-                        labels=labels,
-                        colors=colors)
+            curves.append(make_curve('stackplot', total_balances.keys(),
+                                     list(map(list, zip(*total_balances.values()))),
+                                     {'labels': list(labels), 'colors': colors.tolist()}))
         else:
             days, balances = zip(*total_balances.items())
-            plot = plot_balances(days, tuple(sum(b) for b in balances), end_day=last_day, color='dimgrey', label='Total')
-            plots += plot
+            total_values = tuple(sum(b) for b in balances)
+            curves += with_style(get_balances_curves(days, total_values, end_day=last_day),
+                                 'Total', color='dimgrey', label='Total')
             labels.append('Total')
-            plot = plot_balances(days, tuple(sum(b) for b in balances), end_day=last_day, smooth=True, color='black', linestyle='dashed', label='Smoothed Total')
-            plots += plot
+            curves += with_style(get_balances_curves(days, total_values, end_day=last_day, smooth=True),
+                                 'Smoothed Total', color='black', linestyle='dashed', label='Smoothed Total')
             labels.append('Smoothed Total')
 
-    # Plot legend
+    # Plot events
+    for account_type in grouped_accounts.keys():
+        for account_id in grouped_accounts[account_type]:
+            events = accounts[account_id].get('events', {})
+            for event_day in events:
+                if (start is not None and event_day < start) or (end is not None and event_day > end):
+                    continue
+                event = events[event_day]
+                eventDict = event if type(event) is dict else {'label': event}
+                event_type = eventDict.get('type', 'point')
+                print(event_day, get_account_balance(accounts, account_id, event_day, start=start, end=end))
+                balance = eventDict.get('balance', get_account_balance(accounts, account_id, event_day, start=start, end=end))
+                if event_type == 'line':
+                    curves.append(make_curve('axvline', [event_day], [balance]))
+                elif event_type == 'point':
+                    curves.append(make_curve('scatter', [event_day], [balance], {'c': 'red'}))
+                if eventDict.get('label'):
+                    curves.append(make_curve('text', [event_day], [balance], {'s': eventDict.get('label')}))#,rotation=90)
+
+    return {'yearly': False, 'stacked': stacked, 'curves': curves, 'messages': messages}
+
+def render_figure(figure, log_scale=False, start=None, end=None):
+    """
+    Draw and show a figure computed by get_accounts_figure() or
+    get_accounts_yearly_figure(), possibly read from a plot cache (see
+    plot_cache.py): {'yearly': bool, 'stacked': bool, 'curves': [curves,
+    see make_curve()], 'messages': [lines to print]}
+    """
+    for message in figure['messages']:
+        print(message)
+    stacked = figure['stacked']
     if stacked:
+        fig, ax = plt.subplots()
+    else:
+        fig = plt.figure()
+
+    plots = []
+    labels = []
+    for curve in figure['curves']:
+        plot = draw_curve(curve)
+        if curve['legend'] is not None:
+            if figure['yearly']:
+                plots.append(plot)
+            else:
+                plots += plot
+            labels.append(curve['legend'])
+
+    # Plot legend
+    if figure['yearly']:
+        legend = plt.legend()
+    elif stacked:
         legend = ax.legend(loc='upper left')
     else:
         legend = plt.legend(plots, labels)
@@ -687,44 +467,31 @@ def plot_accounts(accounts, account_filters=[],
         plt.gca().yaxis.set_major_formatter(ticker.ScalarFormatter())
         plt.gca().yaxis.get_major_formatter().set_scientific(False)
 
-    # Plot events
-    for account_type in grouped_accounts.keys():
-        for account_id in grouped_accounts[account_type]:
-            events = accounts[account_id].get('events', {})
-            for event_day in events:
-                event = events[event_day]
-                eventDict = event if type(event) is dict else {'label': event}
-                event_type = eventDict.get('type', 'point')
-                print(event_day, get_account_balance(accounts, account_id, event_day))
-                balance = eventDict.get('balance', get_account_balance(accounts, account_id, event_day))
-                if event_type == 'line':
-                    plt.axvline(event_day)
-                elif event_type == 'point':
-                    plt.scatter([event_day], [balance], c='red')
-                if eventDict.get('label'):
-                    plt.text(event_day, balance, eventDict.get('label'))#,rotation=90)
-
     if not stacked:
-        mplcursors.cursor().connect(
-            "add", lambda sel: sel.annotation.set_text(sel.artist.get_label()))
-
         # format the coords message box
         plt.gca().format_xdata = mdates.DateFormatter('%Y-%m-%d')
         plt.gca().format_ydata = lambda x: '%1.2f' % x  # format the price.
 
-        plt.gca().grid(True)
+        if not figure['yearly']:
+            plt.gca().grid(True)
 
     plt.xlim(start, end)
     plt.show()
 
+def plot_accounts(accounts, account_filters=[],
+                  log_scale=False, stacked=False, total=False, subtotals=False,
+                  account_input_types={}, #no_real_estate_appreciation=False,
+                  start=None, end=None):
+    figure = get_accounts_figure(accounts, account_filters, stacked, total, subtotals, account_input_types,
+                                 start, end)
+    render_figure(figure, log_scale, start, end)
+
 
 def main():
     import argparse
-    import os
 
     parser = argparse.ArgumentParser()
-    parser.add_argument("file_or_folder", nargs='+',
-                        help="one or multiple json files or folders containing json files")
+    add_accounts_arguments(parser)
     # parser.add_argument("-i", "--ignore", action='append', default=[],
     #                     help="Account type to ignore (e.g. -i loan -i real-estate)")
     parser.add_argument("--log", action="store_true",
@@ -740,80 +507,59 @@ def main():
                         help="Plot totals per account type")
     # parser.add_argument("--no_real_estate_appreciation", action="store_true",
     #                     help="If set, real_estate does not get appreciated")
-    for account_type in all_account_types.keys():
-        parser.add_argument("--" + account_type, choices=['balances', 'operations'],
-                            help="Consider true balance or I/O operations. For a closing 'operations'"
-                             "(e.g. selling a real estate), please create a fake operation that adds"
-                             "capital gain the day before the day of the closing operation (that brings balance to 0)"
-                             "For example, if you buy a house 100K, and sell it 150K, you would then have 3"
-                             "operations: +100K, +50K, -150K")
     parser.add_argument("--start", type=lambda s: datetime.datetime.strptime(s, '%Y-%m-%d'),
                         help="Start plotting from given date")
     parser.add_argument("--end", type=lambda s: datetime.datetime.strptime(s, '%Y-%m-%d'),
                         help="Stop plotting at given date")
-
-    parser.add_argument("--filter", action='append',
-                        help='Consider or reject specific accounts in the format ±key=value. E.g. --filter f+account-type=loan --filter f-currency=$ to consider only loans not in USD',
-                        default=[])
+    parser.add_argument("--rollups", action="store_true",
+                        help="Plot the yearly balances from the rollups stored next to the first accounts file"
+                        " (computed if missing or outdated)")
+    parser.add_argument("--cache",
+                        help="folder where the computed series are cached per accounts files and view, to only"
+                        " render them when nothing changed")
     args = parser.parse_args()
 
-    account_filters = []
-    for item in args.filter:
-        condition = item[:2]
-        item = item[2:]
-        if condition not in ['f+', 'f-']:
-            raise ValueError('Filter must start with f+ or f-', condition)
-        else:
-            condition = condition == 'f+' # True if f+, False if f-
-        key, value = item.split('=')
-        account_filters.append(
-            {
-                'condition': condition,
-                'key': key,
-                'value': value
-            })
-
-    accounts = {}
-    for file_or_folder in args.file_or_folder:
-        if pathlib.Path(file_or_folder).is_file():
-            accounts.update(readAccounts(file_or_folder))
-        else:
-            for root, dirs, files in os.walk(file_or_folder):
-                for file in files:
-                    accounts_file_path = os.path.join(root, file)
-                    [stem, ext] = os.path.splitext(accounts_file_path)
-                    if ext == '.json':
-                        accounts.update(readAccounts(accounts_file_path))
-
-    account_input_types = {}
-    args_dict = vars(args)
-    for account_type in all_account_types.keys():
-        account_input_types[account_type] = args_dict.get(account_type.replace('-', '_'))
+    # the accounts files are only read when the figure is not cached
+    account_filters, account_input_types = read_accounts_options(args)
 
     if args.yearly is None:
         args.yearly = 'absolute'
     elif args.yearly == 'no':
         args.yearly = False
     if args.yearly:
-        plot_accounts_yearly(accounts,
-                  account_filters=account_filters,
-                  log_scale=args.log,
-                  yearly=args.yearly,
-                  total=args.total,
-                  subtotals=args.subtotals,
-                  # no_real_estate_appreciation=args.no_real_estate_appreciation,
-                  account_input_types=account_input_types,
-                  start=args.start, end=args.end)
+        def compute_figure():
+            accounts = read_accounts_files(args.file_or_folder)
+            rollups = None
+            if args.rollups:
+                set_account_input_types(account_input_types)
+                rollups = rollup.update_rollups(accounts, rollup.get_rollups_path(args.file_or_folder[0]))
+            return get_accounts_yearly_figure(accounts,
+                      account_filters=account_filters,
+                      yearly=args.yearly,
+                      total=args.total,
+                      subtotals=args.subtotals,
+                      # no_real_estate_appreciation=args.no_real_estate_appreciation,
+                      account_input_types=account_input_types,
+                      start=args.start, end=args.end,
+                      rollups=rollups)
+    else:
+        def compute_figure():
+            return get_accounts_figure(read_accounts_files(args.file_or_folder),
+                      account_filters=account_filters,
+                      stacked=args.stack,
+                      total=args.total,
+                      subtotals=args.subtotals,
+                      # no_real_estate_appreciation=args.no_real_estate_appreciation,
+                      account_input_types=account_input_types,
+                      start=args.start, end=args.end)
+    if args.cache:
+        view = {'filters': args.filter, 'input_types': account_input_types, 'yearly': args.yearly,
+                'stacked': args.stack, 'total': args.total, 'subtotals': args.subtotals,
+                'rollups': args.rollups, 'start': args.start, 'end': args.end}
+        figure = plot_cache.get_figure(args.cache, args.file_or_folder, view, compute_figure)
     else:
-        plot_accounts(accounts,
-                  account_filters=account_filters,
-                  log_scale=args.log,
-                  stacked=args.stack,
-                  total=args.total,
-                  subtotals=args.subtotals,
-                  # no_real_estate_appreciation=args.no_real_estate_appreciation,
-                  account_input_types=account_input_types,
-                  start=args.start, end=args.end)
+        figure = compute_figure()
+    render_figure(figure, args.log, args.start, args.end)
 
 if __name__ == "__main__":
     import sys
@@ -0,0 +1,77 @@
+import hashlib
+import json
+import os
+
+try:
+    import compute
+    import discovery
+    from utils import open_atomically
+except ImportError:
+    from . import compute
+    from . import discovery
+    from .utils import open_atomically
+
+# changes when the layout of the cached figures changes
+cache_version = 1
+cache_extension = '.npz'
+
+def get_view_key(files_or_folders, view):
+    """
+    Return the sha256 of everything the figure of a view depends on: the
+    contents of the accounts files (see compute.get_accounts_files()), the
+    view parameters (filters, yearly mode, input types, date range...) and
+    the currency conversion.
+    @param view json serializable dict of the view parameters
+    """
+    return hashlib.sha256(json.dumps({
+        'version': cache_version,
+        'files': [discovery.hash_file(accounts_file_path)
+                  for accounts_file_path in compute.get_accounts_files(files_or_folders)],
+        'view': view,
+        'currency': compute.get_currency_fingerprint(),
+    }, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+def get_cache_path(cache_folder_path, key):
+    return os.path.join(cache_folder_path, key + cache_extension)
+
+def write_figure(figure_path, figure):
+    """
+    Write a figure (see plot.render_figure()) as a compressed numpy archive:
+    the days and values of each curve as arrays, the rest as json.
+    """
+    import numpy
+    metadata = {key: value for key, value in figure.items() if key != 'curves'}
+    metadata['curves'] = [{key: value for key, value in curve.items() if key not in ('x', 'y')}
+                          for curve in figure['curves']]
+    arrays = {}
+    for index, curve in enumerate(figure['curves']):
+        arrays['x{}'.format(index)] = curve['x']
+        arrays['y{}'.format(index)] = curve['y']
+    with open_atomically(figure_path, binary=True) as figure_file:
+        numpy.savez_compressed(figure_file, metadata=numpy.array(json.dumps(metadata)), **arrays)
+
+def read_figure(figure_path):
+    """ Return the figure written by write_figure(), None if it doesn't exist"""
+    import numpy
+    try:
+        with numpy.load(figure_path) as arrays:
+            figure = json.loads(str(arrays['metadata']))
+            for index, curve in enumerate(figure['curves']):
+                curve['x'] = arrays['x{}'.format(index)]
+                curve['y'] = arrays['y{}'.format(index)]
+    except FileNotFoundError:
+        return None
+    return figure
+
+def get_figure(cache_folder_path, files_or_folders, view, compute_figure):
+    """
+    Return the figure of the view from the cache folder, or computed with
+    compute_figure() and cached if missing.
+    """
+    os.makedirs(cache_folder_path, exist_ok=True)
+    figure_path = get_cache_path(cache_folder_path, get_view_key(files_or_folders, view))
+    figure = read_figure(figure_path)
+    if figure is None:
+        figure = compute_figure()
+        write_figure(figure_path, figure)
+    return figure
@@ -0,0 +1,135 @@
+import csv
+import datetime
+import json
+import sys
+
+try:
+    import compute
+except ImportError:
+    from . import compute
+
+levels = ['accounts', 'subtotals', 'total']
+
+def parse_day(s):
+    return datetime.datetime.strptime(s, '%Y-%m-%d')
+
+def parse_range(s):
+    """ Parse a START:END date range """
+    start, end = s.split(':')
+    return parse_day(start), parse_day(end)
+
+def get_query_days(days=[], day_ranges=[], step=1):
+    """
+    @param step number of days between 2 days of a range
+    @return the sorted list of unique days and days of the ranges (included)
+    """
+    query_days = set(days)
+    for start, end in day_ranges:
+        query_days.update(start + datetime.timedelta(days=d)
+                          for d in range(0, (end - start).days + 1, step))
+    return sorted(query_days)
+
+def get_last_day(accounts, account_ids):
+    """ Return the last day with a balance among the accounts"""
+    last_days = [balances.keys()[-1] for balances in
+                 (compute.get_account_balances(accounts, account_id) for account_id in account_ids)
+                 if balances]
+    return max(last_days) if last_days else None
+
+def query_balances(accounts, days, account_filters=[]):
+    """
+    Evaluate the balances of all the (non filtered) accounts for all the days in one pass.
+    :return a dictionary with the following structure:
+        {
+            'days': [day1, day2...],
+            'accounts': {account_id: [balance1, balance2...]},
+            'subtotals': {account_type: [balance1, balance2...]},
+            'total': [balance1, balance2...]
+        }
+    """
+    import numpy
+    not_ignored_accounts = compute.filter_accounts(accounts, account_filters)
+    grouped_accounts = compute.group_accounts(not_ignored_accounts)
+    result = {'days': days, 'accounts': {}, 'subtotals': {}, 'total': numpy.zeros(len(days))}
+    for account_type, group in grouped_accounts.items():
+        subtotal = numpy.zeros(len(days))
+        for account_id in group:
+            sorted_balances = compute.get_account_balances(accounts, account_id)
+            balances = compute.get_balances(sorted_balances, days)
+            result['accounts'][account_id] = balances
+            subtotal += balances
+        result['subtotals'][account_type] = subtotal
+        result['total'] += subtotal
+    return result
+
+def get_columns(result, query_levels=levels):
+    """
+    @return a list of (column name, balances)
+    """
+    columns = []
+    if 'accounts' in query_levels:
+        columns += list(result['accounts'].items())
+    if 'subtotals' in query_levels:
+        columns += list(result['subtotals'].items())
+    if 'total' in query_levels:
+        columns.append(('total', result['total']))
+    return columns
+
+def write_json(result, output, query_levels=levels):
+    rows = []
+    for index, day in enumerate(result['days']):
+        row = {'date': day.strftime('%Y-%m-%d')}
+        for level in levels:
+            if level not in query_levels:
+                continue
+            if level == 'total':
+                row[level] = round(float(result[level][index]), 2)
+            else:
+                row[level] = {key: round(float(balances[index]), 2)
+                              for key, balances in result[level].items()}
+        rows.append(row)
+    json.dump(rows, output, indent=2)
+
+def write_csv(result, output, query_levels=levels):
+    columns = get_columns(result, query_levels)
+    writer = csv.writer(output, lineterminator='\n')
+    writer.writerow(['date'] + [name for name, balances in columns])
+    for index, day in enumerate(result['days']):
+        writer.writerow([day.strftime('%Y-%m-%d')] +
+                        ['{:.2f}'.format(balances[index]) for name, balances in columns])
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Print balances, subtotals per account type and total at given dates")
+    compute.add_accounts_arguments(parser)
+    parser.add_argument("--date", type=parse_day, action='append', default=[],
+                        help="Day (YYYY-MM-DD) to get balances at. Last known day if no date nor range is given")
+    parser.add_argument("--range", type=parse_range, action='append', default=[],
+                        help="Range of days (YYYY-MM-DD:YYYY-MM-DD) to get balances at")
+    parser.add_argument("--step", type=int, default=1,
+                        help="Number of days between 2 days of a range")
+    parser.add_argument("--level", choices=levels, action='append',
+                        help="Output balances per account, subtotals per account type and/or total. All by default")
+    parser.add_argument("--format", choices=['json', 'csv'], default='json')
+    parser.add_argument("-o", "--output", help="output file, standard output by default")
+    args = parser.parse_args()
+
+    accounts, account_filters, account_input_types = compute.read_accounts_arguments(args)
+    compute.set_account_input_types(account_input_types)
+
+    days = get_query_days(args.date, args.range, args.step)
+    if not days:
+        last_day = get_last_day(accounts, compute.filter_accounts(accounts, account_filters))
+        days = [last_day] if last_day else []
+    result = query_balances(accounts, days, account_filters)
+
+    write = write_csv if args.format == 'csv' else write_json
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8', newline='') as output:
+            write(result, output, args.level or levels)
+    else:
+        write(result, sys.stdout, args.level or levels)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,222 @@
+import calendar
+import datetime
+import hashlib
+import json
+import os
+import sys
+
+from sortedcontainers import SortedDict
+
+try:
+    import compute
+    from utils import write_atomically
+except ImportError:
+    from . import compute
+    from .utils import write_atomically
+
+# number of months of each period
+periods = {
+    'monthly': 1,
+    'quarterly': 3,
+    'yearly': 12
+}
+
+rollups_extension = compute.rollups_extension
+
+
+def get_period_end(day, period):
+    """ Return the last day of the period containing day"""
+    months = periods[period]
+    month = ((day.month - 1) // months + 1) * months
+    return datetime.datetime(day.year, month, calendar.monthrange(day.year, month)[1])
+
+def get_next_period_end(period_end, period):
+    month = period_end.month + periods[period]
+    year = period_end.year + (month - 1) // 12
+    month = (month - 1) % 12 + 1
+    return datetime.datetime(year, month, calendar.monthrange(year, month)[1])
+
+def get_period_ends(first_day, last_day, period):
+    """ Return the last days of the periods from first_day to last_day"""
+    period_ends = [get_period_end(first_day, period)]
+    last_period_end = get_period_end(last_day, period)
+    while period_ends[-1] < last_period_end:
+        period_ends.append(get_next_period_end(period_ends[-1], period))
+    return period_ends
+
+def get_period_start(period_end, period):
+    """ Return the first day of the period ending on period_end"""
+    return period_end.replace(month=period_end.month - periods[period] + 1, day=1)
+
+def get_account_fingerprint(accounts, account_id):
+    """ sha256 of everything the rollups of the account depend on"""
+    account = accounts[account_id]
+    data = {
+        # properties of redirected accounts may contain their balances
+        'properties': repr(sorted(compute.get_account_properties(accounts, account_id).items())),
+        'currency': compute.get_currency_fingerprint(),
+        'balances': sorted((day.isoformat(), value) for day, value in (account.get('balances') or {}).items()),
+        'operations': sorted((day.isoformat(), value) for day, value in (account.get('operations') or {}).items()),
+    }
+    return hashlib.sha256(json.dumps(data, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+def get_account_operations(accounts, account_id):
+    """ Return the operations of the account in the target currency, times its share"""
+    properties = compute.get_account_properties(accounts, account_id)
+    share = properties.get('share', 1)
+    operations = accounts[account_id].get('operations') or {}
+    if operations and compute.target_currency is not None and properties.get('currency') is not None:
+        operations = compute.currency_rates.convert(SortedDict(operations), properties['currency'],
+                                                    compute.target_currency)
+    return {day: operation * share for day, operation in operations.items()}
+
+def rollup_balances(sorted_balances, operations):
+    """
+    Compute the period-end balances, the balance deltas with the previous
+    period and the sums of operations for each period.
+    The period-end balance is the last known balance (see
+    compute.get_balance_exact()).
+    @return {period: {period last day (ISO): {'balance': b, 'delta': d, 'operations': o}}}
+    """
+    days = [sorted_balances.keys()[0], sorted_balances.keys()[-1]] if sorted_balances else []
+    if operations:
+        days += [min(operations), max(operations)]
+    rollups = {}
+    if not days:
+        return {period: {} for period in periods}
+    for period in periods:
+        entries = {}
+        previous_balance = 0
+        for period_end in get_period_ends(min(days), max(days), period):
+            balance = float(compute.get_balance_exact(sorted_balances, period_end)) if sorted_balances else 0
+            entries[period_end] = {'balance': balance, 'delta': balance - previous_balance}
+            previous_balance = balance
+        if operations:
+            for entry in entries.values():
+                entry['operations'] = 0
+            for day, operation in operations.items():
+                entries[get_period_end(day, period)]['operations'] += operation
+        rollups[period] = {period_end.date().isoformat(): entry for period_end, entry in entries.items()}
+    return rollups
+
+def rollup_account(accounts, account_id):
+    """ Return the rollups of an account, see rollup_balances()"""
+    return rollup_balances(compute.get_account_balances(accounts, account_id),
+                           get_account_operations(accounts, account_id))
+
+def rollup_accounts(accounts, account_ids):
+    """
+    Return the rollups of the sum of multiple accounts, see rollup_balances().
+    The balances are summed like the totals of plot.py: the balance of each
+    account is interpolated at the balance days of all the accounts (see
+    compute.get_accounts_balances()), not only its last known balance.
+    """
+    sorted_balances = SortedDict({day: sum(balances) for day, balances
+                                  in compute.get_accounts_balances(accounts, account_ids).items()})
+    operations = {}
+    for account_id in account_ids:
+        for day, operation in get_account_operations(accounts, account_id).items():
+            operations[day] = operations.get(day, 0) + operation
+    return rollup_balances(sorted_balances, operations)
+
+def get_group_fingerprint(account_rollups, account_ids):
+    """ sha256 of everything the rollups of the sum of the accounts depend on"""
+    return hashlib.sha256(json.dumps([account_rollups[account_id]['fingerprint'] for account_id in account_ids])
+                          .encode('utf-8')).hexdigest()
+
+def get_group_rollups(accounts, rollups, account_ids):
+    """
+    Return the rollups of the sum of the accounts: the precomputed ones of an
+    account type or of the total if they are of the same accounts, computed
+    with rollup_accounts() otherwise (e.g. filtered accounts).
+    """
+    account_ids = sorted(account_ids)
+    for group_rollups in [rollups['total'], *rollups['types'].values()]:
+        if group_rollups['accounts'] == account_ids:
+            return group_rollups
+    return rollup_accounts(accounts, account_ids)
+
+def compute_rollups(accounts, previous_rollups=None, account_ids=None):
+    """
+    Compute the rollups of each account, each account type and of the total.
+    The rollups that didn't change since previous_rollups are reused.
+    @param account_ids ids of the accounts to compute the rollups of, all if None
+    @return {'accounts': {account_id: {'fingerprint': f, period: {...}}},
+             'types': {account_type: {'fingerprint': f, 'accounts': [account ids], period: {...}}},
+             'total': {'fingerprint': f, 'accounts': [account ids], period: {...}}}
+    """
+    previous_account_rollups = previous_rollups['accounts'] if previous_rollups else {}
+    account_rollups = {}
+    for account_id in accounts if account_ids is None else account_ids:
+        fingerprint = get_account_fingerprint(accounts, account_id)
+        rollups = previous_account_rollups.get(account_id)
+        if rollups is None or rollups['fingerprint'] != fingerprint:
+            rollups = {'fingerprint': fingerprint, **rollup_account(accounts, account_id)}
+        account_rollups[account_id] = rollups
+    previous_group_rollups = [*previous_rollups['types'].values(), previous_rollups['total']] \
+        if previous_rollups and 'total' in previous_rollups else []
+
+    def group_rollups(group):
+        group = sorted(group)
+        fingerprint = get_group_fingerprint(account_rollups, group)
+        for rollups in previous_group_rollups:
+            if rollups['fingerprint'] == fingerprint and rollups['accounts'] == group:
+                return rollups
+        return {'fingerprint': fingerprint, 'accounts': group, **rollup_accounts(accounts, group)}
+
+    type_rollups = {}
+    for account_type, group in compute.group_accounts(accounts).items():
+        group = [account_id for account_id in group if account_id in account_rollups]
+        if group:
+            type_rollups[account_type] = group_rollups(group)
+    return {'accounts': account_rollups, 'types': type_rollups, 'total': group_rollups(account_rollups.keys())}
+
+def get_rollups_path(accounts_path):
+    """ Return the rollups file stored next to an accounts file"""
+    return os.path.splitext(accounts_path)[0] + rollups_extension
+
+def read_rollups(rollups_path):
+    """ Return the rollups of the file, None if it doesn't exist"""
+    try:
+        with open(rollups_path, encoding='utf-8') as rollups_file:
+            return json.load(rollups_file)
+    except FileNotFoundError:
+        return None
+
+def update_rollups(accounts, rollups_path, account_ids=None):
+    """ Compute the rollups of accounts, reusing and updating the ones of rollups_path"""
+    rollups = compute_rollups(accounts, read_rollups(rollups_path), account_ids)
+    write_atomically(rollups_path, json.dumps(rollups, indent=2))
+    return rollups
+
+def get_rollup_series(rollups, period='yearly', key='balance', start=None, end=None):
+    """
+    @return the first days of the periods and the values of key of rollups
+     (see rollup_account()) within [start, end]
+    """
+    days, values = [], []
+    for day, entry in rollups[period].items():
+        period_end = datetime.datetime.fromisoformat(day)
+        if (start is None or period_end >= start) and (end is None or period_end <= end):
+            days.append(get_period_start(period_end, period))
+            values.append(entry.get(key, 0))
+    return days, values
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Compute the monthly, quarterly and yearly balances, balance deltas"
+                                     " and operation sums per account and per account type")
+    compute.add_accounts_arguments(parser)
+    parser.add_argument("-o", "--output",
+                        help="rollups json file, updated if it exists."
+                        " Defaults to the first accounts file with a " + rollups_extension + " extension")
+    args = parser.parse_args()
+
+    accounts, account_filters, account_input_types = compute.read_accounts_arguments(args)
+    compute.set_account_input_types(account_input_types)
+    update_rollups(accounts, args.output or get_rollups_path(args.file_or_folder[0]),
+                   compute.filter_accounts(accounts, account_filters).keys())
+
+if __name__ == "__main__":
+    sys.exit(main())
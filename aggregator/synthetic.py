@@ -0,0 +1,103 @@
+import datetime
+import json
+import random
+import sys
+
+try:
+    from compute import all_account_types
+except ImportError:
+    from .compute import all_account_types
+
+# average number of days between 2 statements
+frequencies = {
+    'daily': 1,
+    'weekly': 7,
+    'monthly': 30.44,
+    'quarterly': 91.31,
+    'yearly': 365.25
+}
+
+def generate_accounts(account_count=10, years=10, frequency='monthly',
+                      operations=0.2, redirections=0.1, shares=0.2,
+                      end=datetime.date(2024, 12, 31), seed=0):
+    """
+    Generate a synthetic accounts dataset in the accounts.json layout (days
+    are ISO strings), e.g. for benchmarks.
+    @param years history length of each account
+    @param frequency average time between 2 statements, see frequencies
+    @param operations ratio of accounts with operations instead of balances
+    @param redirections ratio of accounts that share the properties of
+     another account ("account": "other account id")
+    @param shares ratio of accounts partially owned ("share" property)
+    @param seed the same seed generates the same dataset
+    """
+    rng = random.Random(seed)
+    account_types = list(all_account_types.keys())
+    step = frequencies[frequency]
+    start = end - datetime.timedelta(days=round(years * 365.25))
+    accounts = {}
+    for index in range(account_count):
+        bank_name = 'BANK{}'.format(index % 7)
+        account_number = '{:011d}'.format(rng.randrange(10 ** 11))
+        if accounts and rng.random() < redirections:
+            properties = rng.choice([account_id for account_id, account in accounts.items()
+                                     if isinstance(account['account'], dict)])
+        else:
+            properties = {
+                'bank-name': bank_name,
+                'account-type': rng.choice(account_types),
+                'currency': rng.choice(['€', '€', '$']),
+                'account': account_number
+            }
+            if rng.random() < shares:
+                properties['share'] = rng.choice([0.25, 0.5])
+        input = 'operations' if rng.random() < operations else 'balances'
+        values = {}
+        day = start + datetime.timedelta(days=rng.uniform(0, step))
+        value = round(rng.uniform(0, 10000), 2)
+        while day <= end:
+            delta = round(rng.gauss(50, 500), 2)
+            value = round(value + delta, 2)
+            values[day.isoformat()] = delta if input == 'operations' else value
+            day += datetime.timedelta(days=max(round(rng.gauss(step, step / 10)), 1))
+        accounts['-'.join([bank_name, account_number])] = {'account': properties, input: values}
+    return accounts
+
+def write_accounts(accounts, accounts_path):
+    with open(accounts_path, 'w', encoding='utf-8') as accounts_file:
+        json.dump(accounts, accounts_file, indent=2)
+
+def add_generator_arguments(parser):
+    """ Add the command line arguments of generate_accounts()"""
+    parser.add_argument("--accounts", type=int, default=10,
+                        help="number of accounts")
+    parser.add_argument("--years", type=float, default=10,
+                        help="history length of each account")
+    parser.add_argument("--frequency", choices=frequencies.keys(), default='monthly',
+                        help="statement frequency")
+    parser.add_argument("--operations", type=float, default=0.2,
+                        help="ratio of accounts with operations instead of balances")
+    parser.add_argument("--redirections", type=float, default=0.1,
+                        help="ratio of accounts redirected to the properties of another account")
+    parser.add_argument("--shares", type=float, default=0.2,
+                        help="ratio of accounts with a share property")
+    parser.add_argument("--seed", type=int, default=0)
+
+def get_generator_parameters(args):
+    """ Return the generate_accounts() keyword arguments of the command line arguments"""
+    return {'account_count': args.accounts, 'years': args.years, 'frequency': args.frequency,
+            'operations': args.operations, 'redirections': args.redirections,
+            'shares': args.shares, 'seed': args.seed}
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Generate a synthetic accounts json file")
+    add_generator_arguments(parser)
+    parser.add_argument("-o", "--output", default="synthetic-accounts.json")
+    args = parser.parse_args()
+
+    write_accounts(generate_accounts(**get_generator_parameters(args)), args.output)
+
+if __name__ == "__main__":
+    sys.exit(main())
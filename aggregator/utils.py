@@ -1,3 +1,7 @@
+import contextlib
+import os
+import tempfile
+
 import cachetools
 
 def memoize(f):
@@ -9,6 +13,43 @@ def memoize(f):
         return memo[key]
     return helper
 
+def memoize_by(key):
+    """ Like memoize, with a cache key computed by key(*args)"""
+    def decorator(f):
+        memo = {}
+        def helper(*args):
+            k = key(*args)
+            if k not in memo:
+                memo[k] = f(*args)
+            return memo[k]
+        helper.cache_clear = memo.clear
+        return helper
+    return decorator
+
+@contextlib.contextmanager
+def open_atomically(file_path, binary=False):
+    """
+    Open a temporary text file renamed into file_path once written, so that
+    readers never see a partially written file. The temporary file is
+    removed if writing fails.
+    @param binary if True, a binary file is opened instead
+    """
+    folder_path = os.path.dirname(os.path.abspath(file_path))
+    temp_file = tempfile.NamedTemporaryFile('wb' if binary else 'w', encoding=None if binary else 'utf-8',
+                                            dir=folder_path, delete=False, prefix='.' + os.path.basename(file_path))
+    try:
+        with temp_file:
+            yield temp_file
+        os.replace(temp_file.name, file_path)
+    except BaseException:
+        os.remove(temp_file.name)
+        raise
+
+def write_atomically(file_path, text):
+    """ Write text into file_path, see open_atomically()"""
+    with open_atomically(file_path) as output:
+        output.write(text)
+
 def memoize_with_id(f):
     memo = cachetools.LFUCache(maxsize=10)
     def helper(x, *args):
@@ -34,16 +75,21 @@ def compute_hash(value):
         return id(value)
     return value
 
-def memoize_2(f):
-    memo = cachetools.LRUCache(maxsize=50)
+def memoize_2(f=None, maxsize=50):
+    """ Can be used as @memoize_2 or @memoize_2(maxsize=...)"""
+    if f is None:
+        return lambda f: memoize_2(f, maxsize)
+    memo = cachetools.LRUCache(maxsize=maxsize)
     def helper(*args, **kwargs):
-        key = tuple(compute_hash(v) for v in args)
+        key = (tuple(compute_hash(v) for v in args) +
+               tuple((k, compute_hash(v)) for k, v in sorted(kwargs.items())))
         if key not in memo:
-            memo[key] = (f(*args, **kwargs), args)
+            memo[key] = (f(*args, **kwargs), args, kwargs)
         else:
             #print('found')
             pass
         return memo[key][0]
+    helper.cache_clear = memo.clear
     return helper
 
 
@@ -0,0 +1,146 @@
+import os
+import sys
+import time
+
+try:
+    import aggregate
+    import discovery
+    import model
+    from utils import open_atomically
+except ImportError:
+    from . import aggregate
+    from . import discovery
+    from . import model
+    from .utils import open_atomically
+
+
+class FolderWatcher:
+    """
+    Report the pdf files of a folder and its sub-folders that appeared,
+    changed or disappeared since the last poll.
+    Polling stats the folders: the folder is scanned again when the
+    modification time of one of its folders changed, i.e. when a file was
+    added, removed or renamed in it. Files rewritten in place don't change
+    their folder, the known files are also stat'ed every file_check_polls
+    polls.
+    Files in archives are not watched.
+    """
+    def __init__(self, folder_path, include=[], exclude=[], settle=2, file_check_polls=5):
+        """
+        @param settle seconds without modification before a file is reported,
+         files being copied are reported once complete.
+        @param file_check_polls number of polls between two checks of the
+         modification time and size of the known files
+        """
+        self.folder_path = folder_path
+        self.include = include
+        self.exclude = exclude
+        self.settle = settle
+        self.file_check_polls = file_check_polls
+        self.polls = 0
+        self.folder_mtimes = {}  # folder -> modification time
+        self.file_stamps = {}  # reported file -> (modification time, size)
+        self.unsettled = False
+
+    def has_changed(self, check_files=False):
+        """
+        @param check_files if True, the known files are stat'ed too, to find
+         the files rewritten in place
+        """
+        if self.unsettled or not self.folder_mtimes:
+            return True
+        for folder, mtime in self.folder_mtimes.items():
+            try:
+                if os.stat(folder).st_mtime_ns != mtime:
+                    return True
+            except FileNotFoundError:
+                return True
+        for file_path, stamp in self.file_stamps.items() if check_files else []:
+            try:
+                stat = os.stat(file_path)
+            except FileNotFoundError:
+                return True
+            if (stat.st_mtime_ns, stat.st_size) != stamp:
+                return True
+        return False
+
+    def scan(self):
+        """
+        @return the list of new or modified files and the list of removed files
+        """
+        # folders are stat'ed before being listed: a file added during the
+        # scan triggers a new scan.
+        folder_mtimes = {folder: os.stat(folder).st_mtime_ns
+                         for folder, sub_folders, file_names in os.walk(self.folder_path)}
+        file_stamps = {}
+        self.unsettled = False
+        now = time.time_ns()
+        for file_path in discovery.iter_files(self.folder_path, include=self.include,
+                                              exclude=self.exclude, archives=False):
+            try:
+                stat = os.stat(file_path)
+            except FileNotFoundError:
+                continue
+            if now - stat.st_mtime_ns < self.settle * 1e9:
+                self.unsettled = True
+                if file_path in self.file_stamps:
+                    file_stamps[file_path] = self.file_stamps[file_path]
+                continue
+            file_stamps[file_path] = (stat.st_mtime_ns, stat.st_size)
+        changed_files = [file_path for file_path, stamp in file_stamps.items()
+                         if self.file_stamps.get(file_path) != stamp]
+        removed_files = [file_path for file_path in self.file_stamps if file_path not in file_stamps]
+        self.folder_mtimes = folder_mtimes
+        self.file_stamps = file_stamps
+        return changed_files, removed_files
+
+    def poll(self):
+        """ Same as scan(), without scanning if no folder (nor known file, see file_check_polls) changed"""
+        self.polls += 1
+        if not self.has_changed(check_files=self.polls % self.file_check_polls == 0):
+            return [], []
+        return self.scan()
+
+def update_documents(documents, changed_files, removed_files, confs_path="./confs", verbose=0):
+    """
+    Aggregate the changed files into documents ({file path: accounts}) and
+    remove the removed ones. A file that fails to be aggregated is reported
+    and skipped.
+    """
+    for file_path in removed_files:
+        documents.pop(file_path, None)
+    for file_path in changed_files:
+        try:
+            documents[file_path] = aggregate.aggregate_pdf_isolated(file_path, confs_path, verbose)[0]
+        except Exception as e:
+            print(file_path, "failed:", repr(e), file=sys.stderr)
+            documents.pop(file_path, None)
+    # the extracted texts are only needed while matching the confs of a file
+    aggregate.parse_pdf_internal.cache_clear()
+
+def watch(folder_path, output, confs_path="./confs", verbose=0, interval=2,
+          include=[], exclude=[], settle=2, polls=None, file_check_polls=5):
+    """
+    Aggregate the pdf files of folder_path into output, then poll the folder
+    every interval seconds to aggregate the new and modified files and
+    rewrite output.
+    The process (imported parsers, read confs) is kept alive between polls.
+    @param polls number of polls before returning, forever if None
+    @param file_check_polls see FolderWatcher
+    """
+    folder_watcher = FolderWatcher(folder_path, include, exclude, settle, file_check_polls)
+    documents = {}
+    poll = 0
+    while polls is None or poll < polls:
+        if poll > 0:
+            time.sleep(interval)
+        poll += 1
+        changed_files, removed_files = folder_watcher.poll()
+        if not changed_files and not removed_files:
+            continue
+        if verbose > 0:
+            print(len(changed_files), "new or modified files,", len(removed_files), "removed files")
+        update_documents(documents, changed_files, removed_files, confs_path, verbose)
+        with open_atomically(output) as accounts_json_file:
+            model.write_json(model.merge_accounts(documents[file_path] for file_path in sorted(documents)),
+                             accounts_json_file)
@@ -0,0 +1,260 @@
+import collections
+import concurrent.futures
+import itertools
+import json
+import os
+import statistics
+import sys
+import time
+import unicodedata
+
+try:
+    import aggregate
+    import discovery
+except ImportError:
+    from . import aggregate
+    from . import discovery
+
+# texts of the corpus in the worker processes, see set_texts()
+texts = {}
+
+def set_texts(corpus_texts):
+    global texts
+    texts = corpus_texts
+
+def load_text(file_path, parser_name, text_cache_path):
+    """ Return (text, None), or (None, error message) if the extraction failed"""
+    try:
+        return aggregate.extract_text(file_path, parser_name, text_cache_path), None
+    except Exception as e:
+        return None, repr(e)
+
+def load_texts(file_paths, parser_name='pdfplumber', text_cache_path=None, processes=None):
+    """
+    Extract the texts of the files in worker processes. With a text cache, the
+    files are extracted once and the next runs only read the cached texts.
+    @return {file path: text} and {file path: error message} of the files
+     that failed
+    """
+    file_paths = list(file_paths)
+    if text_cache_path is not None:
+        os.makedirs(text_cache_path, exist_ok=True)
+    corpus_texts = {}
+    errors = {}
+    processes = processes or os.cpu_count()
+    with concurrent.futures.ProcessPoolExecutor(processes) as executor:
+        for file_path, (text, error) in zip(file_paths, executor.map(
+                load_text, file_paths, itertools.repeat(parser_name), itertools.repeat(text_cache_path),
+                chunksize=max(len(file_paths) // (4 * processes), 1))):
+            if error is not None:
+                errors[file_path] = error
+            elif text is not None:
+                corpus_texts[file_path] = text
+    return corpus_texts, errors
+
+def detect_bank(text, confs):
+    """ Return the bank-name of the first conf whose bank-pattern is found in the text, None if any"""
+    for conf_id, conf in confs:
+        if 'bank-name' in conf and 'bank-pattern' in conf and aggregate.search(conf['bank-pattern'], text):
+            return conf['bank-name']
+    return None
+
+def to_json_value(value):
+    if isinstance(value, (list, tuple)):
+        return [to_json_value(item) for item in value]
+    return value.isoformat() if hasattr(value, 'isoformat') else value
+
+def evaluate_pattern(pattern, file_paths):
+    """
+    Apply the pattern (or list of patterns) to the texts of the files, like
+    aggregate.py --test.
+    @return [{'file', 'match', 'values': all the matches, 'time'}]
+    """
+    results = []
+    for file_path in file_paths:
+        start = time.perf_counter()
+        values = aggregate.findall(pattern, texts[file_path])
+        results.append({'file': str(file_path), 'match': bool(values), 'values': values or [],
+                        'time': time.perf_counter() - start})
+    return results
+
+def evaluate_conf(conf, file_paths):
+    """
+    Match the conf against the texts of the files and parse the ones it
+    matches, like aggregate.build_accounts().
+    @return [{'file', 'match', 'values': {'account', 'balance', 'operation',
+     'date', 'transactions'}, 'time'}]
+    """
+    results = []
+    for file_path in file_paths:
+        text = texts[file_path]
+        start = time.perf_counter()
+        match = aggregate.is_valid_conf(conf, file_path, 0, parse=lambda *args: text)
+        values = {}
+        if match:
+            data = aggregate.parse_bank_extract(text, conf)
+            values = {key: to_json_value(data[key]) for key in ['account', 'balance', 'operation', 'date']
+                      if key in data}
+            if 'transactions' in data:
+                values['transactions'] = [to_json_value(transaction) for transaction in data['transactions']]
+        results.append({'file': str(file_path), 'match': match, 'values': values,
+                        'time': time.perf_counter() - start})
+    return results
+
+class Workbench:
+    """
+    Corpus of extracted texts kept in worker processes, to evaluate patterns
+    and confs on all the documents in parallel, again and again while they
+    are edited, without extracting nor sending the texts again.
+    """
+    def __init__(self, corpus_texts, processes=None):
+        """
+        @param processes number of worker processes, one per core if None.
+         With 1, the evaluations are done in this process.
+        """
+        self.file_paths = list(corpus_texts.keys())
+        self.processes = processes or os.cpu_count()
+        self.executor = None
+        if self.processes > 1:
+            self.executor = concurrent.futures.ProcessPoolExecutor(
+                self.processes, initializer=set_texts, initargs=(corpus_texts,))
+        else:
+            set_texts(corpus_texts)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown()
+
+    def evaluate(self, function, argument):
+        """ Return the results of function(argument, file paths) on all the files, in file order"""
+        if self.executor is None:
+            return function(argument, self.file_paths)
+        chunk_size = max(len(self.file_paths) // (4 * self.processes), 1)
+        chunks = [self.file_paths[index:index + chunk_size] for index in range(0, len(self.file_paths), chunk_size)]
+        return list(itertools.chain.from_iterable(
+            self.executor.map(function, itertools.repeat(argument), chunks)))
+
+    def evaluate_pattern(self, pattern):
+        """ See evaluate_pattern()"""
+        return self.evaluate(evaluate_pattern, pattern)
+
+    def evaluate_conf(self, conf):
+        """ See evaluate_conf()"""
+        return self.evaluate(evaluate_conf, conf)
+
+def summarize(results, banks=None):
+    """
+    Return the number of matches and misses and the total, mean and max match
+    times of the results, and per bank if banks ({file path: bank name}) is given.
+    """
+    def summary(group_results):
+        times = [result['time'] for result in group_results]
+        return {'documents': len(group_results),
+                'matches': sum(1 for result in group_results if result['match']),
+                'misses': sum(1 for result in group_results if not result['match']),
+                'time': sum(times), 'mean-time': statistics.mean(times) if times else 0,
+                'max-time': max(times, default=0)}
+    summaries = {'all': summary(results)}
+    if banks is not None:
+        bank_results = collections.defaultdict(list)
+        for result in results:
+            bank_results[banks.get(result['file']) or '?'].append(result)
+        summaries['banks'] = {bank: summary(group_results) for bank, group_results in sorted(bank_results.items())}
+    return summaries
+
+def print_report(results, summaries, verbose=0, output=sys.stdout):
+    if verbose > 0:
+        for result in results:
+            print('{} {:8.2f}ms {} {}'.format('+' if result['match'] else '-', result['time'] * 1000,
+                                              result['file'], result['values'] if result['match'] else ''),
+                  file=output)
+    for name, summary in [('all', summaries['all'])] + list(summaries.get('banks', {}).items()):
+        print('{:24} {:6} documents {:6} matches {:6} misses {:8.3f}s (mean {:.2f}ms, max {:.2f}ms)'.format(
+            name, summary['documents'], summary['matches'], summary['misses'], summary['time'],
+            summary['mean-time'] * 1000, summary['max-time'] * 1000), file=output)
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Evaluate a pattern or a conf on the extracted texts of all the pdf"
+                                     " files of a folder, to author confs")
+    parser.add_argument("file_or_folder", help="a folder or a zip/tar archive containing pdf files")
+    parser.add_argument("-c", "--confs", help="folder to find conf files",
+                        default=os.path.join(os.path.dirname(os.path.realpath(__file__)), "..", "confs"))
+    parser.add_argument("-v", "--verbose", action="count", default=0,
+                        help="print the result of each document")
+    parser.add_argument("--pattern", help="regular expression to evaluate (do not double backslash '\\' here)")
+    parser.add_argument("--conf", help="id of the conf to evaluate, e.g. bplc.json#Checking-monthly")
+    parser.add_argument("--interactive", action="store_true",
+                        help="keep the texts loaded and read the patterns (or @conf ids, read again from the conf"
+                        " files) to evaluate from the standard input")
+    parser.add_argument("--parser", help="parser of the texts, the parser of --conf or pdfplumber by default")
+    parser.add_argument("--by-bank", action="store_true",
+                        help="group the results by bank detected with the bank-pattern of the confs")
+    parser.add_argument("--text-cache",
+                        help="folder where the extracted texts are cached."
+                        " Defaults to the input folder with a .texts extension")
+    parser.add_argument("--processes", type=int, help="number of worker processes, one per core by default")
+    parser.add_argument("--include", action='append', default=[],
+                        help="only evaluate the files matching the glob pattern")
+    parser.add_argument("--exclude", action='append', default=[],
+                        help="skip the files and folders matching the glob pattern")
+    parser.add_argument("-o", "--output", help="json file to write the results of each document")
+    args = parser.parse_args()
+
+    def get_conf(conf_id):
+        return dict(aggregate.get_confs(args.confs, reload=True))[conf_id]
+
+    parser_name = args.parser or (aggregate.get_parser_name(get_conf(args.conf)) if args.conf else None) \
+        or 'pdfplumber'
+    text_cache_path = args.text_cache or os.path.normpath(args.file_or_folder) + '.texts'
+    start = time.perf_counter()
+    corpus_texts, errors = load_texts(
+        discovery.unique_files(discovery.iter_files(args.file_or_folder, include=args.include,
+                                                    exclude=args.exclude)),
+        parser_name, text_cache_path, args.processes)
+    print(len(corpus_texts), 'texts loaded in {:.2f}s,'.format(time.perf_counter() - start), len(errors), 'errors')
+    banks = None
+    if args.by_bank:
+        confs = aggregate.get_confs(args.confs)
+        banks = {str(file_path): detect_bank(text, confs) for file_path, text in corpus_texts.items()}
+
+    def run(workbench, pattern=None, conf_id=None):
+        start = time.perf_counter()
+        if conf_id is not None:
+            results = workbench.evaluate_conf(get_conf(conf_id))
+        else:
+            results = workbench.evaluate_pattern(unicodedata.normalize("NFKD", pattern))
+        summaries = summarize(results, banks)
+        print_report(results, summaries, args.verbose)
+        print('evaluated in {:.2f}s'.format(time.perf_counter() - start))
+        if args.output:
+            with open(args.output, 'w', encoding='utf-8') as output_file:
+                json.dump({'summary': summaries, 'results': results, 'errors': errors}, output_file, indent=2)
+
+    with Workbench(corpus_texts, args.processes) as workbench:
+        if args.pattern or args.conf:
+            run(workbench, args.pattern, args.conf)
+        if args.interactive:
+            last_line = None
+            for line in sys.stdin:
+                line = line.rstrip('\n') or last_line
+                if not line:
+                    continue
+                last_line = line
+                try:
+                    if line.startswith('@'):
+                        run(workbench, conf_id=line[1:])
+                    else:
+                        run(workbench, pattern=line)
+                except Exception as e:
+                    print(e)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -23,7 +23,8 @@ setuptools.setup(
     entry_points={
         'console_scripts': [
             'pdf-aggregator = aggregator.aggregate:main',
-            'pdf-plot = aggregator.plot:main'
+            'pdf-plot = aggregator.plot:main',
+            'pdf-query = aggregator.query:main'
         ]
     },
     python_requires='>=3.6',
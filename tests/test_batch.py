@@ -0,0 +1,57 @@
+import json
+import os
+import shutil
+
+from aggregator import aggregate
+from aggregator import batch
+
+def test_interleave():
+    assert list(batch.interleave([iter('ab'), iter(''), iter('cde')])) == \
+        [(0, 'a'), (2, 'c'), (0, 'b'), (2, 'd'), (2, 'e')]
+
+def test_aggregate_households(tmp_path):
+    dir_path = os.path.dirname(os.path.realpath(__file__))
+    data_path = os.path.join(dir_path, 'data')
+    confs_path = os.path.join(data_path, 'confs')
+    (tmp_path / 'small').mkdir()
+    shutil.copy(os.path.join(data_path, '20150910-BPLC-31512345678.pdf'), tmp_path / 'small')
+    (tmp_path / 'empty').mkdir()
+    with open(tmp_path / 'manifest.json', 'w', encoding='utf-8') as manifest_file:
+        json.dump([{'input': data_path, 'output': 'large.json', 'confs': confs_path},
+                   {'input': 'small', 'output': 'small.json'},
+                   {'input': 'empty', 'output': 'empty.json'}], manifest_file)
+    households = batch.read_manifest(str(tmp_path / 'manifest.json'), confs_path)
+    assert households[1] == {'input': str(tmp_path / 'small'), 'output': str(tmp_path / 'small.json'),
+                             'confs': confs_path}
+
+    results = {household['output']: (accounts, failures)
+               for household, accounts, failures in batch.aggregate_households(households, processes=2)}
+    assert results[str(tmp_path / 'large.json')] == (aggregate.aggregate_pdfs(data_path, confs_path), [])
+    assert results[str(tmp_path / 'small.json')] == (aggregate.aggregate_pdfs(str(tmp_path / 'small'), confs_path), [])
+    assert results[str(tmp_path / 'empty.json')] == ({}, [])
+
+def test_aggregate_households_crash(tmp_path, monkeypatch):
+    dir_path = os.path.dirname(os.path.realpath(__file__))
+    data_path = os.path.join(dir_path, 'data')
+    confs_path = os.path.join(data_path, 'confs')
+    for name in ['first', 'second']:
+        (tmp_path / name).mkdir()
+        for file_name in ['20150910-BPLC-31512345678.pdf', '20151130-BPLC-31512345678.pdf']:
+            shutil.copy(os.path.join(data_path, file_name), tmp_path / name)
+    households = [{'input': str(tmp_path / name), 'output': name + '.json', 'confs': confs_path}
+                  for name in ['first', 'second']]
+    aggregate_pdf_isolated = aggregate.aggregate_pdf_isolated
+    def crash(file_path, *args):
+        # the workers are forked with this function
+        if 'first' in file_path and '1130' in file_path:
+            os._exit(1)
+        return aggregate_pdf_isolated(file_path, *args)
+    monkeypatch.setattr(aggregate, 'aggregate_pdf_isolated', crash)
+
+    results = {household['output']: (accounts, failures)
+               for household, accounts, failures in batch.aggregate_households(households, processes=2)}
+    # only the file that crashed its worker fails
+    accounts, failures = results['first.json']
+    assert [failure['file'] for failure in failures] == [str(tmp_path / 'first' / '20151130-BPLC-31512345678.pdf')]
+    assert len(accounts['BPLC-31512345678'].balances.to_dict()) == 1
+    assert results['second.json'] == (aggregate.aggregate_pdfs(str(tmp_path / 'second'), confs_path), [])
@@ -0,0 +1,38 @@
+import io
+import json
+
+from aggregator import benchmark
+from aggregator import compute
+from aggregator import synthetic
+
+def test_generate_accounts(tmp_path):
+    accounts = synthetic.generate_accounts(account_count=50, years=2, frequency='weekly',
+                                           operations=0.5, redirections=0.2, shares=0.5)
+    assert accounts == synthetic.generate_accounts(account_count=50, years=2, frequency='weekly',
+                                                   operations=0.5, redirections=0.2, shares=0.5)
+    assert len(accounts) == 50
+    redirections = [account for account in accounts.values() if isinstance(account['account'], str)]
+    assert 0 < len(redirections) < 50
+    assert all(account['account'] in accounts for account in redirections)
+    assert any('share' in account['account'] for account in accounts.values() if account not in redirections)
+    assert 0 < len([account for account in accounts.values() if 'operations' in account]) < 50
+    assert all(95 <= len(account.get('balances', account.get('operations'))) <= 110
+               for account in accounts.values())
+
+    accounts_path = tmp_path / 'accounts.json'
+    synthetic.write_accounts(accounts, accounts_path)
+    read_accounts = compute.readAccounts(accounts_path)
+    for account_id in read_accounts:
+        assert compute.get_account_balances(read_accounts, account_id)
+
+def test_run_benchmarks(tmp_path):
+    accounts_path = tmp_path / 'accounts.json'
+    synthetic.write_accounts(synthetic.generate_accounts(account_count=3, years=1), accounts_path)
+    timings = benchmark.run_benchmarks(accounts_path, repeat=2, plots=False)
+    assert list(timings.keys()) == ['readAccounts', 'get_account_balances', 'get_account_balances-yearly',
+                                    'get_accounts_balances', 'filter-group']
+    assert all(len(timing['runs']) == 2 and timing['min'] <= timing['mean'] for timing in timings.values())
+    results = json.loads(json.dumps({'timings': timings}))
+    output = io.StringIO()
+    benchmark.compare(results, results, output)
+    assert output.getvalue().count('1.00x') == 5
@@ -0,0 +1,91 @@
+import json
+import os
+import zipfile
+
+from aggregator import aggregate
+from aggregator import cluster
+from aggregator import discovery
+
+def test_claim_unit(tmp_path):
+    unit_names = cluster.create_job(str(tmp_path), ['a.pdf', 'b.pdf', 'c.pdf'], 'confs', unit_size=2)
+    assert unit_names == ['00000', '00001']
+    assert cluster.read_job(str(tmp_path))['units'] == unit_names
+    with open(cluster.get_unit_path(str(tmp_path), '00001'), encoding='utf-8') as unit_file:
+        assert json.load(unit_file) == ['c.pdf']
+    assert cluster.claim_unit(str(tmp_path), unit_names) == '00000'
+    assert cluster.claim_unit(str(tmp_path), unit_names) == '00001'
+    assert cluster.claim_unit(str(tmp_path), unit_names) is None
+
+    lease_stamps = {}
+    assert cluster.expire_leases(str(tmp_path), unit_names, lease_stamps, lease_timeout=0) == []
+    os.utime(cluster.get_lease_path(str(tmp_path), '00001'), ns=(0, 0))
+    # the lease of 00001 changed, the one of 00000 didn't
+    assert cluster.expire_leases(str(tmp_path), unit_names, lease_stamps, lease_timeout=0) == ['00000']
+    assert cluster.claim_unit(str(tmp_path), unit_names) == '00000'
+
+def test_coordinate(tmp_path):
+    dir_path = os.path.dirname(os.path.realpath(__file__))
+    data_path = os.path.join(dir_path, 'data')
+    confs_path = os.path.join(data_path, 'confs')
+    file_paths = list(discovery.iter_files(data_path))
+    work_folder = str(tmp_path / 'work')
+
+    failures = []
+    accounts = cluster.coordinate(work_folder, file_paths + ['missing.pdf'], confs_path, unit_size=2,
+                                  lease_timeout=1, workers=2, poll_interval=0.1, failures=failures)
+    assert [failure['file'] for failure in failures] == ['missing.pdf']
+    assert len(accounts['BPLC-31512345678'].balances.to_dict()) == 7
+    assert accounts == aggregate.aggregate_pdfs(data_path, confs_path)
+    assert os.path.exists(os.path.join(work_folder, cluster.done_file_name))
+
+def test_aggregate_pdfs_cluster_expired_lease(tmp_path):
+    dir_path = os.path.dirname(os.path.realpath(__file__))
+    data_path = os.path.join(dir_path, 'data')
+    confs_path = os.path.join(data_path, 'confs')
+    work_folder = str(tmp_path)
+
+    # simulate a worker that died after claiming the first unit
+    def create_job(*args):
+        unit_names = create_job_function(*args)
+        cluster.claim_unit(work_folder, unit_names[:1])
+        return unit_names
+    create_job_function = cluster.create_job
+    cluster.create_job = create_job
+    try:
+        accounts = cluster.aggregate_pdfs_cluster(data_path, work_folder, confs_path, unit_size=3,
+                                                  lease_timeout=1, workers=1, poll_interval=0.1)
+    finally:
+        cluster.create_job = create_job_function
+    assert accounts == aggregate.aggregate_pdfs(data_path, confs_path)
+
+def test_aggregate_pdfs_cluster_archive(tmp_path):
+    dir_path = os.path.dirname(os.path.realpath(__file__))
+    data_path = os.path.join(dir_path, 'data')
+    confs_path = os.path.join(data_path, 'confs')
+    archive_path = str(tmp_path / 'statements.zip')
+    with zipfile.ZipFile(archive_path, 'w') as archive:
+        for pdf_path in discovery.iter_files(data_path, include=['*.pdf']):
+            archive.write(pdf_path, os.path.basename(pdf_path))
+
+    failures = []
+    accounts = cluster.aggregate_pdfs_cluster(archive_path, str(tmp_path / 'work'), confs_path, unit_size=3,
+                                              workers=2, poll_interval=0.1, failures=failures)
+    assert failures == []
+    # the units store the members, not their contents
+    with open(cluster.get_unit_path(str(tmp_path / 'work'), '00000'), encoding='utf-8') as unit_file:
+        assert json.load(unit_file)[0] == [archive_path, '20150910-BPLC-31512345678.pdf']
+    assert accounts == aggregate.aggregate_pdfs(data_path, confs_path)
+
+def test_main_cluster_journal(tmp_path, monkeypatch):
+    import sys
+    dir_path = os.path.dirname(os.path.realpath(__file__))
+    data_path = os.path.join(dir_path, 'data')
+    journal_path = tmp_path / 'accounts.journal'
+    journal_path.write_text('{"file": "previous.pdf", "error": "kept"}\n')
+    monkeypatch.setattr(sys, 'argv', ['aggregate.py', data_path, '-c', os.path.join(data_path, 'confs'),
+                                      '-o', str(tmp_path / 'accounts.json'), '--cluster', str(tmp_path / 'work'),
+                                      '--workers', '1', '--quarantine', str(tmp_path / 'quarantine.json')])
+    aggregate.main()
+    # the journal of another run is neither truncated nor removed by a cluster run
+    assert journal_path.read_text() == '{"file": "previous.pdf", "error": "kept"}\n'
+    assert os.path.exists(tmp_path / 'accounts.json')
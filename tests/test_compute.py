@@ -0,0 +1,78 @@
+import datetime
+import os
+import subprocess
+import sys
+
+from aggregator import compute
+
+# seconds allowed to import the non graphical modules
+import_time_budget = 0.5
+
+def test_import_budget():
+    dir_path = os.path.dirname(os.path.realpath(__file__))
+    script = (
+        "import sys, time\n"
+        "start = time.perf_counter()\n"
+        "import aggregator.compute, aggregator.aggregate, aggregator.query\n"
+        "elapsed = time.perf_counter() - start\n"
+        "heavy = [m for m in ('matplotlib', 'mplcursors', 'scipy', 'numpy', 'dateutil') if m in sys.modules]\n"
+        "print(elapsed, ','.join(heavy))\n")
+    output = subprocess.run([sys.executable, "-c", script], cwd=os.path.join(dir_path, '..'),
+                            capture_output=True, text=True, check=True).stdout.split(' ')
+    assert output[1].strip() == ''
+    assert float(output[0]) < import_time_budget
+
+def test_get_accounts_balances():
+    dir_path = os.path.dirname(os.path.realpath(__file__))
+    accounts = compute.readAccounts(os.path.join(dir_path, 'data', 'test_plot_1.json'))
+    balances = compute.get_accounts_balances(accounts, accounts.keys())
+    assert len(balances) == 26
+    assert balances.keys()[0] == compute.datetime.datetime(2018, 11, 30)
+    assert balances[balances.keys()[-1]] == [1200, 900]
+
+def test_get_accounts_balances_range():
+    accounts = {}
+    for index in range(3):
+        balances = {datetime.datetime(2000, 1, 1) + datetime.timedelta(days=day): (day * (index + 1)) % 97
+                    for day in range(0, 3650, 30 + index * 7)}
+        accounts['account-{}'.format(index)] = {'account': {'account-type': 'saving'}, 'balances': balances}
+    start = datetime.datetime(2004, 3, 1)
+    end = datetime.datetime(2005, 3, 1)
+    full_balances = compute.get_accounts_balances(accounts, accounts.keys())
+    range_balances = compute.get_accounts_balances(accounts, accounts.keys(), start=start, end=end)
+    assert len(range_balances) < len(full_balances) / 5
+    for day, balances in range_balances.items():
+        assert [float(b) for b in balances] == [float(b) for b in full_balances[day]]
+    for account_id in accounts:
+        account_balances = compute.get_account_balances(accounts, account_id, start=start, end=end)
+        assert account_balances.keys()[0] < start and account_balances.keys()[-1] > end
+
+def test_account_index():
+    accounts = {
+        'account-1': {'account': {'account-type': 'saving', 'currency': '$'}},
+        'account-2': {'account': {'account-type': 'real-estate', 'share': 0.5}},
+        'account-3': {'account': 'account-1'},
+    }
+    for account_id in accounts:
+        assert compute.get_account_properties(accounts, account_id) == \
+            compute.resolve_account_properties(accounts, account_id)
+    index = compute.get_account_index(accounts)
+    assert index.redirections == {'account-3': 'account-1'}
+    filters = compute.parse_account_filters(['f-currency=$'])
+    assert list(compute.filter_accounts(accounts, filters)) == ['account-2', 'account-3']
+    assert compute.filter_accounts(accounts, filters) is compute.filter_accounts(accounts, filters)
+    assert list(compute.group_accounts(accounts)) == ['saving', 'real-estate', 'other']
+
+    accounts['account-2']['balances'] = {datetime.datetime(2020, 1, 1): 100, datetime.datetime(2021, 1, 1): 200}
+    accounts['account-2']['operations'] = {datetime.datetime(2020, 1, 1): 10, datetime.datetime(2021, 1, 1): 20}
+    assert list(compute.get_account_balances(accounts, 'account-2').values()) == [50, 100]
+    compute.set_account_input_types({'real-estate': 'operations'})
+    try:
+        assert compute.get_account_index(accounts) is not index
+        assert compute.get_account_properties(accounts, 'account-2')['input'] == 'operations'
+        # the balances cached with the previous input are not returned
+        assert list(compute.get_account_balances(accounts, 'account-2').values()) == [5, 15]
+    finally:
+        compute.all_account_types['real-estate']['account'].pop('input')
+        compute.account_types_version += 1
+        compute.get_account_balances.cache_clear()
@@ -0,0 +1,70 @@
+import datetime
+import json
+
+import pytest
+from sortedcontainers import SortedDict
+
+from aggregator import compute
+from aggregator import currency
+from aggregator import plot
+
+def write_rates(tmp_path):
+    csv_path = tmp_path / 'rates.csv'
+    with open(csv_path, 'w', encoding='utf-8') as csv_file:
+        csv_file.write('Date,USD,GBP,\n2020-01-02,1.1,0.8,\n2020-01-06,1.2,N/A,\n2020-02-03,1.25,0.85,\n')
+    json_path = tmp_path / 'rates.json'
+    with open(json_path, 'w', encoding='utf-8') as json_file:
+        json.dump({'base': '€', 'rates': {'JPY': {'2020-01-02': 120}}}, json_file)
+    return [str(csv_path), str(json_path)]
+
+def test_rates(tmp_path):
+    rates = currency.read_rates(write_rates(tmp_path))
+    assert sorted(rates.tables) == ['GBP', 'JPY', 'USD']
+    days = currency.to_ordinals([datetime.date(2019, 12, 31), datetime.date(2020, 1, 2), datetime.date(2020, 1, 5),
+                                 datetime.date(2020, 1, 6), datetime.date(2020, 3, 1)])
+    assert rates.get_rates('$', days).tolist() == [1.1, 1.1, 1.1, 1.2, 1.25]
+    assert rates.get_rates('GBP', days).tolist() == [0.8, 0.8, 0.8, 0.8, 0.85]
+    assert rates.get_rates('EUR', days).tolist() == [1] * 5
+
+    balances = SortedDict({datetime.datetime(2020, 1, 3): 110, datetime.datetime(2020, 2, 10): 125})
+    assert list(rates.convert(balances, '$', '€').items()) == [(datetime.datetime(2020, 1, 3), pytest.approx(100)),
+                                                              (datetime.datetime(2020, 2, 10), pytest.approx(100))]
+    assert rates.convert(balances, '€', '€') is balances
+    converted = rates.convert(balances, 'USD', 'GBP')
+    assert converted[datetime.datetime(2020, 1, 3)] == pytest.approx(80)
+
+def test_get_account_balances_currency(tmp_path):
+    accounts = {
+        'euro': {'account': {'currency': '€', 'account-type': 'checking'},
+                 'balances': {datetime.datetime(2020, 1, 3): 100, datetime.datetime(2020, 2, 10): 200}},
+        'dollar': {'account': {'currency': '$', 'account-type': 'checking', 'share': 0.5},
+                   'balances': {datetime.datetime(2020, 1, 3): 220, datetime.datetime(2020, 2, 10): 250}},
+    }
+    try:
+        compute.set_currency('€', currency.read_rates(write_rates(tmp_path)))
+        assert list(compute.get_account_balances(accounts, 'dollar').values()) == pytest.approx([100, 100])
+        assert list(compute.get_account_balances(accounts, 'euro').values()) == pytest.approx([100, 200])
+        assert list(compute.get_account_balances(accounts, 'euro', currency='$').values()) == pytest.approx([110, 250])
+        total_balances = compute.get_accounts_balances(accounts, ['euro', 'dollar'])
+        assert [sum(balances) for balances in total_balances.values()] == pytest.approx([200, 300])
+        # converted series are cached
+        assert compute.get_account_balances(accounts, 'dollar') is compute.get_account_balances(accounts, 'dollar')
+        assert compute.get_currency_fingerprint()[0] == 'EUR'
+        compute.set_currency('$', compute.currency_rates)
+        assert plot.get_accounts_figure(accounts, total=True)['messages'][0].endswith('$ on 2020-02-10 00:00:00')
+    finally:
+        compute.set_currency(None)
+    assert list(compute.get_account_balances(accounts, 'dollar').values()) == pytest.approx([110, 125])
+    assert compute.get_currency_fingerprint() is None
+    assert plot.get_accounts_figure(accounts, total=True)['messages'][0] == 'Total of 325.00€ on 2020-02-10 00:00:00'
+    # no conversion without rates
+    with pytest.raises(ValueError):
+        compute.get_account_balances(accounts, 'dollar', currency='€')
+    assert list(compute.get_account_balances(accounts, 'dollar', currency='$').values()) == pytest.approx([110, 125])
+
+def test_rates_digest(tmp_path):
+    rates = currency.read_rates(write_rates(tmp_path))
+    digest = rates.get_digest()
+    assert currency.read_rates(write_rates(tmp_path)).get_digest() == digest
+    rates.update('USD', {datetime.date(2020, 3, 2): 1.2})
+    assert rates.get_digest() != digest
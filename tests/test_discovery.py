@@ -0,0 +1,99 @@
+import itertools
+import os
+import shutil
+import tarfile
+import zipfile
+
+from aggregator import aggregate
+from aggregator import discovery
+
+def copy_test_pdfs(folder):
+    dir_path = os.path.dirname(os.path.realpath(__file__))
+    pdf_paths = []
+    for file_name in sorted(os.listdir(os.path.join(dir_path, 'data'))):
+        if file_name.endswith('.pdf'):
+            pdf_paths.append(shutil.copy(os.path.join(dir_path, 'data', file_name), folder))
+    return pdf_paths
+
+def test_group_duplicates(tmp_path):
+    pdf_paths = copy_test_pdfs(tmp_path)
+    copy_1 = shutil.copy(pdf_paths[0], tmp_path / 'copy-1.pdf')
+    copy_2 = shutil.copy(pdf_paths[0], tmp_path / 'copy-2.pdf')
+    empty_paths = [tmp_path / 'empty-1.pdf', tmp_path / 'empty-2.pdf']
+    for empty_path in empty_paths:
+        empty_path.touch()
+    groups = discovery.group_duplicates(pdf_paths + [copy_1, copy_2] + empty_paths)
+    assert list(groups.keys()) == pdf_paths + [empty_paths[0]]
+    assert groups[pdf_paths[0]] == [copy_1, copy_2]
+    assert groups[empty_paths[0]] == [empty_paths[1]]
+    assert discovery.hash_file(copy_1) == discovery.hash_file(pdf_paths[0])
+
+def test_aggregate_pdfs_duplicates(tmp_path):
+    dir_path = os.path.dirname(os.path.realpath(__file__))
+    pdf_paths = copy_test_pdfs(tmp_path)
+    copy = shutil.copy(pdf_paths[1], tmp_path / 'copy.pdf')
+    duplicates = {}
+    accounts = aggregate.aggregate_pdfs(str(tmp_path), os.path.join(dir_path, 'data', 'confs'),
+                                        duplicates=duplicates)
+    assert len(accounts['BPLC-31512345678'].balances.to_dict()) == 7
+    assert list(duplicates.values()) == [[str(copy)]]
+
+def test_iter_files(tmp_path):
+    for relative_path in ['a.pdf', 'b.PDF', 'c.json', 'scans/d.pdf', '2021/e.pdf', '2021/drafts/f.pdf', '2022/g.pdf']:
+        (tmp_path / relative_path).parent.mkdir(parents=True, exist_ok=True)
+        (tmp_path / relative_path).touch()
+    (tmp_path / '2021' / discovery.ignore_file_name).write_text('# comment\ndrafts\n')
+
+    def relative_paths(*args, **kwargs):
+        return [os.path.relpath(file_path, tmp_path).replace(os.sep, '/')
+                for file_path in discovery.iter_files(str(tmp_path), *args, **kwargs)]
+
+    assert relative_paths() == ['a.pdf', 'b.PDF', '2021/e.pdf', '2022/g.pdf', 'scans/d.pdf']
+    assert relative_paths(exclude=['scans', 'a.*']) == ['b.PDF', '2021/e.pdf', '2022/g.pdf']
+    assert relative_paths(include=['2021/*', '*/g.pdf']) == ['2021/e.pdf', '2022/g.pdf']
+    assert relative_paths(extensions=None, include=['*.json']) == ['c.json']
+
+def test_aggregate_archives(tmp_path):
+    dir_path = os.path.dirname(os.path.realpath(__file__))
+    pdf_paths = copy_test_pdfs(tmp_path)
+    with zipfile.ZipFile(tmp_path / 'statements.zip', 'w') as archive:
+        for pdf_path in pdf_paths[:4]:
+            archive.write(pdf_path, '2015/' + os.path.basename(pdf_path))
+    with tarfile.open(tmp_path / 'statements.tar.gz', 'w:gz') as archive:
+        for pdf_path in pdf_paths[3:]:
+            archive.add(pdf_path, os.path.basename(pdf_path))
+    archives_path = tmp_path / 'archives'
+    archives_path.mkdir()
+    shutil.move(tmp_path / 'statements.zip', archives_path)
+    shutil.move(tmp_path / 'statements.tar.gz', archives_path)
+
+    members = list(discovery.iter_files(str(archives_path)))
+    assert [os.path.basename(member.member_name) for member in members] == [
+        os.path.basename(pdf_path) for pdf_path in pdf_paths[3:] + pdf_paths[:4]]
+    assert members[4] == str(archives_path / 'statements.zip') + '::2015/' + os.path.basename(pdf_paths[0])
+    assert members[4].digest == discovery.hash_file(pdf_paths[0])
+    assert list(discovery.iter_files(str(archives_path / 'statements.zip'), exclude=['2015/*0930*'])) == \
+        members[4:5] + members[6:]
+
+    duplicates = {}
+    confs_path = os.path.join(dir_path, 'data', 'confs')
+    accounts = aggregate.aggregate_pdfs(str(archives_path), confs_path, duplicates=duplicates)
+    assert len(accounts['BPLC-31512345678'].balances.to_dict()) == 7
+    assert list(duplicates.values()) == [[members[7]]]
+    assert accounts == aggregate.aggregate_pdfs(str(archives_path), confs_path, isolate=True)
+    accounts = aggregate.aggregate_pdfs(str(archives_path / 'statements.zip'), confs_path)
+    assert len(accounts['BPLC-31512345678'].balances.to_dict()) == 4
+
+def test_unique_files_memory():
+    import gc
+    def iter_members():
+        for index in range(10):
+            yield discovery.ArchiveMember('archive.zip', '{}.pdf'.format(index), b'%PDF' * (index + 1))
+    duplicates = {}
+    unique_members = discovery.unique_files(itertools.chain(iter_members(), iter_members()), duplicates)
+    for member in unique_members:
+        pass
+    del member
+    # the contents of the yielded members are not kept
+    assert not [obj for obj in gc.get_objects() if isinstance(obj, discovery.ArchiveMember)]
+    assert len(duplicates) == 10 and duplicates['archive.zip::0.pdf'] == ['archive.zip::0.pdf']
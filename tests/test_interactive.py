@@ -0,0 +1,60 @@
+import types
+
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+import numpy
+
+from aggregator import interactive
+
+def create_figure(count=60, points=7000):
+    fig = plt.figure()
+    x = numpy.arange(points)
+    plots = []
+    for index in range(count):
+        plots += plt.plot(x, numpy.sin(x / 500 + index) * 1000 + index * 100, label='account-{}'.format(index))
+    legend = plt.legend()
+    fig.canvas.draw()
+    return fig, legend, plots
+
+def test_pick():
+    fig, legend, plots = create_figure()
+    controller = interactive.setup_picking(fig, legend, plots)
+    draws = []
+    fig.canvas.mpl_connect('draw_event', lambda event: draws.append(event))
+    legend_line = legend.get_lines()[3]
+    pick = types.SimpleNamespace(artist=legend_line)
+
+    drawn = []
+    draw_artist = controller.ax.draw_artist
+    controller.ax.draw_artist = lambda artist: drawn.append(artist) or draw_artist(artist)
+
+    controller.on_pick(pick)
+    assert len(draws) == 1  # background is cached
+    assert plots[3].get_linewidth() == 4
+    # only the picked plot and its legend handle are drawn over the background
+    assert drawn == [plots[3], legend_line]
+    del drawn[:]
+    controller.on_pick(pick)
+    assert len(draws) == 1
+    assert drawn == [legend_line]
+    assert not plots[3].get_visible()
+    assert legend_line.get_alpha() == 0.2
+    controller.on_pick(pick)
+    assert plots[3].get_visible() and plots[3].get_linewidth() == 1
+    # picking another plot draws the background again, once
+    other_pick = types.SimpleNamespace(artist=legend.get_lines()[5])
+    controller.on_pick(other_pick)
+    controller.on_pick(other_pick)
+    assert len(draws) == 2
+    assert controller.active == {legend.get_lines()[5]}
+    plt.close(fig)
+
+def test_cursor():
+    fig, legend, plots = create_figure(3, 100)
+    controller = interactive.setup_picking(fig, legend, plots)
+    x, y = fig.axes[0].transData.transform((50.5, plots[1].get_ydata()[50]))
+    assert controller.pick_artist(x, y) is plots[1]
+    plots[1].set_visible(False)
+    assert controller.pick_artist(x, y) is None
+    plt.close(fig)
@@ -0,0 +1,62 @@
+import os
+import time
+
+from aggregator import aggregate
+from aggregator import isolation
+
+def sleep(duration):
+    time.sleep(duration)
+    return duration
+
+def allocate(size):
+    return len(bytearray(size * 1024 * 1024))
+
+def test_isolated_map_timeout():
+    results = list(isolation.isolated_map(sleep, [(0,), (5,), (0.1,)], timeout=1, processes=2))
+    assert [args for args, result, error in results] == [(0,), (5,), (0.1,)]
+    assert results[0][1:] == (0, None)
+    assert isinstance(results[1][2], isolation.DocumentTimeout)
+    assert results[2][1:] == (0.1, None)
+
+def exit_worker(code):
+    os._exit(code)
+
+def test_isolated_map_watchdog(monkeypatch):
+    # without SIGALRM (e.g. on Windows) the parent terminates the worker
+    monkeypatch.setattr(isolation, 'has_alarm', False)
+    results = list(isolation.isolated_map(sleep, [(0,), (5,), (0.1,)], timeout=1, processes=2))
+    assert results[0][1:] == (0, None)
+    assert isinstance(results[1][2], isolation.DocumentTimeout)
+    assert results[2][1:] == (0.1, None)
+
+def test_isolated_map_lost_worker():
+    # a worker that dies (e.g. killed when out of memory) is not waited forever, even without timeout
+    results = list(isolation.isolated_map(exit_worker, [(1,)], processes=1))
+    assert isinstance(results[0][2], isolation.DocumentTimeout)
+    results = list(isolation.isolated_map(sleep, [(0,), (0,), (0,)], processes=1, tasks_per_child=1))
+    assert [result for args, result, error in results] == [0, 0, 0]
+
+def test_isolated_map_memory():
+    results = list(isolation.isolated_map(allocate, [(1,), (4096,)], max_memory=1024, processes=1))
+    assert results[0][1:] == (1024 * 1024, None)
+    assert isinstance(results[1][2], MemoryError)
+
+def test_aggregate_pdfs_isolated():
+    dir_path = os.path.dirname(os.path.realpath(__file__))
+    quarantine = []
+    accounts = aggregate.aggregate_pdfs(os.path.join(dir_path, 'data'), os.path.join(dir_path, 'data', 'confs'),
+                                        isolate=True, timeout=60, quarantine=quarantine)
+    assert quarantine == []
+    assert len(accounts['BPLC-31512345678'].balances.to_dict()) == 7
+
+def test_isolated_map_lazy():
+    read = []
+    def iter_args():
+        for index in range(20):
+            read.append(index)
+            yield (0,)
+    results = isolation.isolated_map(sleep, iter_args(), processes=2)
+    assert next(results) == ((0,), 0, None)
+    # the tasks are submitted through a window of 2 tasks per worker
+    assert len(read) <= 5
+    assert len(list(results)) == 19 and len(read) == 20
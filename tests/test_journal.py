@@ -0,0 +1,156 @@
+import itertools
+import json
+import os
+import shutil
+
+from aggregator import aggregate
+from aggregator import discovery
+from aggregator import journal
+
+def test_journal_resume(tmp_path, monkeypatch):
+    dir_path = os.path.dirname(os.path.realpath(__file__))
+    confs_path = os.path.join(dir_path, 'data', 'confs')
+    journal_path = str(tmp_path / 'accounts.journal')
+    accounts = aggregate.aggregate_pdfs(os.path.join(dir_path, 'data'), confs_path)
+
+    with journal.Journal(journal_path) as aggregation_journal:
+        assert aggregate.aggregate_pdfs(os.path.join(dir_path, 'data'), confs_path,
+                                        journal=aggregation_journal) == accounts
+    documents = journal.read_journal(journal_path)
+    assert len(documents) == 7
+    # interrupted run: 3 complete entries and an incomplete one
+    with open(journal_path) as journal_file:
+        lines = journal_file.readlines()
+    with open(journal_path, 'w') as journal_file:
+        # conf fingerprints and 3 documents
+        journal_file.writelines(lines[:4] + [lines[4][:20]])
+
+    aggregated = []
+    aggregate_pdf = aggregate.aggregate_pdf
+    monkeypatch.setattr(aggregate, 'aggregate_pdf', lambda *args, **kwargs: aggregated.append(args[0])
+                        or aggregate_pdf(*args, **kwargs))
+    with journal.Journal(journal_path, resume=True) as aggregation_journal:
+        assert len(aggregation_journal.documents) == 3
+        assert aggregate.aggregate_pdfs(os.path.join(dir_path, 'data'), confs_path,
+                                        journal=aggregation_journal) == accounts
+    assert sorted(aggregated) == sorted(list(documents)[3:])
+    assert journal.read_journal(journal_path) == documents
+
+def test_journal_errors(tmp_path):
+    dir_path = os.path.dirname(os.path.realpath(__file__))
+    shutil.copy(os.path.join(dir_path, 'data', '20151130-BPLC-31512345678.pdf'), tmp_path)
+    (tmp_path / 'broken.pdf').write_bytes(b'%PDF-1.4 broken')
+    journal_path = str(tmp_path / 'accounts.journal')
+    with journal.Journal(journal_path, sync_interval=0) as aggregation_journal:
+        accounts = aggregate.aggregate_pdfs(str(tmp_path), os.path.join(dir_path, 'data', 'confs'),
+                                            journal=aggregation_journal)
+    assert len(accounts['BPLC-31512345678'].balances.to_dict()) == 1
+    with open(journal_path) as journal_file:
+        assert '"error"' in journal_file.readlines()[2]
+    assert list(journal.read_journal(journal_path)) == [str(tmp_path / '20151130-BPLC-31512345678.pdf')]
+
+def test_journal_conf_changes(tmp_path, monkeypatch):
+    dir_path = os.path.dirname(os.path.realpath(__file__))
+    with open(os.path.join(dir_path, 'data', 'confs', 'bplc.json'), encoding='utf-8') as conf_file:
+        confs = json.load(conf_file)
+    confs_paths = [tmp_path / 'confs-1', tmp_path / 'confs-2', tmp_path / 'confs-3']
+    for confs_path in confs_paths:
+        confs_path.mkdir()
+    shutil.copy(os.path.join(dir_path, 'data', 'confs', 'bplc.json'), confs_paths[0])
+    # fix a conf
+    confs['Checking-monthly']['currency'] = 'EUR'
+    with open(confs_paths[1] / 'bplc.json', 'w', encoding='utf-8') as conf_file:
+        json.dump(confs, conf_file)
+    # add a conf
+    shutil.copy(confs_paths[1] / 'bplc.json', confs_paths[2])
+    with open(confs_paths[2] / 'other.json', 'w', encoding='utf-8') as conf_file:
+        json.dump({'Other': {'bank-name': 'OTHER', 'bank-pattern': 'OTHER BANK'}}, conf_file)
+
+    extracted = []
+    file_to_pdf = aggregate.file_to_pdf
+    monkeypatch.setattr(aggregate, 'file_to_pdf', lambda *args: extracted.append(args) or file_to_pdf(*args))
+    aggregated = []
+    aggregate_pdf = aggregate.aggregate_pdf
+    monkeypatch.setattr(aggregate, 'aggregate_pdf', lambda *args, **kwargs: aggregated.append(args[0])
+                        or aggregate_pdf(*args, **kwargs))
+    monkeypatch.setattr(aggregate, 'text_cache_path', None)
+    aggregate.set_text_cache(str(tmp_path / 'texts'))
+
+    journal_path = str(tmp_path / 'accounts.journal')
+    for confs_path, currency, aggregated_count in zip(confs_paths, ['€', 'EUR', 'EUR'], [7, 7, 0]):
+        # new run
+        aggregate.parse_pdf_internal.cache_clear()
+        del extracted[:], aggregated[:]
+        with journal.Journal(journal_path, resume=True) as aggregation_journal:
+            accounts = aggregate.aggregate_pdfs(os.path.join(dir_path, 'data'), str(confs_path),
+                                                journal=aggregation_journal)
+        assert accounts['BPLC-31512345678'].properties['currency'] == currency
+        assert len(accounts['BPLC-31512345678'].balances.to_dict()) == 7
+        assert len(aggregated) == aggregated_count
+        assert len(extracted) == (7 if confs_path == confs_paths[0] else 0)
+    assert set(journal.read_journal(journal_path)) == set(aggregation_journal.documents)
+    assert list(aggregation_journal.tracking.values())[0] == (['bplc.json#Checking-monthly'],
+                                                              aggregation_journal.confs_digest)
+
+def test_journal_removed_and_replaced_files(tmp_path, monkeypatch):
+    dir_path = os.path.dirname(os.path.realpath(__file__))
+    confs_path = os.path.join(dir_path, 'data', 'confs')
+    data_path = tmp_path / 'data'
+    data_path.mkdir()
+    file_names = ['20150910-BPLC-31512345678.pdf', '20151130-BPLC-31512345678.pdf']
+    for file_name in file_names:
+        shutil.copy(os.path.join(dir_path, 'data', file_name), data_path)
+    journal_path = str(tmp_path / 'accounts.journal')
+
+    def aggregate_pdfs(**kwargs):
+        with journal.Journal(journal_path, resume=True) as aggregation_journal:
+            return aggregate.aggregate_pdfs(str(data_path), confs_path, journal=aggregation_journal, **kwargs)
+    accounts = aggregate_pdfs()
+    assert len(accounts['BPLC-31512345678'].balances.to_dict()) == 2
+    # excluded files are left out of the output, but kept in the journal
+    accounts = aggregate_pdfs(exclude=['*1130*'])
+    assert len(accounts['BPLC-31512345678'].balances.to_dict()) == 1
+    assert len(journal.read_journal(journal_path)) == 2
+
+    aggregated = []
+    aggregate_pdf = aggregate.aggregate_pdf
+    monkeypatch.setattr(aggregate, 'aggregate_pdf', lambda *args, **kwargs: aggregated.append(args[0])
+                        or aggregate_pdf(*args, **kwargs))
+    # a file replaced at the same path is aggregated again
+    shutil.copy(os.path.join(dir_path, 'data', '20160104-BPLC-31512345678.pdf'), data_path / file_names[0])
+    os.remove(data_path / file_names[1])
+    accounts = aggregate_pdfs()
+    assert aggregated == [str(data_path / file_names[0])]
+    assert list(accounts['BPLC-31512345678'].balances.to_dict()) == list(
+        aggregate.aggregate_pdf(os.path.join(dir_path, 'data', '20160104-BPLC-31512345678.pdf'), confs_path)
+        ['BPLC-31512345678'].balances.to_dict())
+
+def test_journal_threads(tmp_path):
+    import threading
+    dir_path = os.path.dirname(os.path.realpath(__file__))
+    file_path = os.path.join(dir_path, 'data', '20150910-BPLC-31512345678.pdf')
+    pdf_accounts = aggregate.aggregate_pdf(file_path, os.path.join(dir_path, 'data', 'confs'))
+    journal_path = str(tmp_path / 'accounts.journal')
+    with journal.Journal(journal_path, sync_interval=0) as aggregation_journal:
+        def record(thread_index):
+            for index in range(50):
+                aggregation_journal.record('{}-{}.pdf'.format(thread_index, index), pdf_accounts)
+        aggregation_journal.found = {'{}-{}.pdf'.format(thread_index, index): None
+                                     for thread_index in range(4) for index in range(50)}
+        threads = [threading.Thread(target=record, args=(thread_index,)) for thread_index in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    assert len(journal.read_journal(journal_path)) == 200
+
+def test_journal_archive_members(tmp_path):
+    journal_path = str(tmp_path / 'journal.jsonl')
+    member = discovery.ArchiveMember('archive.zip', '1.pdf', b'%PDF')
+    with journal.Journal(journal_path) as aggregation_journal:
+        assert list(aggregation_journal.unfinished([member])) == [member]
+        aggregation_journal.record(member, {})
+        # the journal keeps the paths, not the members and their contents
+        assert all(type(file_path) is str for file_path in
+                   itertools.chain(aggregation_journal.found, aggregation_journal.documents))
+        assert list(aggregation_journal.unfinished([member])) == []
@@ -0,0 +1,54 @@
+import datetime
+import io
+import json
+
+from aggregator import aggregate
+from aggregator import model
+
+def test_account_merge():
+    accounts = {}
+    for month in range(1, 4):
+        account = model.Account({'bank-name': 'BANK', 'currency': '€'})
+        account.balances.append(datetime.date(2020, month, 1), 100.0 * month)
+        account.balances.append(datetime.date(2020, 1, 1), 10.0 * month)
+        model.update_accounts(accounts, {'BANK-1': account})
+    assert account.balances.to_dict() == {datetime.date(2020, 3, 1): 300.0, datetime.date(2020, 1, 1): 30.0}
+    assert accounts['BANK-1'].balances.to_dict() == {
+        datetime.date(2020, 1, 1): 30.0, datetime.date(2020, 2, 1): 200.0, datetime.date(2020, 3, 1): 300.0}
+    assert accounts['BANK-1'].properties['bank-name'] is account.properties['bank-name']
+
+    accounts_json = json.loads(aggregate.toJSON(accounts))
+    assert accounts_json == {'BANK-1': {
+        'account': {'bank-name': 'BANK', 'currency': '€'},
+        'balances': {'2020-01-01': 30.0, '2020-02-01': 200.0, '2020-03-01': 300.0}}}
+    assert model.accounts_from_json(accounts_json) == accounts
+
+def test_write_json():
+    accounts = {}
+    for index in [2, 1]:
+        account = model.Account({'currency': '€', 'bank-name': 'BANK'})
+        for day in [5, 3]:
+            account.balances.append(datetime.date(2020, 1, day), float(day * index))
+        account.operations.append(datetime.date(2020, 1, 4), -1.0)
+        accounts['BANK-{}'.format(index)] = account
+    accounts_json = model.accounts_to_json(accounts)
+    for indent, sort_keys in [(2, False), (None, False), (4, True), (None, True)]:
+        output = io.StringIO()
+        model.write_json(accounts, output, indent, sort_keys)
+        separators = (',', ':') if indent is None else None
+        assert output.getvalue() == json.dumps(accounts_json, indent=indent, separators=separators,
+                                               sort_keys=sort_keys)
+    output = io.StringIO()
+    model.write_json({}, output)
+    assert output.getvalue() == json.dumps({}, indent=2)
+
+def test_ledger():
+    account = model.Account({'bank-name': 'BANK'})
+    for label in ['first', 'again']:
+        statement = model.Account()
+        statement.transactions.append(datetime.date(2020, 1, 3), 1, 'CARD', -2.5)
+        statement.transactions.append(datetime.date(2020, 1, 3), 0, label, 10.0)
+        account.merge(statement)
+    assert len(account.transactions) == 4
+    assert account.to_json()['transactions'] == [['2020-01-03', 0, 'again', 10.0], ['2020-01-03', 1, 'CARD', -2.5]]
+    assert model.Account.from_json(account.to_json()) == account
@@ -1,4 +1,5 @@
 import os
+import shutil
 from aggregator import aggregate
 
 def test_parse_pdf():
@@ -45,3 +46,71 @@ def test_parse_bank_extract():
     print(parsed)
     assert parsed['balance'] == 75
 
+
+def test_aggregator(tmp_path):
+    dir_path = os.path.dirname(os.path.realpath(__file__))
+    data_path = os.path.join(dir_path, 'data')
+    test_pdf_path = os.path.join(data_path, '20150910-BPLC-31512345678.pdf')
+    aggregator = aggregate.Aggregator(os.path.join(data_path, 'confs'), max_texts=2)
+    matched_conf_ids = []
+    accounts = aggregator.aggregate_file(test_pdf_path, matched_conf_ids=matched_conf_ids)
+    assert matched_conf_ids == ['bplc.json#Checking-monthly']
+    assert accounts == aggregate.aggregate_pdf(test_pdf_path, os.path.join(data_path, 'confs'))
+    with open(test_pdf_path, 'rb') as test_pdf:
+        assert aggregator.aggregate_bytes(test_pdf.read()) == accounts
+
+    invalid_pdf_path = str(tmp_path / 'invalid.pdf')
+    with open(invalid_pdf_path, 'wb') as invalid_pdf:
+        invalid_pdf.write(b'not a pdf')
+    duplicates = {}
+    results = list(aggregator.iter_results([data_path, test_pdf_path, invalid_pdf_path], duplicates=duplicates))
+    assert duplicates == {test_pdf_path: [test_pdf_path]}
+    assert results[-1][0] == invalid_pdf_path and results[-1][3] is not None
+    merged_accounts = aggregate.model.merge_accounts([result[1] for result in results[:-1]])
+    assert merged_accounts == aggregate.aggregate_pdfs(data_path, os.path.join(data_path, 'confs'))
+    assert len(aggregator.texts) <= 2
+
+    # a file replaced at the same path is extracted again
+    replaced_pdf_path = str(tmp_path / 'replaced.pdf')
+    shutil.copy(test_pdf_path, replaced_pdf_path)
+    assert aggregator.aggregate_file(replaced_pdf_path) == accounts
+    other_pdf_path = os.path.join(data_path, '20151130-BPLC-31512345678.pdf')
+    shutil.copy(other_pdf_path, replaced_pdf_path)
+    assert aggregator.aggregate_file(replaced_pdf_path) == \
+        aggregate.aggregate_pdf(other_pdf_path, os.path.join(data_path, 'confs'))
+
+def test_transactions():
+    conf = {
+        'bank-name': 'BANK',
+        'account-pattern': 'ACCOUNT (\\d+)',
+        'date-pattern': 'STATEMENT OF (\\d\\d)/(\\d\\d)/(\\d\\d\\d\\d)',
+        'transaction-pattern': '^(?P<day>\\d\\d)/(?P<month>\\d\\d) +(?P<label>.+?) +'
+                               '(?P<debit>[\\d ]+,\\d\\d)? +(?P<credit>[\\d ]+,\\d\\d)?$',
+    }
+    bank_extract = ('ACCOUNT 42\nSTATEMENT OF 05/01/2021\n'
+                    '28/12 RENT   1 200,00 \n'
+                    '28/12 CARD  GROCERY 35,10 \n'
+                    '04/01 SALARY  2 500,00\n'
+                    'STATEMENT OF 06/01/2021\n')
+    data = aggregate.parse_bank_extract(bank_extract, conf)
+    assert 'transaction-pattern' not in data
+    accounts = aggregate.build_accounts('statement.pdf', [conf], parse=lambda *args: bank_extract)
+    account = accounts['BANK-42']
+    assert account.to_json()['transactions'] == [
+        ['2020-12-28', 0, 'RENT', -1200.0], ['2020-12-28', 1, 'CARD GROCERY', -35.1],
+        ['2021-01-04', 0, 'SALARY', 2500.0]]
+    assert account.operations.to_json() == {'2020-12-28': -1235.1, '2021-01-04': 2500.0}
+    assert 'transactions' not in account.properties
+
+    # with an operation-pattern, the transactions are not the operations, even if it doesn't match
+    accounts = aggregate.build_accounts('statement.pdf', [{**conf, 'operation-pattern': 'OPERATION (\\d+)'}],
+                                        parse=lambda *args: bank_extract)
+    assert len(accounts['BANK-42'].transactions.to_json()) == 3
+    assert accounts['BANK-42'].operations.to_json() == {}
+    # a statement without balance nor transactions fails to be parsed
+    empty_extract = 'ACCOUNT 42\nSTATEMENT OF 05/01/2021\n'
+    assert aggregate.build_accounts('statement.pdf', [conf], parse=lambda *args: empty_extract) == {}
+
+    assert aggregate.parse_amount('-1,234.5') == -1234.5
+    assert aggregate.parse_amount('1.234') == 1234
+    assert aggregate.parse_amount('12,50-') == -12.5
@@ -0,0 +1,55 @@
+import json
+import os
+import shutil
+
+from aggregator import aggregate
+from aggregator import discovery
+from aggregator import parser_benchmark
+
+def test_benchmark_parsers(tmp_path):
+    dir_path = os.path.dirname(os.path.realpath(__file__))
+    data_path = os.path.join(dir_path, 'data')
+    confs_path = str(tmp_path / 'confs')
+    shutil.copytree(os.path.join(data_path, 'confs'), confs_path)
+    assert 'pdfplumber' in parser_benchmark.get_parser_names()
+
+    file_paths = list(discovery.iter_files(data_path))
+    report = parser_benchmark.benchmark_parsers(file_paths, confs_path, ['miner_text', 'pdfplumber'], sample=2)
+    conf_report = report['bplc.json#Checking-monthly']
+    assert len(conf_report['documents']) == 2
+    results = conf_report['results']
+    assert results['pdfplumber']['identical'] == 2
+    assert results['pdfplumber']['time'] > 0 and results['pdfplumber']['memory'] > 0
+    assert all(result['documents'] == 2 and result['identical'] + result['errors'] <= 2
+               for result in results.values())
+    assert 'pdfplumber' in conf_report['parsers']
+
+    accounts = aggregate.aggregate_pdfs(data_path, confs_path)
+    assert parser_benchmark.update_confs(confs_path, report) == [os.path.join(confs_path, 'bplc.json')]
+    with open(os.path.join(confs_path, 'bplc.json'), encoding='utf-8') as conf_file:
+        assert json.load(conf_file)['Checking-monthly']['parsers'] == conf_report['parsers']
+    assert aggregate.aggregate_pdfs(data_path, confs_path) == accounts
+
+def test_find_parser():
+    dir_path = os.path.dirname(os.path.realpath(__file__))
+    test_pdf_path = os.path.join(dir_path, 'data', '20150910-BPLC-31512345678.pdf')
+    conf = dict(aggregate.get_confs(os.path.join(dir_path, 'data', 'confs')))['bplc.json#Checking-monthly']
+    # the parsers that fail are skipped
+    conf = {**conf, 'parsers': ['unknown', 'pdfplumber']}
+    assert aggregate.find_parser(conf, test_pdf_path) == 'pdfplumber'
+    data = aggregate.parse_bank_extract_file(test_pdf_path, {**conf, 'fallback-parser': 'pdfminer'},
+                                             parser_name='pdfplumber')
+    assert 'parsers' not in data and 'fallback-parser' not in data
+
+    # the next parsers are tried on the documents of the bank only
+    parsed = []
+    def parse(file_path, parser_name):
+        parsed.append(parser_name)
+        return {'first': 'Other bank', 'second': 'BANQUE POPULAIRE'}[parser_name]
+    conf = {**conf, 'parsers': ['first', 'second']}
+    assert aggregate.find_parser(conf, test_pdf_path, parse=parse) is None
+    assert parsed == ['first', 'first']
+    parsed.clear()
+    conf = {**conf, 'parsers': ['second', 'first']}
+    assert aggregate.find_parser(conf, test_pdf_path, parse=parse) is None
+    assert parsed == ['second', 'second', 'first', 'first']
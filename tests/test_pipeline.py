@@ -0,0 +1,26 @@
+import asyncio
+import os
+
+from aggregator import aggregate
+from aggregator import discovery
+from aggregator import pipeline
+
+def test_aggregate_stream():
+    dir_path = os.path.dirname(os.path.realpath(__file__))
+    file_paths = list(discovery.iter_files(os.path.join(dir_path, 'data')))
+
+    async def collect():
+        return [result async for result in pipeline.aggregate_stream(
+            file_paths + ['missing.pdf'], os.path.join(dir_path, 'data', 'confs'), processes=2, queue_size=1)]
+
+    results = asyncio.run(collect())
+    assert sorted(result[0] for result in results) == sorted(file_paths + ['missing.pdf'])
+    errors = [result[3] for result in results if result[3] is not None]
+    assert len(errors) == 1 and isinstance(errors[0], FileNotFoundError)
+
+def test_aggregate_pdfs_pipeline():
+    dir_path = os.path.dirname(os.path.realpath(__file__))
+    accounts = asyncio.run(pipeline.aggregate_pdfs_pipeline(
+        os.path.join(dir_path, 'data'), os.path.join(dir_path, 'data', 'confs'), processes=2))
+    assert len(accounts['BPLC-31512345678'].balances.to_dict()) == 7
+    assert accounts == aggregate.aggregate_pdfs(os.path.join(dir_path, 'data'), os.path.join(dir_path, 'data', 'confs'))
@@ -54,3 +54,61 @@ def test_plotAccountsYearly():
     test_json_path = os.path.join(dir_path, 'data', 'test_plot_1.json')
     accounts = plot.readAccounts(test_json_path)
     plot.plot_accounts(accounts, yearly=True)
+
+def test_plotAccountsRange():
+    dir_path = os.path.dirname(os.path.realpath(__file__))
+    test_json_path = os.path.join(dir_path, 'data', 'test_plot_1.json')
+    accounts = plot.readAccounts(test_json_path)
+    start = datetime.datetime(2019, 3, 1)
+    end = datetime.datetime(2019, 9, 1)
+    plot.plot_accounts(accounts, total=True, start=start, end=end)
+    plot.plot_accounts_yearly(accounts, total=True, subtotals=True, start=start, end=end)
+
+def test_plot_cache(tmp_path):
+    from aggregator import plot_cache
+    import numpy
+    import shutil
+    dir_path = os.path.dirname(os.path.realpath(__file__))
+    test_json_path = str(tmp_path / 'accounts.json')
+    shutil.copy(os.path.join(dir_path, 'data', 'test_plot_1.json'), test_json_path)
+    cache_path = str(tmp_path / 'cache')
+    computed = []
+    def compute_figure():
+        computed.append(True)
+        return plot.get_accounts_figure(plot.readAccounts(test_json_path), total=True)
+    view = {'total': True}
+    figure = plot_cache.get_figure(cache_path, [test_json_path], view, compute_figure)
+    cached_figure = plot_cache.get_figure(cache_path, [test_json_path], view, compute_figure)
+    assert len(computed) == 1
+    assert len(cached_figure['curves']) == len(figure['curves']) > 0
+    for curve, cached_curve in zip(figure['curves'], cached_figure['curves']):
+        assert numpy.array_equal(curve['x'], cached_curve['x']) and numpy.array_equal(curve['y'], cached_curve['y'])
+        assert {**curve, 'x': None, 'y': None} == {**cached_curve, 'x': None, 'y': None}
+    plot.render_figure(cached_figure)
+
+    plot_cache.get_figure(cache_path, [test_json_path], {'total': False}, compute_figure)
+    assert len(computed) == 2
+    with open(test_json_path, 'a') as test_json_file:
+        test_json_file.write('\n')
+    plot_cache.get_figure(cache_path, [str(tmp_path)], view, compute_figure)
+    assert len(computed) == 3
+
+def test_plot_main_cache(tmp_path, monkeypatch):
+    import shutil
+    import sys
+    dir_path = os.path.dirname(os.path.realpath(__file__))
+    test_json_path = str(tmp_path / 'accounts.json')
+    shutil.copy(os.path.join(dir_path, 'data', 'test_plot_1.json'), test_json_path)
+    read_accounts_files = plot.read_accounts_files
+    read = []
+    def spy(files_or_folders):
+        read.append(files_or_folders)
+        return read_accounts_files(files_or_folders)
+    monkeypatch.setattr(plot, 'read_accounts_files', spy)
+    monkeypatch.setattr(plot, 'render_figure', lambda *args: None)
+    arguments = ['plot.py', test_json_path, '--yearly', '--total', '--cache', str(tmp_path / 'cache')]
+    for argv in [arguments, arguments, arguments + ['--rollups']]:
+        monkeypatch.setattr(sys, 'argv', argv)
+        plot.main()
+    # the accounts are not read on a cache hit, and the rollups are a view of their own
+    assert len(read) == 2
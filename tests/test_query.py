@@ -0,0 +1,30 @@
+import datetime
+import io
+import os
+
+from aggregator import compute
+from aggregator import query
+
+def read_test_accounts():
+    dir_path = os.path.dirname(os.path.realpath(__file__))
+    return compute.readAccounts(os.path.join(dir_path, 'data', 'test_plot_1.json'))
+
+def test_query_balances():
+    accounts = read_test_accounts()
+    days = query.get_query_days([datetime.datetime(2017, 1, 1)],
+                                [(datetime.datetime(2019, 1, 1), datetime.datetime(2020, 3, 1))], 7)
+    result = query.query_balances(accounts, days)
+    for account_id in accounts:
+        sorted_balances = compute.get_account_balances(accounts, account_id)
+        expected = [compute.get_balance(sorted_balances, day) for day in days]
+        assert list(result['accounts'][account_id]) == expected
+    assert list(result['total']) == [sum(balances) for balances in zip(*result['accounts'].values())]
+    assert list(result['subtotals']) == ['checking', 'saving']
+
+def test_query_filter_csv():
+    accounts = read_test_accounts()
+    account_filters = compute.parse_account_filters(['f+account-type=checking'])
+    result = query.query_balances(accounts, [datetime.datetime(2019, 12, 31)], account_filters)
+    output = io.StringIO()
+    query.write_csv(result, output, ['accounts', 'total'])
+    assert output.getvalue() == 'date,account-2,total\n2019-12-31,1200.00,1200.00\n'
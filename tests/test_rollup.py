@@ -0,0 +1,114 @@
+import datetime
+import json
+import os
+
+import pytest
+
+import matplotlib
+matplotlib.use('Agg')
+
+from aggregator import compute
+from aggregator import plot
+from aggregator import rollup
+from aggregator import synthetic
+
+def write_synthetic_accounts(tmp_path, **kwargs):
+    accounts_path = tmp_path / 'accounts.json'
+    synthetic.write_accounts(synthetic.generate_accounts(account_count=6, years=3, **kwargs), accounts_path)
+    return accounts_path
+
+def test_rollup_account(tmp_path):
+    accounts = compute.readAccounts(write_synthetic_accounts(tmp_path, operations=0.5))
+    rollups = rollup.compute_rollups(accounts)
+    assert set(rollups['accounts']) == set(accounts)
+    for account_id, account_rollups in rollups['accounts'].items():
+        sorted_balances = compute.get_account_balances(accounts, account_id)
+        # the last (partial) period of each period length ends with the last balance
+        assert len({list(account_rollups[period].values())[-1]['balance'] for period in rollup.periods}) == 1
+        for period in rollup.periods:
+            previous_balance = 0
+            for day, entry in account_rollups[period].items():
+                balance = compute.get_balance_exact(sorted_balances, datetime.datetime.fromisoformat(day))
+                assert entry['balance'] == balance
+                assert entry['delta'] == balance - previous_balance
+                previous_balance = balance
+        if 'operations' in accounts[account_id]:
+            share = compute.get_account_properties(accounts, account_id).get('share', 1)
+            assert (sum(entry['operations'] for entry in account_rollups['monthly'].values())
+                    == sum(accounts[account_id]['operations'].values()) * share)
+
+    # after the last balance of each account, the total is the sum of the last balances
+    last_day = max(rollups['total']['yearly'])
+    assert rollups['total']['yearly'][last_day]['balance'] == pytest.approx(sum(
+        account_rollups['yearly'][last_day]['balance'] for account_rollups in rollups['accounts'].values()))
+    assert sum(type_rollups['yearly'][last_day]['balance'] for type_rollups in rollups['types'].values()) == \
+        pytest.approx(rollups['total']['yearly'][last_day]['balance'])
+    assert rollups['total']['accounts'] == sorted(accounts)
+
+def test_update_rollups(tmp_path):
+    accounts_path = write_synthetic_accounts(tmp_path)
+    rollups_path = rollup.get_rollups_path(str(accounts_path))
+    assert rollups_path == str(tmp_path / 'accounts.rollups.json')
+    rollups = rollup.update_rollups(compute.readAccounts(accounts_path), rollups_path)
+    assert rollup.read_rollups(rollups_path) == json.loads(json.dumps(rollups))
+    # the rollups file is not read as an accounts file
+    assert set(compute.read_accounts_files([str(tmp_path)])) == set(rollups['accounts'])
+
+    with open(accounts_path, encoding='utf-8') as accounts_file:
+        accounts_json = json.load(accounts_file)
+    redirections = [account['account'] for account in accounts_json.values() if isinstance(account['account'], str)]
+    changed_account_id, changed_account = next((account_id, account) for account_id, account in accounts_json.items()
+                                               if 'balances' in account and account_id not in redirections)
+    last_day = max(changed_account['balances'])
+    changed_account['balances'][last_day] += 1000
+    synthetic.write_accounts(accounts_json, accounts_path)
+
+    computed = []
+    rollup_account = rollup.rollup_account
+    def spy(accounts, account_id):
+        computed.append(account_id)
+        return rollup_account(accounts, account_id)
+    rollup.rollup_account = spy
+    try:
+        new_rollups = rollup.update_rollups(compute.readAccounts(accounts_path), rollups_path)
+    finally:
+        rollup.rollup_account = rollup_account
+    assert computed == [changed_account_id]
+    period_end = rollup.get_period_end(datetime.datetime.fromisoformat(last_day), 'yearly').date().isoformat()
+    assert (new_rollups['accounts'][changed_account_id]['yearly'][period_end]['balance']
+            == rollups['accounts'][changed_account_id]['yearly'][period_end]['balance'] + 1000)
+
+def test_get_rollup_series():
+    rollups = {'yearly': {'2020-12-31': {'balance': 10, 'delta': 10},
+                          '2021-12-31': {'balance': 15, 'delta': 5},
+                          '2022-12-31': {'balance': 12, 'delta': -3}}}
+    assert rollup.get_rollup_series(rollups, 'yearly', 'delta', start=datetime.datetime(2021, 1, 1)) == \
+        ([datetime.datetime(2021, 1, 1), datetime.datetime(2022, 1, 1)], [5, -3])
+
+def test_plot_accounts_yearly_rollups(tmp_path):
+    accounts = compute.readAccounts(write_synthetic_accounts(tmp_path))
+    rollups = rollup.compute_rollups(accounts)
+    for yearly in ['absolute', 'relative']:
+        plot.plot_accounts_yearly(accounts, yearly=yearly, total=True, rollups=rollups)
+        plot.plot_accounts_yearly(accounts, yearly=yearly, subtotals=True, rollups=rollups,
+                                  start=datetime.datetime(2023, 1, 1))
+    matplotlib.pyplot.close('all')
+
+def test_plot_accounts_yearly_rollups_totals(tmp_path):
+    dir_path = os.path.dirname(os.path.realpath(__file__))
+    for accounts in [compute.readAccounts(os.path.join(dir_path, 'data', 'account-31512345678.json')),
+                     compute.readAccounts(os.path.join(dir_path, 'data', 'test_plot_1.json')),
+                     compute.readAccounts(write_synthetic_accounts(tmp_path, operations=0.5))]:
+        rollups = rollup.compute_rollups(accounts)
+        for yearly in ['absolute', 'relative']:
+            for options in [{'total': True}, {'subtotals': True, 'total': True},
+                            {'total': True, 'account_filters': [{'condition': False, 'key': 'account-type',
+                                                                 'value': 'saving'}]}]:
+                # the totals and subtotals of the rollups are the ones of the balances
+                figure = plot.get_accounts_yearly_figure(accounts, yearly=yearly, **options)
+                rollups_figure = plot.get_accounts_yearly_figure(accounts, yearly=yearly, rollups=rollups, **options)
+                assert [curve['legend'] for curve in rollups_figure['curves']] == \
+                    [curve['legend'] for curve in figure['curves']]
+                for curve, rollups_curve in zip(figure['curves'], rollups_figure['curves']):
+                    assert rollups_curve['x'].tolist() == curve['x'].tolist()
+                    assert rollups_curve['y'] == pytest.approx(curve['y'])
@@ -0,0 +1,60 @@
+import json
+import os
+import shutil
+
+from aggregator import watch
+
+def test_folder_watcher(tmp_path):
+    dir_path = os.path.dirname(os.path.realpath(__file__))
+    pdf_paths = [os.path.join(dir_path, 'data', file_name)
+                 for file_name in sorted(os.listdir(os.path.join(dir_path, 'data'))) if file_name.endswith('.pdf')]
+    (tmp_path / '2015').mkdir()
+    for pdf_path in pdf_paths[:3]:
+        shutil.copy(pdf_path, tmp_path / '2015')
+    folder_watcher = watch.FolderWatcher(str(tmp_path), settle=0)
+    changed_files, removed_files = folder_watcher.poll()
+    assert len(changed_files) == 3 and removed_files == []
+    assert folder_watcher.poll() == ([], [])
+    assert not folder_watcher.has_changed()
+
+    new_path = shutil.copy(pdf_paths[3], tmp_path / '2015')
+    os.remove(changed_files[0])
+    assert folder_watcher.poll() == ([str(new_path)], [changed_files[0]])
+
+    folder_watcher.settle = 3600
+    (tmp_path / '2016').mkdir()
+    copying_path = shutil.copy(pdf_paths[4], tmp_path / '2016')
+    assert folder_watcher.poll() == ([], [])
+    folder_watcher.settle = 0
+    assert folder_watcher.poll() == ([str(copying_path)], [])
+
+def test_folder_watcher_rewritten_file(tmp_path):
+    dir_path = os.path.dirname(os.path.realpath(__file__))
+    pdf_path = shutil.copy(os.path.join(dir_path, 'data', '20150910-BPLC-31512345678.pdf'), tmp_path)
+    folder_watcher = watch.FolderWatcher(str(tmp_path), settle=0, file_check_polls=3)
+    assert folder_watcher.poll() == ([pdf_path], [])
+    folder_mtime = os.stat(tmp_path).st_mtime_ns
+    # rewritten in place: the folder doesn't change
+    with open(os.path.join(dir_path, 'data', '20151130-BPLC-31512345678.pdf'), 'rb') as other_pdf:
+        contents = other_pdf.read()
+    with open(pdf_path, 'r+b') as pdf_file:
+        pdf_file.write(contents)
+    os.utime(tmp_path, ns=(folder_mtime, folder_mtime))
+    # the 2nd poll only stats the folders, the 3rd one stats the files too
+    assert folder_watcher.poll() == ([], [])
+    assert folder_watcher.poll() == ([pdf_path], [])
+    assert folder_watcher.poll() == ([], [])
+
+def test_watch(tmp_path):
+    dir_path = os.path.dirname(os.path.realpath(__file__))
+    folder = tmp_path / 'statements'
+    folder.mkdir()
+    for file_name in sorted(os.listdir(os.path.join(dir_path, 'data'))):
+        if file_name.endswith('.pdf'):
+            shutil.copy(os.path.join(dir_path, 'data', file_name), folder)
+    output = tmp_path / 'accounts.json'
+    watch.watch(str(folder), str(output), os.path.join(dir_path, 'data', 'confs'), interval=0, settle=0, polls=2)
+    with open(output) as accounts_file:
+        accounts = json.load(accounts_file)
+    assert len(accounts['BPLC-31512345678']['balances']) == 7
+    assert sorted(os.listdir(tmp_path)) == ['accounts.json', 'statements']
@@ -0,0 +1,36 @@
+import os
+
+from aggregator import aggregate
+from aggregator import discovery
+from aggregator import workbench
+
+def test_workbench(tmp_path):
+    dir_path = os.path.dirname(os.path.realpath(__file__))
+    data_path = os.path.join(dir_path, 'data')
+    confs = aggregate.get_confs(os.path.join(data_path, 'confs'))
+    conf = dict(confs)['bplc.json#Checking-monthly']
+    file_paths = list(discovery.iter_files(data_path))
+    text_cache_path = str(tmp_path / 'texts')
+    corpus_texts, errors = workbench.load_texts(file_paths + [str(tmp_path / 'missing.pdf')], 'pdfplumber',
+                                                text_cache_path, processes=2)
+    assert list(errors) == [str(tmp_path / 'missing.pdf')]
+    assert len(corpus_texts) == 7 and len(os.listdir(text_cache_path)) == 7
+    # read from the text cache
+    assert workbench.load_texts(file_paths, 'pdfplumber', text_cache_path, processes=1) == (corpus_texts, {})
+
+    def without_times(results):
+        return [{**result, 'time': None} for result in results]
+    with workbench.Workbench(corpus_texts, processes=2) as parallel_workbench:
+        results = parallel_workbench.evaluate_pattern(conf['account-pattern'])
+        assert [result['file'] for result in results] == file_paths
+        assert all(result['match'] and set(result['values']) == {'31512345678'} for result in results)
+        conf_results = parallel_workbench.evaluate_conf(conf)
+        assert parallel_workbench.evaluate_pattern('NOT IN THE STATEMENTS')[0]['match'] is False
+    conf_results = without_times(conf_results)
+    assert conf_results[0]['values'] == {'account': '31512345678', 'balance': 75.0, 'date': '2015-09-10'}
+    assert conf_results == without_times(workbench.Workbench(corpus_texts, processes=1).evaluate_conf(conf))
+
+    banks = {file_path: workbench.detect_bank(text, confs) for file_path, text in corpus_texts.items()}
+    summaries = workbench.summarize(results, banks)
+    assert summaries['all']['matches'] == 7 and summaries['all']['misses'] == 0
+    assert list(summaries['banks']) == ['BPLC']